@@ -0,0 +1,150 @@
+"""
+Load test for the query API (utils/api.py) while the monitor handles
+arrivals.
+
+Runs the isolated pipeline (see pipeline_harness.py) with --devices arrivals
+paced at --rate events/sec and, alongside it, --clients keep-alive HTTP
+clients issuing one kind of request in a loop:
+
+  list     GET /api/devices?limit=100, no validators (always a full body)
+  poll     GET /api/devices with If-None-Match of the last ETag seen
+  detail   GET /api/devices/<id> of a random device (404 until it has arrived)
+  events   GET /api/events?limit=50
+
+Each client waits --interval seconds between requests (0 saturates the
+server). Reports requests/sec, status codes and latency per kind, then polls again
+once arrivals have stopped (every answer a 304), and the monitor's own
+decision latency with and without API load. Clients run in their own
+processes, as SOC tooling would. Run from the project root:
+
+    python benchmarks/bench_api.py --devices 400 --rate 200 --clients 4 --interval 0.05
+"""
+import argparse
+import collections
+import http.client
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_harness import PipelineHarness, percentiles
+from utils.api import start_api_server
+
+KINDS = ("list", "poll", "detail", "events")
+
+
+def client_loop(port, kind, device_ids, interval, stop, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etag = None
+    statuses = collections.Counter()
+    latencies = []
+    while not stop.is_set():
+        headers = {}
+        if kind == "list":
+            path = "/api/devices?limit=100"
+        elif kind == "poll":
+            path = "/api/devices?limit=100"
+            if etag:
+                headers["If-None-Match"] = etag
+        elif kind == "detail":
+            path = "/api/devices/" + quote(random.choice(device_ids), safe="")
+        else:
+            path = "/api/events?limit=50"
+        started = time.perf_counter()
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status] += 1
+        etag = response.getheader("ETag") or etag
+        if interval:
+            stop.wait(interval)
+    conn.close()
+    results.put((kind, statuses, latencies))
+
+
+def load(port, clients, device_ids, kinds, interval=0.0, seconds=None, until=None):
+    """Runs `clients` client processes per kind until `until` is set (or for `seconds`)."""
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client_loop, args=(port, kind, device_ids, interval, stop, results), daemon=True)
+             for kind in kinds for _ in range(clients)]
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    if seconds is not None:
+        time.sleep(seconds)
+    else:
+        until.wait()
+    stop.set()
+    collected = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - started
+    for p in procs:
+        p.join()
+    by_kind = {}
+    for kind, statuses, latencies in collected:
+        agg = by_kind.setdefault(kind, {"statuses": collections.Counter(), "latencies": []})
+        agg["statuses"].update(statuses)
+        agg["latencies"].extend(latencies)
+    return elapsed, by_kind
+
+
+def report(label, elapsed, by_kind):
+    print(label)
+    for kind, agg in by_kind.items():
+        count = len(agg["latencies"])
+        latency = percentiles(agg["latencies"])
+        statuses = " ".join(f"{status}x{n:,}" for status, n in sorted(agg["statuses"].items()))
+        print(f"  {kind:>7}: {count / elapsed:>8,.0f} req/s  [{statuses}]  "
+              f"p50={latency.get('p50')}ms p99={latency.get('p99')}ms")
+
+
+def run(devices, rate, clients, interval, with_load):
+    with PipelineHarness(enum_level='root', real_clock=False) as h:
+        drives = h.make_drives(devices, files=10)
+        device_ids = [f"api-volume-{i}" for i in range(devices)]
+        events = [('arrival', drive, device_id) for drive, device_id in zip(drives, device_ids)]
+        server = start_api_server(0)
+        port = server.server_address[1]
+        try:
+            if not with_load:
+                return h.run(events, rate=rate), None
+            running = threading.Event()
+            outcome = {}
+            monitor = threading.Thread(target=lambda: (outcome.update(h.run(events, rate=rate)), running.set()))
+            monitor.start()
+            busy = load(port, clients, device_ids, KINDS, interval, until=running)
+            monitor.join()
+            idle = load(port, clients, device_ids, ("poll",), interval, seconds=2.0)
+            return outcome, (busy, idle)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--devices", type=int, default=400, help="arrivals handled during the test")
+    ap.add_argument("--rate", type=float, default=200.0, help="arrivals per second")
+    ap.add_argument("--clients", type=int, default=4, help="clients per request kind")
+    ap.add_argument("--interval", type=float, default=0.05, help="seconds each client waits between requests")
+    args = ap.parse_args()
+
+    baseline, _ = run(args.devices, args.rate, args.clients, args.interval, with_load=False)
+    loaded, (busy, idle) = run(args.devices, args.rate, args.clients, args.interval, with_load=True)
+    report(f"while handling {args.devices} arrivals at {args.rate:g}/s "
+           f"({args.clients} client(s) per kind, {args.interval:g}s apart):", *busy)
+    report("after arrivals stopped (conditional polls):", *idle)
+    for label, r in (("without API load", baseline), ("with API load", loaded)):
+        latency = r["decision_latency_ms"]
+        print(f"  monitor {label}: {r['handled']}/{r['events']} events, "
+              f"decision p50={latency.get('p50')}ms p99={latency.get('p99')}ms")
+
+
+if __name__ == "__main__":
+    main()
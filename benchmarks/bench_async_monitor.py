@@ -0,0 +1,63 @@
+"""
+Many devices waiting at once, handled by the threaded monitor
+(usb_logger_win.main) versus the asyncio one (usb_logger_async.main).
+
+All devices arrive together and every check includes a real
+MountStabilityDelay wait (MountProbeMode = fixed). The threaded monitor
+holds a pool worker for the whole wait, so only --workers checks progress
+at a time; the asyncio monitor waits on loop timers, so every device waits
+concurrently on the same --workers I/O threads. Reports time to handle
+every arrival, decision latency and the peak number of live threads. Run
+from the project root:
+
+    python benchmarks/bench_async_monitor.py --devices 64 --mount-delay 1.0 --workers 4
+"""
+import argparse
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_harness import PipelineHarness
+
+
+def run(entry, devices, mount_delay, workers):
+    with PipelineHarness(entry=entry, workers=workers, enum_level='none', probe_mode='fixed',
+                         mount_delay=mount_delay, real_clock=True) as h:
+        drives = h.make_drives(devices, files=5)
+        peak = [threading.active_count()]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.01):
+                peak[0] = max(peak[0], threading.active_count())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        events = [('arrival', drive, f"waiting-volume-{i}") for i, drive in enumerate(drives)]
+        result = h.run(events)
+        done.set()
+        sampler.join()
+        result["peak_threads"] = peak[0]
+        return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--devices", type=int, default=64, help="devices arriving at once")
+    ap.add_argument("--mount-delay", type=float, default=1.0, help="fixed mount wait per device, seconds")
+    ap.add_argument("--workers", type=int, default=4, help="pool size / I/O threads")
+    ap.add_argument("--entries", nargs="+", choices=("threads", "asyncio"), default=["threads", "asyncio"])
+    args = ap.parse_args()
+
+    for entry in args.entries:
+        r = run(entry, args.devices, args.mount_delay, args.workers)
+        latency = r["decision_latency_ms"]
+        print(f"{entry:>8}: {r['handled']}/{r['events']} arrivals in {r['elapsed_s']:.2f}s  "
+              f"decision p50={latency.get('p50')}ms p99={latency.get('p99')}ms  "
+              f"peak threads={r['peak_threads']}")
+
+
+if __name__ == "__main__":
+    main()
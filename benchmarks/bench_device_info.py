@@ -0,0 +1,66 @@
+"""
+Hit rate and latency saved by CachedDeviceInfoProvider, measured with the
+FakeDeviceInfoProvider so it runs without WMI. Each simulated insertion
+starts with the removal of the previous one, which invalidates the device
+(as handle_usb_removal does), and is followed by a number of repeat lookups
+(details view, eject, admission checks).
+
+    python benchmarks/bench_device_info.py --devices 20 --arrivals 200 --reads 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.device import CachedDeviceInfoProvider, FakeDeviceInfoProvider
+
+
+def make_fake(devices, latency):
+    letters = [f"{chr(ord('E') + i % 20)}:" for i in range(devices)]
+    volumes = {l: {"VolumeName": f"STICK_{l[0]}", "FileSystem": "FAT32",
+                   "Size": "15728640000", "FreeSpace": "1000000"} for l in letters}
+    physical = {l: f"\\\\.\\PhysicalDrive{i + 1}" for i, l in enumerate(letters)}
+    return letters, FakeDeviceInfoProvider(volumes, physical, latency=latency)
+
+
+def run(provider, letters, arrivals, reads, seed=1):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(arrivals):
+        letter = rng.choice(letters)
+        guid = f"\\\\?\\Volume{{{letter[0]}}}\\"
+        provider.invalidate(letter, guid)
+        for _ in range(1 + reads):
+            provider.get_volume_details(letter, guid)
+            provider.get_physical_drive_path(letter, guid)
+    return time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--devices", type=int, default=20)
+    ap.add_argument("--arrivals", type=int, default=200)
+    ap.add_argument("--reads", type=int, default=5, help="repeat lookups after each arrival")
+    ap.add_argument("--latency", type=float, default=0.002, help="seconds per fake WMI query")
+    args = ap.parse_args()
+
+    letters, raw = make_fake(args.devices, args.latency)
+    uncached = run(raw, letters, args.arrivals, args.reads)
+    raw_calls = raw.calls
+
+    letters, inner = make_fake(args.devices, args.latency)
+    cached = CachedDeviceInfoProvider(inner)
+    elapsed = run(cached, letters, args.arrivals, args.reads)
+    stats = cached.stats()
+
+    lookups = args.arrivals * (1 + args.reads) * 2
+    print(f"uncached: {uncached:.3f}s  backend queries={raw_calls}  per lookup={uncached / lookups * 1e3:.3f}ms")
+    print(f"  cached: {elapsed:.3f}s  backend queries={inner.calls}  per lookup={elapsed / lookups * 1e3:.3f}ms  "
+          f"hit rate={stats['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Lookup and update cost of the JSON summary file versus the SQLite device
+store at growing fleet sizes. The JSON path is what the monitor and GUI do
+today: parse the whole file to read one entry, and rewrite the whole file to
+update one.
+
+    python benchmarks/bench_device_store.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.device_store import SqliteDeviceStore, entry_row
+
+
+def make_entry(i):
+    files = {f"file_{n}.txt": {"size": n * 1024, "created": "2025-01-01T10:00:00",
+                               "modified": "2025-01-02T10:00:00", "accessed": "2025-01-03T10:00:00",
+                               "is_dir": False} for n in range(10)}
+    return {
+        "first_seen": "2025-01-01T09:00:00", "last_seen": f"2025-02-01T{i % 24:02d}:00:{i % 60:02d}",
+        "arrival_count": i % 17, "last_drive_letter": f"{chr(ord('E') + i % 20)}:",
+        "last_state": random.choice(["allowed", "ejected", "removed"]),
+        "total_auth_success": 1, "total_auth_failure": 0, "total_eject_success": 0,
+        "total_eject_failure": 0, "auth_reason": "OK",
+        "volume_details": {"VolumeName": f"STICK{i}", "FileSystem": "FAT32",
+                           "Size": "15728640000", "FreeSpace": "1000000"},
+        "extra_data": {"files_enumeration": files},
+    }
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(size, repeat, workdir):
+    summary = {f"\\\\?\\Volume{{{i:08d}-bench}}\\": make_entry(i) for i in range(size)}
+    ids = list(summary)
+    json_path = os.path.join(workdir, f"summary_{size}.json")
+    with open(json_path, "w") as f:
+        json.dump(summary, f, separators=(",", ":"))
+
+    store = SqliteDeviceStore(os.path.join(workdir, f"summary_{size}.db"))
+    store.upsert_rows([entry_row(d, e) for d, e in summary.items()])
+
+    def json_lookup():
+        with open(json_path) as f:
+            json.load(f).get(random.choice(ids))
+
+    def json_update():
+        summary[random.choice(ids)]["arrival_count"] += 1
+        with open(json_path, "w") as f:
+            f.write(json.dumps(summary, separators=(",", ":")))
+
+    def db_lookup():
+        store.get(random.choice(ids))
+
+    def db_update():
+        dev = random.choice(ids)
+        summary[dev]["arrival_count"] += 1
+        store.upsert(dev, summary[dev])
+
+    def db_page():
+        store.page(limit=50, state="allowed")
+
+    # Whole-file operations get fewer repetitions at large sizes
+    slow_repeat = max(1, repeat // max(1, size // 1000))
+    return {
+        "size": size,
+        "json_lookup_ms": timed(json_lookup, slow_repeat),
+        "json_update_ms": timed(json_update, slow_repeat),
+        "sqlite_lookup_ms": timed(db_lookup, repeat),
+        "sqlite_update_ms": timed(db_update, repeat),
+        "sqlite_page50_ms": timed(db_page, repeat),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'devices':>8} {'json get':>10} {'json put':>10} {'db get':>10} {'db put':>10} {'db page':>10}  (ms)")
+        for size in args.sizes:
+            r = bench(size, args.repeat, workdir)
+            print(f"{r['size']:>8} {r['json_lookup_ms']:>10.3f} {r['json_update_ms']:>10.3f} "
+                  f"{r['sqlite_lookup_ms']:>10.3f} {r['sqlite_update_ms']:>10.3f} {r['sqlite_page50_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
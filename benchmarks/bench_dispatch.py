@@ -0,0 +1,63 @@
+"""
+Decision latency for N simultaneous USB arrivals: inline (serial) dispatch
+versus the KeyedWorkerPool used by usb_logger_win.main().
+
+The handler stands in for handle_usb_arrival: it blocks for a simulated
+mount wait plus volume-detail query and then records when its eject/allow
+decision was made. Run from the project root:
+
+    python benchmarks/bench_dispatch.py --devices 8 --workers 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dispatch import KeyedWorkerPool
+
+
+def _make_handler(handler_time, decisions, lock):
+    def handler(drive_letter, device_id, submitted_at):
+        time.sleep(handler_time)  # mount wait + WMI + auth read + eject
+        with lock:
+            decisions[device_id] = time.perf_counter() - submitted_at
+    return handler
+
+
+def run(devices, workers, handler_time):
+    decisions, lock = {}, threading.Lock()
+    handler = _make_handler(handler_time, decisions, lock)
+    events = [(f"{chr(ord('E') + i % 20)}:", f"\\\\?\\Volume{{bench-{i}}}\\") for i in range(devices)]
+
+    start = time.perf_counter()
+    if workers <= 1:
+        for drive, dev in events:
+            handler(drive, dev, start)
+    else:
+        pool = KeyedWorkerPool(workers, name="bench-worker")
+        for drive, dev in events:
+            pool.submit(dev, handler, drive, dev, start)
+        pool.shutdown(wait=True)
+    return sorted(decisions.values())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--devices", type=int, default=8, help="simultaneous arrivals")
+    ap.add_argument("--workers", type=int, default=4, help="pool size (<=1 means inline)")
+    ap.add_argument("--handler-time", type=float, default=0.5,
+                    help="seconds each arrival blocks before deciding")
+    args = ap.parse_args()
+
+    for label, workers in (("inline", 1), (f"pool({args.workers})", args.workers)):
+        lat = run(args.devices, workers, args.handler_time)
+        print(f"{label:>10}: devices={args.devices} "
+              f"first={lat[0]:.3f}s median={statistics.median(lat):.3f}s last={lat[-1]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
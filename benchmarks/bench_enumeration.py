@@ -0,0 +1,58 @@
+"""
+Entries/sec of the recursive VolumeWalker against a synthetic tree, for a
+range of scandir worker counts, to size ScanWorkers/TimeBudget for large
+sticks. The tree is built once under a temporary directory (or --tree to
+walk an existing directory, e.g. a mounted stick).
+
+    python benchmarks/bench_enumeration.py --dirs 500 --files 200 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.enumeration import VolumeWalker
+
+
+def build_tree(root, dirs, files, fanout=10):
+    """Creates `dirs` directories (nested `fanout` wide) holding `files` empty files each."""
+    paths = [root]
+    for i in range(dirs):
+        parent = paths[i // fanout]
+        path = os.path.join(parent, f"dir{i:05d}")
+        os.mkdir(path)
+        paths.append(path)
+        for n in range(files):
+            open(os.path.join(path, f"file{n:05d}.dat"), "wb").close()
+    return dirs * (files + 1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--dirs", type=int, default=500)
+    ap.add_argument("--files", type=int, default=200, help="files per directory")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--max-entries", type=int, default=10_000_000)
+    ap.add_argument("--time-budget", type=float, default=300)
+    ap.add_argument("--tree", help="walk this existing directory instead of a synthetic one")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.tree
+        if root is None:
+            root = os.path.join(tmp, "volume")
+            os.mkdir(root)
+            print(f"building {build_tree(root, args.dirs, args.files):,} entries...")
+        for workers in args.workers:
+            out = os.path.join(tmp, f"listing-{workers}.jsonl")
+            stats = VolumeWalker(root, out, max_depth=64, max_entries=args.max_entries,
+                                 time_budget=args.time_budget, workers=workers).run()
+            print(f"workers={workers:<3} entries={stats['entries']:>9,} elapsed={stats['elapsed_seconds']:>7.3f}s "
+                  f"rate={stats['entries_per_sec']:>11,.0f} entries/s listing={stats['bytes']:,}B"
+                  + (f" truncated={stats['truncated']}" if stats['truncated'] else ""))
+
+
+if __name__ == "__main__":
+    main()
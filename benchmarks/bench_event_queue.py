@@ -0,0 +1,119 @@
+"""
+Memory under a sustained event flood: the unbounded queue.Queue the monitor
+used to create versus the BoundedEventQueue it uses now.
+
+Producer threads stand in for event sources and put arrival/removal cycles
+for a set of devices as fast as they can, while a consumer standing in for
+the dispatcher takes events off the queue and hands them to a
+KeyedWorkerPool of --workers threads, each spending --handler-time seconds
+per event; the pool is bounded the way main() bounds it, so its backlog
+pushes back on the queue. tracemalloc
+samples the traced memory while the flood runs; with the bounded queue it
+stays flat once the queue is full, and every arrival put is either
+dispatched or merged into an identical queued arrival. Run from the project
+root:
+
+    python benchmarks/bench_event_queue.py --seconds 5 --capacity 1024
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dispatch import BoundedEventQueue, KeyedWorkerPool
+
+
+def flood(q, seconds, producers, devices, handler_time, workers, sample_every=0.5):
+    stop = threading.Event()
+    lock = threading.Lock()
+    put_counts = {'arrival': 0, 'removal': 0}
+    got_counts = {'arrival': 0, 'removal': 0}
+
+    def produce(n):
+        i = 0
+        while not stop.is_set():
+            device = f"\\\\?\\Volume{{flood-{n}-{i % devices}}}\\"
+            for event in (('arrival', 'E:', device), ('removal', device)):
+                try:
+                    q.put(event, timeout=0.1)
+                except queue.Full:
+                    continue # blocked by backpressure; retry with the next cycle
+                with lock:
+                    put_counts[event[0]] += 1
+            i += 1
+
+    def handle(kind, *args):
+        time.sleep(handler_time)
+        with lock:
+            got_counts[kind] += 1
+
+    bounded = isinstance(q, BoundedEventQueue)
+    pool = KeyedWorkerPool(workers, max_pending=2 * workers if bounded else None)
+
+    def consume():
+        while not stop.is_set() or q.qsize():
+            try:
+                event = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            pool.submit(event[-1], handle, *event)
+
+    tracemalloc.start()
+    threads = [threading.Thread(target=produce, args=(n,), daemon=True) for n in range(producers)]
+    consumer = threading.Thread(target=consume, daemon=True)
+    for t in threads + [consumer]:
+        t.start()
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        time.sleep(sample_every)
+        samples.append(tracemalloc.get_traced_memory()[0])
+    stop.set()
+    for t in threads:
+        t.join()
+    depth_at_stop = q.qsize() + pool.pending_count()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # Drain without the simulated handler time so arrivals can be accounted for
+    handler_time = 0
+    consumer.join()
+    pool.shutdown(wait=True)
+    return {'samples': samples, 'peak': peak, 'depth_at_stop': depth_at_stop,
+            'put': put_counts, 'got': got_counts}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--seconds", type=float, default=5.0, help="length of the flood")
+    ap.add_argument("--capacity", type=int, default=1024, help="BoundedEventQueue capacity")
+    ap.add_argument("--producers", type=int, default=2, help="event source threads")
+    ap.add_argument("--devices", type=int, default=5000, help="distinct devices per producer")
+    ap.add_argument("--workers", type=int, default=4, help="dispatcher worker threads")
+    ap.add_argument("--handler-time", type=float, default=0.004, help="seconds a worker spends per event")
+    args = ap.parse_args()
+
+    for label, q in (("unbounded", queue.Queue()), (f"bounded({args.capacity})", BoundedEventQueue(args.capacity))):
+        r = flood(q, args.seconds, args.producers, args.devices, args.handler_time, args.workers)
+        samples = [s / 1e6 for s in r['samples']]
+        # Growth over the second half of the flood, once a bounded queue has filled up
+        half = samples[len(samples) // 2:]
+        print(f"{label:>16}: traced MB " + " ".join(f"{s:.1f}" for s in samples))
+        print(f"{'':>16}  peak={r['peak'] / 1e6:.1f}MB second-half growth={half[-1] - half[0]:+.2f}MB "
+              f"depth at stop={r['depth_at_stop']:,}")
+        print(f"{'':>16}  put arrivals={r['put']['arrival']:,} removals={r['put']['removal']:,}; "
+              f"dispatched arrivals={r['got']['arrival']:,} removals={r['got']['removal']:,}")
+        if isinstance(q, BoundedEventQueue):
+            stats = q.stats()
+            print(f"{'':>16}  high water={stats['high_water']:,} merged={stats['merged']} "
+                  f"dropped removals={stats['dropped']:,} producer waits={stats['blocked']:,}")
+            lost = r['put']['arrival'] - r['got']['arrival'] - stats['merged'].get('arrival', 0)
+            print(f"{'':>16}  arrivals lost: {lost}")
+
+
+if __name__ == "__main__":
+    main()
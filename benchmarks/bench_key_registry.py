@@ -0,0 +1,66 @@
+"""
+Validation cost of the KeyRegistry as the number of issued keys grows,
+compared with a linear scan over the raw keys. Also times the registry
+(re)load and the bounded auth-file read against an oversized file.
+
+    python benchmarks/bench_key_registry.py --sizes 10 1000 10000 100000
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.auth import KeyRegistry, HASH_PREFIX, key_digest, read_auth_token, AuthFileTooLarge
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 100000])
+    ap.add_argument("--checks", type=int, default=20000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            keys = [secrets.token_hex(16) for _ in range(size)]
+            path = os.path.join(tmp, f"keys-{size}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(HASH_PREFIX + key_digest(k).hex() + "\n" for k in keys)
+                f.write("!" + keys[0] + "\n")
+
+            registry = KeyRegistry(path, expected_key=None)
+            start = time.perf_counter()
+            len(registry) # forces the load
+            load = time.perf_counter() - start
+
+            hit, miss = keys[size // 2], secrets.token_hex(16)
+            hit_cost = per_call(lambda: registry.check(hit), args.checks)
+            miss_cost = per_call(lambda: registry.check(miss), args.checks)
+            linear_calls = max(10, args.checks // max(1, size // 100))
+            linear = per_call(lambda: miss in keys, linear_calls)
+            print(f"keys={size:>7,}  load={load * 1e3:8.1f}ms  check hit={hit_cost * 1e6:6.2f}us "
+                  f"miss={miss_cost * 1e6:6.2f}us  linear scan={linear * 1e6:9.2f}us")
+
+        huge = os.path.join(tmp, "auth_key.txt")
+        with open(huge, "wb") as f:
+            f.truncate(1 << 30) # 1 GiB sparse file
+        start = time.perf_counter()
+        try:
+            read_auth_token(huge)
+        except AuthFileTooLarge:
+            pass
+        print(f"1 GiB auth file rejected after {(time.perf_counter() - start) * 1e6:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Log archive: rotation cost on the logging thread, compression, and indexed
+search versus decompressing every segment.
+
+Writes --lines log lines (arrival banners of --devices devices, one arrival
+every few seconds of log time) through utils.log_archive.ArchivingFileHandler
+with --max-mb segments, then searches a --window-minute time range in the
+middle of the history and one device's lines, both through the segment
+indexes and by decompressing and filtering every segment. Run from the
+project root:
+
+    python benchmarks/bench_log_search.py --lines 600000 --max-mb 5 --window 10
+"""
+import argparse
+import gzip
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_harness import percentiles
+from utils.log_archive import ArchivingFileHandler, LogArchive, archiver, _segment_paths
+import utils.log_archive
+
+BANNER = [
+    "--- USB Drive Arrival Detected ---",
+    "  Drive Letter: %s",
+    "  Volume GUID:  \\\\?\\Volume{%s}\\",
+    "---------------------------------",
+    "State for \\\\?\\Volume{%s}\\ set to 'checking'",
+    "Starting root file enumeration for %s...",
+    "Completed root file enumeration for %s. Listed 37 items.",
+    "Authorization key accepted on %s.",
+    "Device \\\\?\\Volume{%s}\\ allowed.",
+]
+
+
+def write_log(log_path, lines, devices, max_bytes, start):
+    """
+    Logs `lines` lines with timestamps from `start`.
+
+    Returns:
+        tuple: (rollover durations in seconds, device GUIDs, timestamp of the last line)
+    """
+    guids = [str(uuid.uuid4()) for _ in range(devices)]
+    handler = ArchivingFileHandler(log_path, maxBytes=max_bytes, keep=0)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    rollovers = []
+    do_rollover = handler.doRollover
+    def timed_rollover():
+        started = time.perf_counter()
+        do_rollover()
+        rollovers.append(time.perf_counter() - started)
+    handler.doRollover = timed_rollover
+
+    rng = random.Random(1)
+    written, now = 0, start
+    while written < lines:
+        guid, drive = rng.choice(guids), f"{rng.choice('DEFGHIJK')}:"
+        for template in BANNER:
+            arg = guid if "Volume{" in template else drive
+            record = logging.makeLogRecord({'msg': template, 'args': (arg,) if "%s" in template else (),
+                                            'levelno': logging.INFO, 'levelname': 'INFO'})
+            record.created, record.msecs = now, (now % 1) * 1000
+            handler.handle(record)
+            now += 0.01
+        written += len(BANNER)
+        now += rng.uniform(1, 10)
+    handler.close()
+    return rollovers, guids, now
+
+
+def full_scan(log_path, since=None, until=None, needle=None):
+    """Decompresses every segment and filters its lines; returns (lines, bytes)."""
+    found, decompressed = [], 0
+    for _, path in _segment_paths(log_path) + [(None, log_path)]:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            data = f.read()
+        decompressed += len(data)
+        for line in data.decode('utf-8').splitlines():
+            stamp = line[:23]
+            if since and stamp < since or until and stamp[:len(until)] > until:
+                continue
+            if needle and needle not in line.lower():
+                continue
+            found.append(line)
+    return found, decompressed
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--lines", type=int, default=600000, help="log lines to write")
+    ap.add_argument("--devices", type=int, default=2000, help="distinct devices arriving")
+    ap.add_argument("--max-mb", type=float, default=5.0, help="segment size (rotation threshold)")
+    ap.add_argument("--window", type=float, default=10.0, help="minutes of log time to search")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="usblogger-logsearch-")
+    try:
+        log_path = os.path.join(workdir, "usb_monitor.log")
+        start = time.time() - 30 * 86400
+        started = time.perf_counter()
+        compress = []
+        archive = utils.log_archive.archive_segment
+        def timed_archive(path, index_every):
+            t = time.perf_counter()
+            index = archive(path, index_every)
+            compress.append(time.perf_counter() - t)
+            return index
+        utils.log_archive.archive_segment = timed_archive
+        rollovers, guids, end = write_log(log_path, args.lines, args.devices, int(args.max_mb * 1024 * 1024), start)
+        write_s = time.perf_counter() - started
+        archiver.wait()
+        utils.log_archive.archive_segment = archive
+
+        segments = [path for _, path in _segment_paths(log_path)]
+        raw = len(segments) * args.max_mb * 1024 * 1024
+        packed = sum(os.path.getsize(p) + os.path.getsize(p[:-3] + ".idx") for p in segments)
+        print(f"{args.lines:,} lines in {write_s:.1f}s -> {len(segments)} segment(s), "
+              f"{packed / raw * 100:.1f}% of the uncompressed size including indexes")
+        print(f"  rollover on the logging thread: p50={percentiles(rollovers).get('p50')}ms "
+              f"max={percentiles(rollovers).get('max')}ms")
+        print(f"  archiving (gzip + index) on the archiver thread: p50={percentiles(compress).get('p50')}ms per segment")
+
+        middle = start + (end - start) / 2
+        fmt = "%Y-%m-%d %H:%M"
+        since = time.strftime(fmt, time.localtime(middle))
+        until = time.strftime(fmt, time.localtime(middle + args.window * 60 - 60))
+        guid = guids[len(guids) // 2]
+        archive_search = LogArchive(log_path)
+        queries = (
+            (f"{args.window:g} min window", lambda: list(archive_search.search(since, until)),
+             lambda: full_scan(log_path, since, until)),
+            ("one device", lambda: list(archive_search.search(device=guid)),
+             lambda: full_scan(log_path, needle=guid)),
+        )
+        for label, indexed, scan in queries:
+            found, indexed_ms = timed(indexed)
+            stats = archive_search.stats()
+            (expected, scanned_bytes), scan_ms = timed(scan)
+            print(f"  {label}: {len(found):,} line(s){'' if len(found) == len(expected) else ' (MISMATCH)'}; "
+                  f"indexed {indexed_ms:.0f} ms ({stats['blocks_read']} block(s), "
+                  f"{stats['bytes_decompressed'] / 1e6:.1f} MB, {stats['segments_skipped']} of "
+                  f"{stats['segments']} file(s) skipped) vs full scan {scan_ms:.0f} ms ({scanned_bytes / 1e6:.1f} MB)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
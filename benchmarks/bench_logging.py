@@ -0,0 +1,149 @@
+"""
+Per-event cost of logging on the thread that handles a device.
+
+Captures the log calls one arrival makes (including the DEBUG dumps of the
+summary entry), then replays them --events times and reports the time the
+calling thread spends per event in three set-ups:
+
+  before   handlers on the root logger, root level DEBUG, messages formatted
+           up front as the f-strings used to
+  lazy     handlers on the root logger, root level INFO, %-style arguments
+  queue    [Logging] Mode = queue: a QueueHandler on the root logger and the
+           console and file handlers on a listener thread
+
+and then runs --devices arrivals through the isolated pipeline (see
+pipeline_harness.py) in 'direct' and 'queue' mode. --write-latency adds a
+delay to every log file write, standing in for a slow or scanned disk.
+Console output goes to os.devnull. Run from the project root:
+
+    python benchmarks/bench_logging.py --events 2000 --devices 200 --write-latency 0.5
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_harness import PipelineHarness, percentiles
+from utils import logging_setup
+import usb_logger_win
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.calls = []
+
+    def emit(self, record):
+        self.calls.append((record.levelno, record.msg, record.args))
+
+
+def capture_arrival():
+    """The (level, message, args) of every log call made while handling one arrival."""
+    with PipelineHarness(enum_level='root') as h:
+        drive, = h.make_drives(1, files=20)
+        capture = _Capture()
+        setup = usb_logger_win.setup_logging
+        def setup_with_capture():
+            logger = setup()
+            logger.addHandler(capture)
+            logger.setLevel(logging.DEBUG)
+            return logger
+        usb_logger_win.setup_logging = setup_with_capture
+        h.run([('arrival', drive, 'captured-volume')])
+    start = next(i for i, (_, msg, args) in enumerate(capture.calls) if 'captured-volume' in str(args))
+    return [call for call in capture.calls[start:] if 'Summary persister stopped' not in call[1]]
+
+
+def slow_file_writes(logger, latency):
+    """Delays every write of the rotating file handler by `latency` seconds."""
+    handlers = list(logger.handlers)
+    if logging_setup._listener is not None:
+        handlers += logging_setup._listener.handlers
+    for handler in handlers:
+        if isinstance(handler, logging.handlers.RotatingFileHandler):
+            emit = handler.emit
+            def slow_emit(record, emit=emit):
+                time.sleep(latency)
+                emit(record)
+            handler.emit = slow_emit
+
+
+def replay(calls, events, mode, eager, log_path, write_latency):
+    logger = logging_setup.setup_logging(mode=mode, log_path=log_path)
+    if eager:
+        logger.setLevel(logging.DEBUG)
+    slow_file_writes(logger, write_latency)
+    samples = []
+    for _ in range(events):
+        started = time.perf_counter()
+        if eager:
+            for level, msg, args in calls:
+                logging.log(level, msg % args if args else msg)
+        else:
+            for level, msg, args in calls:
+                logging.log(level, msg, *args)
+        samples.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    logging_setup.stop_log_listener()
+    drained = time.perf_counter() - started
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
+    return percentiles(samples), drained
+
+
+def pipeline(devices, mode, write_latency):
+    with PipelineHarness(enum_level='root') as h:
+        drives = h.make_drives(devices, files=20)
+        log_path = os.path.join(h.workdir, "usb_monitor.log")
+        def setup():
+            logger = logging_setup.setup_logging(mode=mode, log_path=log_path)
+            slow_file_writes(logger, write_latency)
+            return logger
+        usb_logger_win.setup_logging = setup
+        result = h.run([('arrival', drive, f"logged-volume-{i}") for i, drive in enumerate(drives)])
+        logging_setup.stop_log_listener()
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--events", type=int, default=2000, help="arrivals' worth of log calls to replay")
+    ap.add_argument("--devices", type=int, default=200, help="arrivals run through the pipeline")
+    ap.add_argument("--write-latency", type=float, default=0.0, help="ms added to each log file write")
+    args = ap.parse_args()
+    write_latency = args.write_latency / 1000.0
+
+    stderr, sys.stderr = sys.stderr, open(os.devnull, "w")
+    try:
+        calls = capture_arrival()
+        log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_logging.log")
+        rows = []
+        for label, mode, eager in (("before", 'direct', True), ("lazy", 'direct', False), ("queue", 'queue', False)):
+            latency, drained = replay(calls, args.events, mode, eager, log_path, write_latency)
+            rows.append((label, latency, drained))
+        os.remove(log_path)
+        runs = [(mode, pipeline(args.devices, mode, write_latency)) for mode in ('direct', 'queue')]
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+
+    debug = sum(1 for level, _, _ in calls if level < logging.INFO)
+    print(f"one arrival logs {len(calls)} call(s), {debug} of them DEBUG; "
+          f"file write latency {args.write_latency:g} ms")
+    for label, latency, drained in rows:
+        print(f"  {label:>6}: per event p50={latency.get('p50')}ms p99={latency.get('p99')}ms"
+              + (f"  (listener drained the backlog in {drained * 1000:.0f} ms)" if label == "queue" else ""))
+    print(f"{args.devices} arrivals through the pipeline:")
+    for mode, r in runs:
+        handler, decision = r["handler_ms"], r["decision_latency_ms"]
+        print(f"  {mode:>6}: {r['handled']}/{r['events']} handled, {r['events_per_sec']:,.0f} events/s, "
+              f"handler p50={handler.get('p50')}ms p99={handler.get('p99')}ms, "
+              f"decision p99={decision.get('p99')}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+End-to-end benchmark suite for the arrival/removal pipeline. Each scenario
+runs the real handlers through usb_logger_win.main() (see pipeline_harness)
+and reports p50/p95/p99 decision latency (event queued -> arrival handled),
+events/sec and summary bytes written. Results are saved as JSON; pass
+--compare with an earlier results file to print the change per metric.
+
+    python benchmarks/bench_pipeline.py --output before.json
+    python benchmarks/bench_pipeline.py --output after.json --compare before.json
+    python benchmarks/bench_pipeline.py --scenarios flapping --debounce
+    python benchmarks/bench_pipeline.py --entry asyncio
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_harness import PipelineHarness
+from utils.event_sources import SimulatedEventSource
+
+
+def single_arrival(args):
+    """One device inserted and removed repeatedly, paced so events never overlap."""
+    with PipelineHarness(workers=args.workers, entry=args.entry) as h:
+        drives = h.make_drives(1, files=args.files)
+        return h.run(SimulatedEventSource.storm(drives, args.repeats), rate=50)
+
+def storm(args):
+    """A hub's worth of devices arriving at once, then all removed."""
+    with PipelineHarness(workers=args.workers, entry=args.entry) as h:
+        drives = h.make_drives(args.storm_devices, files=args.files)
+        return h.run(SimulatedEventSource.storm(drives, 1))
+
+def flapping(args):
+    """One device on a loose connector: back-to-back arrival/removal cycles (debounced with --debounce)."""
+    with PipelineHarness(workers=args.workers, entry=args.entry, debounce=args.debounce) as h:
+        drives = h.make_drives(1, files=args.files, authorized_every=0)
+        return h.run(SimulatedEventSource.storm(drives, args.flaps))
+
+def reinsert(args):
+    """One authorized stick re-inserted at a steady pace (exercises the admission cache when on)."""
+    with PipelineHarness(workers=args.workers, entry=args.entry, admission=args.admission) as h:
+        drives = h.make_drives(1, files=args.files, authorized_every=1)
+        return h.run(SimulatedEventSource.storm(drives, args.repeats), rate=20)
+
+def large_root(args):
+    """A stick whose root directory holds many entries, all enumerated."""
+    with PipelineHarness(workers=args.workers, entry=args.entry, max_root=args.large_files) as h:
+        drives = h.make_drives(1, files=args.large_files)
+        return h.run(SimulatedEventSource.storm(drives, 3))
+
+SCENARIOS = {
+    "single_arrival": single_arrival,
+    "storm": storm,
+    "flapping": flapping,
+    "reinsert": reinsert,
+    "large_root": large_root,
+}
+
+
+def compare(current, previous):
+    for name, result in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        print(f"{name}:")
+        for metric, path in (("events/s", ("events_per_sec",)),
+                             ("decision p50 ms", ("decision_latency_ms", "p50")),
+                             ("decision p99 ms", ("decision_latency_ms", "p99")),
+                             ("summary bytes", ("summary_bytes_written",))):
+            old, new = before, result
+            for key in path:
+                old, new = old.get(key, {}), new.get(key, {})
+            if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+                print(f"  {metric:<16} {old:>12,.2f} -> {new:>12,.2f}  ({(new - old) / old * 100:+.1f}%)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    ap.add_argument("--workers", type=int, default=None, help="dispatcher pool size (default: config)")
+    ap.add_argument("--files", type=int, default=20, help="root entries per simulated drive")
+    ap.add_argument("--repeats", type=int, default=20, help="cycles for single_arrival")
+    ap.add_argument("--storm-devices", type=int, default=50)
+    ap.add_argument("--flaps", type=int, default=200)
+    ap.add_argument("--large-files", type=int, default=20000)
+    ap.add_argument("--admission", action="store_true", help="enable the admission cache in reinsert")
+    ap.add_argument("--debounce", action="store_true", help="enable debouncing and flap suppression in flapping")
+    ap.add_argument("--entry", choices=("threads", "asyncio"), default="threads",
+                    help="monitor entry point: usb_logger_win or usb_logger_async")
+    ap.add_argument("--output", default="bench_pipeline_results.json")
+    ap.add_argument("--compare", help="earlier results file to compare against")
+    args = ap.parse_args()
+
+    results = {}
+    for name in args.scenarios:
+        result = SCENARIOS[name](args)
+        results[name] = result
+        latency = result["decision_latency_ms"]
+        print(f"{name:<15} {result['handled']:>6}/{result['events']} events  "
+              f"{result['events_per_sec']:>9,.1f} ev/s  decision p50={latency.get('p50')}ms "
+              f"p95={latency.get('p95')}ms p99={latency.get('p99')}ms  "
+              f"summary={result['summary_bytes_written']:,}B in {result['summary_writes']} write(s)")
+        if result.get("debounce"):
+            print(f"{'':<15} debounced: {result['debounce']['absorbed']} absorbed, "
+                  f"{result['debounce']['flaps']} flapping episode(s)")
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                            "platform": platform.platform(), "args": vars(args)},
+                   "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f).get("results", {}))
+
+
+if __name__ == "__main__":
+    main()
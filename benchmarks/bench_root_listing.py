@@ -0,0 +1,81 @@
+"""
+Summary size and save/load time with root listings stored inline (the old
+extra_data.files_enumeration dicts with ISO timestamps) versus in compressed
+per-device sidecar files referenced from the summary. Also times migrating
+the inline form and lazily loading one device's sidecar, as the details
+view does.
+
+    python benchmarks/bench_root_listing.py --devices 500 --entries 100
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.enumeration import migrate_root_listings, load_root_listing
+
+
+def inline_summary(devices, entries):
+    now = datetime.datetime(2024, 5, 1, 12, 0, 0)
+    summary = {}
+    for d in range(devices):
+        listing = {}
+        for e in range(entries):
+            ts = (now + datetime.timedelta(minutes=d * entries + e)).isoformat()
+            listing[f"Document_{e:04d}.docx"] = {"size": 1000 * e, "created": ts, "modified": ts,
+                                                 "accessed": ts, "is_dir": e % 10 == 0}
+        summary[f"\\\\?\\Volume{{{d:08x}-0000-0000-0000-000000000000}}\\"] = {
+            "first_seen": now.isoformat(), "last_seen": now.isoformat(), "last_state": "allowed",
+            "arrival_count": 3, "volume_details": {"VolumeName": "STICK", "FileSystem": "FAT32"},
+            "extra_data": {"files_enumeration": listing}}
+    return summary
+
+
+def time_round_trip(summary, repeats=3):
+    best_dump = best_load = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = json.dumps(summary, separators=(",", ":"))
+        best_dump = min(best_dump, time.perf_counter() - start)
+        start = time.perf_counter()
+        json.loads(payload)
+        best_load = min(best_load, time.perf_counter() - start)
+    return len(payload.encode("utf-8")), best_dump, best_load
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--devices", type=int, default=500)
+    ap.add_argument("--entries", type=int, default=100, help="root entries per device (MaxRootFiles)")
+    args = ap.parse_args()
+
+    summary = inline_summary(args.devices, args.entries)
+    size, dump, load = time_round_trip(summary)
+    print(f"inline : summary={size:>12,}B  save={dump * 1e3:8.1f}ms  load={load * 1e3:8.1f}ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        import utils.enumeration
+        utils.enumeration.ENUM_OUTPUT_DIR = tmp
+        start = time.perf_counter()
+        migrated = migrate_root_listings(summary)
+        migrate = time.perf_counter() - start
+        size, dump, load = time_round_trip(summary)
+        sidecars = sum(os.path.getsize(os.path.join(tmp, n)) for n in os.listdir(tmp))
+        print(f"sidecar: summary={size:>12,}B  save={dump * 1e3:8.1f}ms  load={load * 1e3:8.1f}ms  "
+              f"sidecars={sidecars:,}B total ({sidecars // max(1, len(migrated)):,}B/device)")
+
+        ref = next(iter(summary.values()))["extra_data"]["files_enumeration_ref"]
+        start = time.perf_counter()
+        for _ in range(100):
+            listing = load_root_listing(ref)
+        print(f"migration of {len(migrated)} device(s): {migrate:.3f}s; "
+              f"lazy load of one listing ({len(listing)} entries): {(time.perf_counter() - start) * 10:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
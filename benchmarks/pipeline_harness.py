@@ -0,0 +1,297 @@
+"""
+Runs the real monitor pipeline (usb_logger_win.main and its handlers) in
+isolation for benchmarks: temporary directories act as drives, a FakeClock
+makes fixed waits free, a FakeDeviceInfoProvider stands in for WMI and a stub
+replaces the eject DLL. The summary, journal and log go to a scratch
+directory, so the project's own files are never touched.
+"""
+import asyncio
+import collections
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import usb_logger_async
+import usb_logger_win
+import utils.enumeration
+import utils.hashing
+import utils.summary
+from utils.clock import FakeClock, get_clock, set_clock
+from utils.admission import AdmissionCache
+from utils.debounce import EventDebouncer
+from utils.auth import KeyRegistry
+from utils.config import REQUIRED_FILE
+from utils.device import FakeDeviceInfoProvider, get_provider, set_provider
+from utils.eject import set_eject_backend, dll_eject
+from utils.event_sources import SimulatedEventSource
+from utils.summary import flush_summary, persister_stats, SUMMARY_FILE
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of `samples` (seconds) in milliseconds, plus the max."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f"p{p}": round(ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] * 1e3, 3)
+              for p in points}
+    result["max"] = round(ordered[-1] * 1e3, 3)
+    return result
+
+
+class _StampingQueue:
+    """Records when each event was queued so latency includes time spent waiting for dispatch."""
+
+    def __init__(self, q, stamps):
+        self._q = q
+        self._stamps = stamps
+
+    def put(self, event, *args, **kwargs):
+        self._stamps[(event[0], event[-1])].append(time.perf_counter())
+        self._q.put(event, *args, **kwargs)
+
+
+class _TimedSource(SimulatedEventSource):
+    def __init__(self, events, rate, stamps):
+        super().__init__(events, rate)
+        self._stamps = stamps
+
+    def run(self, q, stop_event):
+        super().run(_StampingQueue(q, self._stamps), stop_event)
+
+
+class PipelineHarness:
+    """
+    Context manager that patches the monitor for an isolated run and restores
+    everything on exit.
+
+    Args:
+        enum_level (str): Enumeration level for the run ('none', 'root' or 'recursive').
+        hashing (bool): Whether enumerated files are hashed.
+        admission (bool): Whether the fast-path admission cache is on (starts empty).
+        entry (str): 'threads' runs usb_logger_win.main(), 'asyncio' runs
+                     usb_logger_async.main().
+        debounce (bool): Whether events pass through a fresh EventDebouncer.
+        debounce_tick (float): Virtual seconds the clock advances per 10 ms of
+                               real waiting, so debounce windows and cooling-off
+                               periods elapse during a run.
+        max_root (int): Root entry cap; None keeps the configured value.
+        probe_mode (str): 'adaptive' or 'fixed' mount readiness.
+        mount_delay (float): MountStabilityDelay for 'fixed'; None keeps the configured value.
+        real_clock (bool): Keep the system clock, so fixed waits really elapse.
+        workers (int): Dispatcher pool size; None keeps the configured value.
+        eject_succeeds (bool): What the stub eject backend reports.
+        eject_latency (float): Seconds the stub eject blocks (real time).
+        device_latency (float): Seconds each fake device-info query blocks.
+    """
+
+    KEY = "bench-auth-key"
+
+    def __init__(self, enum_level='root', max_root=None, probe_mode='adaptive', workers=None,
+                 eject_succeeds=True, eject_latency=0.0, device_latency=0.0, hashing=False, admission=False,
+                 debounce=False, debounce_tick=1.0, entry='threads',
+                 mount_delay=None, real_clock=False):
+        self.settings = {'ENUM_LEVEL': enum_level, 'MOUNT_PROBE_MODE': probe_mode, 'HASH_ENABLED': hashing,
+                         'ADMISSION_ENABLED': admission, 'DEBOUNCE_ENABLED': debounce}
+        if max_root is not None:
+            self.settings['MAX_ROOT'] = max_root
+        if workers is not None:
+            self.settings['WORKER_POOL_SIZE'] = workers
+        if mount_delay is not None:
+            self.settings['MOUNT_DELAY'] = mount_delay
+        self.real_clock = real_clock
+        self.entry = entry
+        self.eject_succeeds = eject_succeeds
+        self.eject_latency = eject_latency
+        self.provider = FakeDeviceInfoProvider(latency=device_latency)
+        self.clock = FakeClock()
+        self.debounce_tick = debounce_tick if debounce else 0.0
+        self.ejects = 0
+
+    # ─── setup / teardown ──────────────────────────────────────────────────
+    def __enter__(self):
+        self.workdir = tempfile.mkdtemp(prefix="usblogger-bench-")
+        self._saved = {
+            'summary_dir': utils.summary.SCRIPT_DIR,
+            'enum_dir': utils.enumeration.ENUM_OUTPUT_DIR,
+            'hash_dir': utils.hashing.HASH_CACHE_DIR,
+            'provider': get_provider(),
+            'clock': get_clock(),
+            'async_arrival': usb_logger_async.handle_usb_arrival,
+            'monitor': {name: getattr(usb_logger_win, name) for name in
+                        list(self.settings) + ['SCRIPT_DIR', 'setup_logging',
+                                               'key_registry', 'admission_cache', 'debouncer',
+                                               'handle_usb_arrival', 'handle_usb_removal']},
+        }
+        utils.summary.SCRIPT_DIR = self.workdir
+        utils.enumeration.ENUM_OUTPUT_DIR = os.path.join(self.workdir, "enumerations")
+        utils.hashing.HASH_CACHE_DIR = os.path.join(self.workdir, "hashes")
+        usb_logger_win.SCRIPT_DIR = self.workdir
+        for name, value in self.settings.items():
+            setattr(usb_logger_win, name, value)
+        usb_logger_win.setup_logging = self._setup_logging
+        usb_logger_win.admission_cache = AdmissionCache()
+        usb_logger_win.debouncer = EventDebouncer()
+        usb_logger_win.key_registry = KeyRegistry(os.path.join(self.workdir, "authorized_keys.txt"),
+                                                  expected_key=self.KEY)
+        set_provider(self.provider)
+        if not self.real_clock:
+            set_clock(self.clock)
+        set_eject_backend(self._eject)
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self._saved['monitor'].items():
+            setattr(usb_logger_win, name, value)
+        usb_logger_async.handle_usb_arrival = self._saved['async_arrival']
+        utils.summary.SCRIPT_DIR = self._saved['summary_dir']
+        utils.enumeration.ENUM_OUTPUT_DIR = self._saved['enum_dir']
+        utils.hashing.HASH_CACHE_DIR = self._saved['hash_dir']
+        set_provider(self._saved['provider'])
+        set_clock(self._saved['clock'])
+        set_eject_backend(dll_eject)
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _setup_logging(self):
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+        handler = logging.FileHandler(os.path.join(self.workdir, "usb_monitor.log"), encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        return root
+
+    def _eject(self, volume_path):
+        self.ejects += 1
+        if self.eject_latency:
+            time.sleep(self.eject_latency)
+        return self.eject_succeeds
+
+    # ─── fixtures ──────────────────────────────────────────────────────────
+    def make_drives(self, count, files=20, authorized_every=2):
+        """
+        Creates `count` directories acting as drives, each holding `files`
+        empty files. Every `authorized_every`-th drive gets a valid key file
+        (0 for none), so a run exercises both the allow and the eject path.
+        """
+        drives = []
+        for i in range(count):
+            drive = os.path.join(self.workdir, "drives", f"drive{i}")
+            os.makedirs(drive)
+            for n in range(files):
+                open(os.path.join(drive, f"file{n:06d}.bin"), "wb").close()
+            if authorized_every and i % authorized_every == 0:
+                with open(os.path.join(drive, REQUIRED_FILE), "w", encoding="utf-8") as f:
+                    f.write(self.KEY)
+            self.provider.volumes[drive] = {"VolumeName": f"SIM{i}", "FileSystem": "FAT32",
+                                            "Size": "15728640000", "FreeSpace": "1000000",
+                                            "SerialNumber": str(0x5E1A0000 + i)}
+            drives.append(drive)
+        return drives
+
+    # ─── run ───────────────────────────────────────────────────────────────
+    def run(self, events, rate=None, timeout=600):
+        """
+        Feeds `events` through usb_logger_win.main() and waits until every
+        one has been handled (or absorbed by the debouncer).
+
+        Returns:
+            dict: Event counts, throughput, latency percentiles (ms) and
+                  summary write statistics.
+        """
+        stamps = collections.defaultdict(collections.deque)
+        decision, removal, handler_time = [], [], []
+        lock, all_done = threading.Lock(), threading.Event()
+        handled = [0]
+
+        def timed(handler, kind, samples):
+            def record(args, started):
+                finished = time.perf_counter()
+                with lock:
+                    queue_stamps = stamps[(kind, args[-1])]
+                    queued = queue_stamps.popleft() if queue_stamps else started
+                    samples.append(finished - queued)
+                    handler_time.append(finished - started)
+                    handled[0] += 1
+                    if handled[0] >= len(events):
+                        all_done.set()
+
+            if asyncio.iscoroutinefunction(handler):
+                async def async_wrapper(*args):
+                    started = time.perf_counter()
+                    try:
+                        await handler(*args)
+                    finally:
+                        record(args, started)
+                return async_wrapper
+
+            def wrapper(*args):
+                started = time.perf_counter()
+                try:
+                    handler(*args)
+                finally:
+                    record(args, started)
+            return wrapper
+
+        if self.entry == 'asyncio':
+            usb_logger_async.handle_usb_arrival = timed(self._saved['async_arrival'], 'arrival', decision)
+            entry_point = usb_logger_async.main
+        else:
+            usb_logger_win.handle_usb_arrival = timed(self._saved['monitor']['handle_usb_arrival'], 'arrival', decision)
+            entry_point = usb_logger_win.main
+        usb_logger_win.handle_usb_removal = timed(self._saved['monitor']['handle_usb_removal'], 'removal', removal)
+
+        stop_event = threading.Event()
+        source = _TimedSource(events, rate, stamps)
+        monitor = threading.Thread(target=entry_point,
+                                   kwargs={"stop_event": stop_event, "event_source": source})
+        start = time.perf_counter()
+        monitor.start()
+        completed = self._wait(all_done, len(events), handled, lock, start + timeout)
+        elapsed = time.perf_counter() - start
+        flush_summary()
+        writes = persister_stats()
+        stop_event.set()
+        monitor.join()
+
+        summary_path = os.path.join(self.workdir, SUMMARY_FILE)
+        return {
+            "events": len(events),
+            "handled": handled[0],
+            "completed": completed,
+            "elapsed_s": round(elapsed, 4),
+            "events_per_sec": round(handled[0] / elapsed, 1) if elapsed else 0.0,
+            "decision_latency_ms": percentiles(decision),
+            "removal_latency_ms": percentiles(removal),
+            "handler_ms": percentiles(handler_time),
+            "summary_writes": writes.get("writes", 0),
+            "summary_bytes_written": writes.get("bytes_written", 0),
+            "summary_file_bytes": os.path.getsize(summary_path) if os.path.exists(summary_path) else 0,
+            "ejects": self.ejects,
+            "virtual_sleep_s": round(self.clock.slept, 3),
+            "debounce": usb_logger_win.debouncer.stats() if self.debounce_tick else None,
+        }
+
+    def _wait(self, all_done, expected, handled, lock, deadline):
+        if not self.debounce_tick:
+            return all_done.wait(timeout=max(0.0, deadline - time.perf_counter()))
+        debouncer = usb_logger_win.debouncer
+        while time.perf_counter() < deadline:
+            if all_done.wait(timeout=0.01):
+                return True
+            self.clock.advance(self.debounce_tick)
+            with lock:
+                if handled[0] + debouncer.stats()["absorbed"] >= expected:
+                    return True
+        return False
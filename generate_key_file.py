@@ -1,13 +1,18 @@
 import secrets
 import os
+import argparse
 
 # --- Configuration ---
 OUTPUT_FILENAME = "auth_key.txt"
 TOKEN_LENGTH_BYTES = 16 # Creates a 32-character hex token
 # --- End Configuration ---
 
-def generate_local_auth_file():
-    """Generates a secure token and writes it to the specified file locally."""
+def generate_local_auth_file(registry=False):
+    """
+    Generates a secure token and writes it to the specified file locally.
+    With registry=True the key is also allowed in the key registry
+    (authorized_keys.txt, stored as a SHA-256 digest) instead of config.ini.
+    """
     try:
         # Generate a cryptographically strong random token
         master_key = secrets.token_hex(TOKEN_LENGTH_BYTES)
@@ -22,7 +27,13 @@ def generate_local_auth_file():
 
         print(f"Successfully generated '{OUTPUT_FILENAME}' in the script directory.")
         print("-" * 30)
-        print(f"IMPORTANT: Copy the following key into your config.ini under [Settings] as ExpectedAuthKey:")
+        if registry:
+            from utils.auth import add_key
+            from utils.config import KEY_REGISTRY_FILE
+            add_key(master_key, KEY_REGISTRY_FILE)
+            print(f"Key added to the key registry: {KEY_REGISTRY_FILE}")
+        else:
+            print(f"IMPORTANT: Copy the following key into your config.ini under [Settings] as ExpectedAuthKey:")
         print(master_key)
         print("-" * 30)
 
@@ -32,4 +43,7 @@ def generate_local_auth_file():
         print(f"ERROR: An unexpected error occurred: {e}")
 
 if __name__ == "__main__":
-    generate_local_auth_file()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate an auth_key.txt for a USB stick.")
+    parser.add_argument("--registry", action="store_true",
+                        help="allow the new key in the key registry (one key per stick)")
+    generate_local_auth_file(parser.parse_args().registry)
\ No newline at end of file
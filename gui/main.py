@@ -3,7 +3,10 @@
 import os
 import sys
 import json
+import time
+import datetime
 import threading
+import subprocess
 import logging
 import webbrowser
 import tkinter as tk
@@ -14,11 +17,9 @@ THIS_DIR         = os.path.dirname(os.path.abspath(__file__))
 USB_LOGGER_DIR = os.path.abspath(os.path.join(THIS_DIR, ".."))
 sys.path.insert(0, USB_LOGGER_DIR)
 
-import pythoncom
-import usb_logger_win
-from utils.summary import load_summary, save_summary, SUMMARY_FILE
+from utils.summary import SUMMARY_FILE
 from utils.config  import WMI_POLL, LOG_FILE, SCRIPT_DIR
-from utils.eject   import eject_drive_api
+from utils.ipc     import MonitorClient, ServiceError, ServiceUnavailable
 
 import pystray
 from PIL import Image, ImageDraw
@@ -46,6 +47,11 @@ LOG_PATH     = os.path.join(USB_LOGGER_DIR, LOG_FILE)
 SUMMARY_PATH = os.path.join(SCRIPT_DIR, SUMMARY_FILE)
 CONFIG_PATH  = os.path.join(USB_LOGGER_DIR, "config.ini")
 LOG_FILE_PATH_TO_CLEAR = os.path.join(USB_LOGGER_DIR, LOG_FILE)
+LOG_VIEW_LINES = 200
+SERVICE_SCRIPT = os.path.join(USB_LOGGER_DIR, "usb_monitor_service.py")
+SERVICE_START_TIMEOUT = 15 # seconds to wait for a service the GUI started itself
+SERVICE_STOP_TIMEOUT = 15  # seconds it gets to stop on exit before it is terminated
+SERVICE_RETRY_MS = 2000
 
 # Dark Mode Colors
 DARK_BG = "#212121"
@@ -57,16 +63,28 @@ DARK_WARNING = "#FFB74D"
 DARK_ERROR = "#F44336"
 DARK_SUCCESS = "#4CAF50"
 
-def start_monitor(stop_event):
-    pythoncom.CoInitialize()
-    try:
-        usb_logger_win.main(stop_event=stop_event)
-    except KeyboardInterrupt:
-        logging.info("Monitor thread received KeyboardInterrupt, shutting down...")
-    except Exception as e:
-        logging.error(f"Error in monitor thread: {e}")
-    finally:
-        pythoncom.CoUninitialize()
+def start_service():
+    """Starts the monitor service in the background; returns its process."""
+    logging.info("No monitor service running; starting one.")
+    return subprocess.Popen([sys.executable, SERVICE_SCRIPT], cwd=USB_LOGGER_DIR,
+                            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+def connect_to_service(timeout=0):
+    """
+    Connects to the monitor service, retrying for up to `timeout` seconds
+    while one is starting. Blocks, so call it off the Tk thread.
+
+    Raises:
+        ServiceUnavailable: No service answered in time.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return MonitorClient()
+        except ServiceUnavailable:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
 
 def create_tray_icon_image():
     """Create a simple USB icon for the tray."""
@@ -86,6 +104,12 @@ def format_bytes(size_bytes):
     else:
         return f"{size_bytes/(1024*1024*1024):.2f} GB"
 
+def format_timestamp(value):
+    """Format an epoch-seconds timestamp (or an ISO string from older summaries)."""
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value).isoformat(sep=" ")
+    return value or "Unknown"
+
 class USBLoggerGUI(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -101,9 +125,8 @@ class USBLoggerGUI(tk.Tk):
         # Apply dark theme
         self.apply_dark_theme()
 
-        # Monitor control state
-        self.monitor_running = True  # Initially running
-        self.stop_event = threading.Event()
+        # Monitor control state, kept in step with the service's status messages
+        self.monitor_running = True
 
         # Notebook tabs
         self.nb = ttk.Notebook(self)
@@ -121,26 +144,13 @@ class USBLoggerGUI(tk.Tk):
         self._build_settings()
         
         self.notifier = ToastNotifier()
-        _orig_arrival = usb_logger_win.handle_usb_arrival
-        def _patched_arrival(drive_letter, device_id):
-            _orig_arrival(drive_letter, device_id)
-            print(f"[DEBUG] patched_arrival: {drive_letter} {device_id}")
-            self.notifier.show_toast(
-                "USB Attached",
-                f"{drive_letter} is now online",
-                duration=4,
-                threaded=True
-            )
-        usb_logger_win.handle_usb_arrival = _patched_arrival
-
-        # start monitor thread
-        self.stop_event = threading.Event()
-        self.monitor_thread = threading.Thread(
-            target=start_monitor,
-            args=(self.stop_event,),
-            daemon=True
-        )
-        self.monitor_thread.start()
+
+        # The monitor runs in the service process; its state is pushed to us.
+        # A service the GUI had to start itself is stopped again on exit.
+        self.client = None
+        self.service_process = None
+        self._details_request = 0 # only the latest details reply is shown
+        self._connect_service()
 
         # Handle Ctrl+C in main thread
         self.bind_all("<Control-c>", self.handle_keyboard_interrupt)
@@ -150,22 +160,71 @@ class USBLoggerGUI(tk.Tk):
         tray_thread.start()
 
     def toggle_monitor(self):
-        if self.monitor_running:
-            self.stop_event.set()
-            self.toggle_monitor_btn.config(text="Start Monitoring")
-            logging.info("Stopping Monitor...")
-            self.monitor_running = False
-        else:
-            self.stop_event.clear()
-            self.monitor_thread = threading.Thread(target=start_monitor, args=(self.stop_event,), daemon=True)
-            self.monitor_thread.start()
-            self.toggle_monitor_btn.config(text="Stop Monitoring")
-            logging.info("Monitoring started.")
-            self.monitor_running = True
+        if self.client is None:
+            messagebox.showerror("Monitor service", "Not connected to the monitor service.")
+            return
+        try:
+            # The button follows the status message the service pushes back
+            self.client.set_monitoring(not self.monitor_running)
+        except ServiceError as e:
+            messagebox.showerror("Monitor service", f"Could not change monitoring: {e}")
+
+    def _set_monitor_state(self, running):
+        self.monitor_running = running
+        self.toggle_monitor_btn.config(text="Stop Monitoring" if running else "Start Monitoring")
         # Update tray menu text after toggling
         if self.tray_icon:
             self.tray_icon.update_menu()
 
+    # ─── Monitor Service ───────────────────────────────────────────────────────
+    def _connect_service(self):
+        # Starting the service and waiting for it can take seconds; keep the Tk loop responsive
+        threading.Thread(target=self._connect_worker, args=(self.service_process,),
+                         name="service-connect", daemon=True).start()
+
+    def _connect_worker(self, process):
+        client = error = None
+        try:
+            try:
+                client = connect_to_service()
+            except ServiceUnavailable:
+                if process is None or process.poll() is not None:
+                    process = start_service()
+                client = connect_to_service(SERVICE_START_TIMEOUT)
+            # Messages arrive on the client's reader thread; handle them on the Tk loop
+            client.subscribe(lambda message: self.after(0, self._on_service_message, message))
+        except ServiceError as e:
+            error = e
+        self.after(0, self._on_service_connected, client, process, error)
+
+    def _on_service_connected(self, client, process, error):
+        self.service_process = process
+        if error is None:
+            self.client = client
+            return
+        logging.error("Cannot reach the monitor service: %s", error)
+        if client is not None:
+            client.close()
+        self.after(SERVICE_RETRY_MS, self._connect_service)
+
+    def _on_service_message(self, message):
+        kind = message["type"]
+        if kind == "snapshot":
+            self._append_log_lines(message["log"], reset=True)
+            self._devices = dict(message["devices"])
+            self._sync_device_rows(self._devices)
+            self._set_monitor_state(message["monitoring"])
+        elif kind == "change":
+            self._apply_device_change(message)
+        elif kind == "log":
+            self._append_log_lines([message["line"]])
+        elif kind == "status":
+            self._set_monitor_state(message["monitoring"])
+        elif kind == "disconnected":
+            logging.warning("Lost connection to the monitor service; reconnecting...")
+            self.client = None
+            self.after(SERVICE_RETRY_MS, self._connect_service)
+
     def apply_dark_theme(self):
         """Apply dark mode theme to the application."""
         self.configure(bg=DARK_BG)
@@ -268,7 +327,7 @@ class USBLoggerGUI(tk.Tk):
             with open(LOG_FILE_PATH_TO_CLEAR, 'w') as f:
                 f.write('')  # Truncate the file
             messagebox.showinfo("Log Cleared", "Log file has been cleared.")
-            self._poll_log() # Refresh the log view in the GUI
+            self._append_log_lines([], reset=True)
         except Exception as e:
             logging.error(f"Error clearing log file: {e}")
             messagebox.showerror("Error", f"Could not clear log file: {e}")
@@ -311,28 +370,23 @@ class USBLoggerGUI(tk.Tk):
         frm.rowconfigure(0, weight=1)
         frm.columnconfigure(0, weight=1)
 
-        self.after(1000, self._poll_log)
-
-    def _poll_log(self):
-        if not self.winfo_exists():
-            return
-
-        if os.path.exists(LOG_PATH):
-            try:
-                with open(LOG_PATH, "r", encoding="utf-8", errors="ignore") as f:
-                    lines = f.readlines()[-200:]
+    def _append_log_lines(self, lines, reset=False):
+        """Appends pushed log lines to the view; `reset` clears it first."""
+        try:
+            if reset or lines:
                 self.log_text.config(state="normal")
-                self.log_text.delete("1.0", "end")
-                self.log_text.insert("end", "".join(lines))
-                self.log_text.see("end")
+                if reset:
+                    self.log_text.delete("1.0", "end")
+                if lines:
+                    self.log_text.insert("end", "\n".join(lines) + "\n")
+                    # Trim the oldest lines beyond the view limit
+                    line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                    if line_count > LOG_VIEW_LINES:
+                        self.log_text.delete("1.0", f"{line_count - LOG_VIEW_LINES + 1}.0")
+                    self.log_text.see("end")
                 self.log_text.config(state="disabled")
-            except Exception as e:
-                logging.error(f"Error reading log file: {e}")
-
-        try:
-            self.after(1000, self._poll_log)
         except tk.TclError:
-            pass
+            pass # window destroyed
 
     # ─── Devices Tab ───────────────────────────────────────────────────────────
     def _build_devices(self):
@@ -378,6 +432,11 @@ class USBLoggerGUI(tk.Tk):
         # Add selection event
         self.tree.bind("<<TreeviewSelect>>", self.on_device_select)
 
+        # Device entries as last pushed by the service, and the entry version
+        # each Treeview row shows (iid -> version) for incremental refreshes
+        self._devices = {}
+        self._row_versions = {}
+
         """
         # Button frame for left pane
         btn_frame = ttk.Frame(left_frame, style='TFrame')
@@ -406,44 +465,53 @@ class USBLoggerGUI(tk.Tk):
         self.details_text.insert(tk.END, "Select a device to view details")
         self.details_text.config(state=tk.DISABLED)
 
-        self._update_devices()
+    def _sync_device_rows(self, summary):
+        """
+        Applies a keyed diff between the summary and the Treeview: only rows
+        whose entry version changed are inserted, updated or deleted, so the
+        selection and scroll position survive a refresh.
+        """
+        for dev in [dev for dev in self._row_versions if dev not in summary]:
+            self.tree.delete(dev)
+            del self._row_versions[dev]
 
-    def _update_devices(self):
-        if not self.winfo_exists():  # Check if window still exists
+        for dev, data in summary.items():
+            self._set_device_row(dev, data)
+
+    def _set_device_row(self, dev, data):
+        version = data.get("version")
+        if dev in self._row_versions and self._row_versions[dev] == version:
             return
 
-        try:
-            # Remember selected item
-            selected = self.tree.selection()
-            selected_id = selected[0] if selected else None
-
-            self.tree.delete(*self.tree.get_children())
-            summary = load_summary()
-            for dev, data in summary.items():
-                # Show a shorter version of the device ID
-                display_id = dev.split("\\")[-2] if "\\" in dev else dev
-                if len(display_id) > 20:
-                    display_id = display_id[:17] + "..."
-
-                # Add to tree view with simplified data
-                self.tree.insert("", "end", iid=dev, values=(
-                    data.get("first_seen", "")[:16],
-                    data.get("last_drive_letter", ""),
-                    data.get("last_state", ""),
-                ))
-
-            # Restore selection if possible
-            if selected_id and selected_id in summary:
-                self.tree.selection_set(selected_id)
-                self.tree.see(selected_id)
-
-            self.after(2000, self._update_devices)
-        except tk.TclError:
-            # Widget destroyed, stop updating
-            pass
-        except Exception as e:
-            logging.error(f"Error updating devices: {e}")
-            self.after(2000, self._update_devices)
+        values = (
+            data.get("first_seen", "")[:16],
+            data.get("last_drive_letter", ""),
+            data.get("last_state", ""),
+        )
+        if dev in self._row_versions:
+            self.tree.item(dev, values=values)
+        else:
+            self.tree.insert("", "end", iid=dev, values=values)
+        self._row_versions[dev] = version
+
+    def _apply_device_change(self, message):
+        """Applies one pushed change to its row (and the details pane if it is selected)."""
+        dev, data = message["device_id"], message["entry"]
+        known = self._devices.get(dev)
+        # Changes queued before a snapshot may already be part of it
+        if known is not None and (known.get("version") or 0) >= (data.get("version") or 0):
+            return
+        self._devices[dev] = data
+        self._set_device_row(dev, data)
+        if dev in self.tree.selection():
+            self.display_device_details(dev)
+        if message["event"] == "checked":
+            self.notifier.show_toast(
+                "USB Attached",
+                f"{data.get('last_drive_letter', dev)} is now online",
+                duration=4,
+                threaded=True
+            )
 
     def on_device_select(self, event):
         """Show details for the selected device."""
@@ -456,11 +524,28 @@ class USBLoggerGUI(tk.Tk):
 
     def display_device_details(self, dev_id):
         """Display detailed information for a device."""
-        summary = load_summary()
-        if dev_id not in summary:
+        if self.client is None:
             return
+        # The service round trip can take seconds; keep the Tk loop responsive
+        self._details_request += 1
+        threading.Thread(target=self._details_worker, args=(self.client, dev_id, self._details_request),
+                         name="device-details", daemon=True).start()
 
-        data = summary[dev_id]
+    def _details_worker(self, client, dev_id, request):
+        reply = error = None
+        try:
+            reply = client.device(dev_id)
+        except ServiceError as e:
+            error = e
+        self.after(0, self._show_device_details, dev_id, request, reply, error)
+
+    def _show_device_details(self, dev_id, request, reply, error):
+        if request != self._details_request:
+            return # a later selection or change is already being loaded
+        if error is not None:
+            logging.error("Error loading details for %s: %s", dev_id, error)
+            return
+        data = reply["entry"]
 
         # Format the details
         details = []
@@ -472,6 +557,9 @@ class USBLoggerGUI(tk.Tk):
         details.append(f"🔹 Total Connections: {data.get('arrival_count', 0)}")
         details.append(f"🔹 Eject Success Count: {data.get('total_eject_success', 0)}")
         details.append(f"🔹 Eject Failure Count: {data.get('total_eject_failure', 0)}")
+        if data.get('flap_count'):
+            details.append(f"🔹 Flapping Episodes: {data['flap_count']} (last {data.get('last_flap', 'Unknown')}, "
+                           f"cooling off until {data.get('cooling_off_until', 'Unknown')})")
 
         # Volume details
         vol_details = data.get("volume_details", {})
@@ -495,16 +583,22 @@ class USBLoggerGUI(tk.Tk):
                 details.append(f"  • Size: {size}")
                 details.append(f"  • Free Space: {free}")
 
-        # File enumeration details
-        enum_data = data.get("extra_data", {}).get("files_enumeration", {})
+        # File enumeration details: the service reads the device's sidecar only when shown
+        extra = data.get("extra_data", {})
+        enum_data = reply["root_listing"] or extra.get("files_enumeration", {})
         if enum_data:
             details.append("\n📄 Top-Level Files and Directories:")
             for file_name, file_info in enum_data.items():
+                if not isinstance(file_info, dict):
+                    continue # '_truncated_' marker in older summaries
+                if "error" in file_info:
+                    details.append(f"  ⚠ {file_name}: {file_info['error']}")
+                    continue
                 is_dir = file_info.get("is_dir", False)
                 icon = "📁" if is_dir else "📄"
                 details.append(f"  {icon} {file_name}")
-                details.append(f"    • Created: {file_info.get('created', 'Unknown')}")
-                details.append(f"    • Modified: {file_info.get('modified', 'Unknown')}")
+                details.append(f"    • Created: {format_timestamp(file_info.get('created'))}")
+                details.append(f"    • Modified: {format_timestamp(file_info.get('modified'))}")
 
                 # Format size for files
                 if not is_dir:
@@ -514,6 +608,17 @@ class USBLoggerGUI(tk.Tk):
                     except (ValueError, TypeError):
                         details.append(f"    • Size: {size}")
 
+        # Recursive enumeration: the listing itself lives in a per-device file
+        walk = extra.get("recursive_enumeration")
+        if walk:
+            details.append("\n🗂 Recursive Enumeration:")
+            details.append(f"  • Entries: {walk.get('entries', 0)} in {walk.get('dirs', 0)} directories")
+            details.append(f"  • Deepest Level: {walk.get('max_depth_reached', 0)}")
+            details.append(f"  • Took: {walk.get('elapsed_seconds', 0)}s ({walk.get('entries_per_sec', 0)} entries/s)")
+            if walk.get("truncated"):
+                details.append(f"  • Truncated: {walk['truncated']}")
+            details.append(f"  • Listing: {walk.get('file', 'Unknown')}")
+
         # Update the details text widget
         self.details_text.config(state=tk.NORMAL)
         self.details_text.delete("1.0", tk.END)
@@ -526,12 +631,26 @@ class USBLoggerGUI(tk.Tk):
             messagebox.showinfo("Select a device","Pick a row first")
             return
         dev = sel[0]
-        summary = load_summary()
-        drive = summary.get(dev, {}).get("last_drive_letter")
-        if not drive:
-            messagebox.showerror("No drive letter", f"No letter recorded for {dev}")
+        if self.client is None:
+            messagebox.showerror("Monitor service", "Not connected to the monitor service.")
             return
-        ok = eject_drive_api(drive, dev)
+        # Ejecting can take up to a minute; wait for it off the Tk loop
+        threading.Thread(target=self._eject_worker, args=(self.client, dev),
+                         name="device-eject", daemon=True).start()
+
+    def _eject_worker(self, client, dev):
+        result = error = None
+        try:
+            result = client.eject(dev)
+        except ServiceError as e:
+            error = e
+        self.after(0, self._on_ejected, dev, result, error)
+
+    def _on_ejected(self, dev, result, error):
+        if error is not None:
+            messagebox.showerror("Eject", f"Could not eject {dev}: {error}")
+            return
+        drive, ok = result["drive"], result["ejected"]
         
         self.notifier.show_toast(
             "USB Eject",
@@ -642,7 +761,7 @@ class USBLoggerGUI(tk.Tk):
 
         with open(CONFIG_PATH, "w") as f:
             cfg.write(f)
-        messagebox.showinfo("Settings","Settings saved. Some changes require application restart.")
+        messagebox.showinfo("Settings","Settings saved. Some changes require restarting the monitor service.")
 
     # ─── Tray & Exit ───────────────────────────────────────────────────────────
     def initialize_tray_icon(self):
@@ -700,14 +819,6 @@ class USBLoggerGUI(tk.Tk):
 
     def exit_app(self):
         """Clean exit the application."""
-        # Save device summary before exit
-        try:
-            summary = load_summary()
-            save_summary(summary)
-            logging.info("Summary saved on exit")
-        except Exception as e:
-            logging.error(f"Error saving summary on exit: {e}")
-
         # Clean exit
         try:
             # Stop tray icon if it exists and is running
@@ -719,10 +830,22 @@ class USBLoggerGUI(tk.Tk):
         except:
             pass
 
-        # signal the monitor’s stop_event
-        self.stop_event.set()
-        # wait up to 5 s for it to finish
-        self.monitor_thread.join(timeout=5)
+        # Detach from the service. One this GUI started is asked to stop, as the
+        # monitor used to stop with the GUI; one started separately keeps running.
+        stop_requested = False
+        if self.client is not None:
+            if self.service_process is not None:
+                try:
+                    self.client.shutdown()
+                    stop_requested = True
+                except ServiceError as e:
+                    logging.error("Could not stop the monitor service: %s", e)
+            self.client.close()
+        if self.service_process is not None and self.service_process.poll() is None:
+            try:
+                self.service_process.wait(timeout=SERVICE_STOP_TIMEOUT if stop_requested else 0)
+            except subprocess.TimeoutExpired:
+                self.service_process.terminate()
         
         # Destroy the window and exit
         self.destroy()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from utils import clock
+
+
+@pytest.fixture
+def fake_clock():
+    """Installs a FakeClock as the configured clock for the test."""
+    previous = clock.get_clock()
+    fake = clock.FakeClock()
+    clock.set_clock(fake)
+    yield fake
+    clock.set_clock(previous)
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from utils.admission import AdmissionCache, device_fingerprint
+
+GUID = "\\\\?\\Volume{e}\\"
+DETAILS = {"VolumeName": "STICK", "FileSystem": "FAT32", "Size": "1000", "FreeSpace": "10",
+           "SerialNumber": "1234567890"}
+AUTH_STAT = SimpleNamespace(st_size=64, st_mtime_ns=1_700_000_000_000_000_000)
+
+
+def fingerprint(device_id=GUID, **changes):
+    return device_fingerprint(device_id, dict(DETAILS, **changes), AUTH_STAT)
+
+
+def test_admission_expires_after_ttl(fake_clock):
+    cache = AdmissionCache(ttl=60, max_entries=8)
+    cache.remember(fingerprint(), GUID)
+    fake_clock.advance(59)
+    assert cache.admit(fingerprint())
+    fake_clock.advance(1)
+    assert not cache.admit(fingerprint())
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted(fake_clock):
+    cache = AdmissionCache(ttl=60, max_entries=2)
+    cache.remember(fingerprint("A"), "A")
+    cache.remember(fingerprint("B"), "B")
+    assert cache.admit(fingerprint("A")) # B is now the least recently used
+    cache.remember(fingerprint("C"), "C")
+    assert cache.admit(fingerprint("A"))
+    assert not cache.admit(fingerprint("B"))
+    assert cache.admit(fingerprint("C"))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_forget_drops_every_fingerprint_of_the_device(fake_clock):
+    cache = AdmissionCache(ttl=60, max_entries=8)
+    cache.remember(fingerprint(), GUID)
+    cache.remember(fingerprint(Size="2000"), GUID)
+    cache.remember(fingerprint("B"), "B")
+    cache.forget(GUID)
+    assert not cache.admit(fingerprint())
+    assert not cache.admit(fingerprint(Size="2000"))
+    assert cache.admit(fingerprint("B"))
+
+
+def test_changed_volume_or_auth_file_misses(fake_clock):
+    cache = AdmissionCache(ttl=60, max_entries=8)
+    cache.remember(fingerprint(), GUID)
+    rewritten = SimpleNamespace(st_size=64, st_mtime_ns=AUTH_STAT.st_mtime_ns + 1)
+    assert not cache.admit(device_fingerprint(GUID, DETAILS, rewritten))
+    assert not cache.admit(fingerprint(FileSystem="exFAT"))
+    assert not cache.admit(fingerprint("B"))
+    assert cache.admit(fingerprint(FreeSpace="0")) # free space is not part of the fingerprint
+    assert device_fingerprint(GUID, DETAILS, None) is None
+
+
+def test_changed_serial_number_misses_the_cache():
+    cache = AdmissionCache(ttl=60, max_entries=8)
+    cache.remember(device_fingerprint(GUID, DETAILS, AUTH_STAT), GUID)
+    reformatted = dict(DETAILS, SerialNumber="987654321")
+    assert cache.admit(device_fingerprint(GUID, DETAILS, AUTH_STAT))
+    assert not cache.admit(device_fingerprint(GUID, reformatted, AUTH_STAT))
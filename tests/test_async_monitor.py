@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import usb_logger_win
+from pipeline_harness import PipelineHarness
+
+
+def test_async_main_handles_simulated_events_on_a_fake_clock():
+    with PipelineHarness(entry='asyncio', workers=2, enum_level='root', probe_mode='fixed',
+                         mount_delay=3.0) as h:
+        drives = h.make_drives(4, files=3)
+        ids = [f"async-volume-{i}" for i in range(len(drives))]
+        events = [('arrival', drive, device_id) for drive, device_id in zip(drives, ids)]
+        events += [('removal', device_id) for device_id in ids[:2]]
+        result = h.run(events, timeout=60)
+
+        assert result["completed"]
+        assert result["handled"] == len(events)
+        # The fixed mount delay was waited on the fake clock, not in real time
+        assert result["virtual_sleep_s"] >= 3.0 * len(drives)
+        assert result["elapsed_s"] < 3.0 * len(drives)
+        # make_drives puts a valid key on every other drive
+        assert result["ejects"] == 2
+        summary = usb_logger_win.unique_devices_summary
+        assert [summary[device_id]['last_state'] for device_id in ids] == ['removed', 'removed', 'allowed', 'ejected']
+        assert summary[ids[2]]['extra_data']['files_enumeration_ref']
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from utils.auth import (AuthFileTooLarge, KeyRegistry, add_key, key_digest, read_auth_token,
+                        revoke_key)
+
+
+def registry(tmp_path, *lines, expected_key=None):
+    path = tmp_path / "keys.txt"
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return path, KeyRegistry(str(path), expected_key=expected_key)
+
+
+def test_plain_keys_and_digest_lines_are_both_allowed(tmp_path):
+    _, keys = registry(tmp_path, "# issued keys", "", "plain-key", "sha256:" + key_digest("hashed-key").hex())
+    assert keys.check("plain-key") == (True, "OK")
+    assert keys.check("hashed-key") == (True, "OK")
+    assert keys.check("sha256:" + key_digest("hashed-key").hex()) == (False, "Content Mismatch")
+    assert len(keys) == 2
+
+
+def test_revocation_wins_over_an_allow_line(tmp_path):
+    path, keys = registry(tmp_path, "stolen-key", "other-key")
+    revoke_key("stolen-key", str(path))
+    assert keys.check("stolen-key") == (False, "Key Revoked")
+    assert keys.check("other-key") == (True, "OK")
+
+
+def test_revocation_wins_over_the_expected_key(tmp_path):
+    _, keys = registry(tmp_path, "!legacy-key", expected_key="legacy-key")
+    assert keys.check("legacy-key") == (False, "Key Revoked")
+
+
+def test_expected_key_is_accepted_without_a_registry_file(tmp_path):
+    keys = KeyRegistry(str(tmp_path / "missing.txt"), expected_key="legacy-key")
+    assert keys.check("legacy-key") == (True, "OK")
+    assert keys.check("other-key") == (False, "Content Mismatch")
+    assert len(keys) == 0
+
+
+def test_registry_is_reloaded_when_the_file_grows(tmp_path):
+    path, keys = registry(tmp_path, "first-key")
+    assert keys.check("second-key") == (False, "Content Mismatch")
+    add_key("second-key", str(path))
+    assert keys.check("second-key") == (True, "OK")
+
+
+def test_registry_is_reloaded_when_only_mtime_changes(tmp_path):
+    path, keys = registry(tmp_path, "key-a")
+    assert keys.check("key-a") == (True, "OK")
+    mtime = os.stat(path).st_mtime_ns
+    path.write_text("key-b\n", encoding="utf-8") # same size
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+    assert keys.check("key-a") == (False, "Content Mismatch")
+    assert keys.check("key-b") == (True, "OK")
+
+
+def test_malformed_digest_line_is_skipped(tmp_path):
+    _, keys = registry(tmp_path, "sha256:not-hex", "good-key")
+    assert keys.check("good-key") == (True, "OK")
+    assert len(keys) == 1
+
+
+def test_auth_token_is_read_up_to_the_limit(tmp_path):
+    path = tmp_path / "auth.key"
+    path.write_bytes(b"k" * 16 + b"\r\n")
+    assert read_auth_token(str(path), limit=18) == "k" * 16
+    path.write_bytes(b"k" * 19)
+    with pytest.raises(AuthFileTooLarge):
+        read_auth_token(str(path), limit=18)
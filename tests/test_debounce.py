@@ -0,0 +1,113 @@
+import pytest
+
+from utils.debounce import EventDebouncer
+
+DEVICE = "\\\\?\\Volume{e}\\"
+
+
+def arrival(device=DEVICE):
+    return ('arrival', 'E:', device)
+
+
+def removal(device=DEVICE):
+    return ('removal', device)
+
+
+def make_debouncer():
+    return EventDebouncer(window=1, flap_cycles=3, flap_window=10, backoff_initial=5, backoff_max=40)
+
+
+def flap(debouncer, fake_clock):
+    """Plugs and unplugs the device every 1.5s until it is reported as flapping."""
+    for _ in range(10):
+        for event in (arrival(), removal()):
+            fake_clock.advance(1.5)
+            released = debouncer.offer(event) + debouncer.release_due()
+            flapping = [e for e in released if e[0] == 'flapping']
+            if flapping:
+                return flapping[0]
+    raise AssertionError("device was never reported as flapping")
+
+
+def test_repeats_within_the_window_are_coalesced(fake_clock):
+    debouncer = make_debouncer()
+    assert debouncer.offer(arrival()) == [arrival()]
+    fake_clock.advance(0.3)
+    assert debouncer.offer(arrival()) == []
+    fake_clock.advance(0.3)
+    assert debouncer.offer(arrival()) == []
+    assert debouncer.next_due() == pytest.approx(0.4)
+    fake_clock.advance(0.4)
+    assert debouncer.release_due() == [] # the held duplicate changes nothing
+    assert debouncer.stats()['absorbed'] == 2
+
+
+def test_latest_state_change_is_released_when_the_window_ends(fake_clock):
+    debouncer = make_debouncer()
+    debouncer.offer(arrival())
+    fake_clock.advance(0.2)
+    assert debouncer.offer(removal()) == []
+    assert debouncer.release_due() == []
+    fake_clock.advance(0.8)
+    assert debouncer.release_due() == [removal()]
+
+
+def test_events_for_other_devices_are_not_held(fake_clock):
+    debouncer = make_debouncer()
+    debouncer.offer(arrival())
+    assert debouncer.offer(arrival("B")) == [arrival("B")]
+
+
+def test_flapping_is_reported_after_flap_cycles(fake_clock):
+    debouncer = make_debouncer()
+    dispatched = debouncer.offer(arrival())
+    for event in (removal(), arrival(), removal(), arrival()):
+        fake_clock.advance(1.5)
+        dispatched += debouncer.offer(event)
+    assert [e[0] for e in dispatched] == ['arrival', 'removal', 'arrival', 'removal', 'arrival']
+    fake_clock.advance(1.5)
+    assert debouncer.offer(removal()) == [('flapping', 3, 5, DEVICE)]
+    assert debouncer.stats()['flaps'] == 1
+
+
+def test_cycles_outside_the_flap_window_do_not_count(fake_clock):
+    debouncer = make_debouncer()
+    for _ in range(5):
+        for event in (arrival(), removal()):
+            fake_clock.advance(4)
+            assert [e[0] for e in debouncer.offer(event)] == [event[0]]
+
+
+def test_events_are_held_while_cooling_off(fake_clock):
+    debouncer = make_debouncer()
+    debouncer.offer(arrival())
+    assert flap(debouncer, fake_clock)[2] == 5
+    fake_clock.advance(1)
+    assert debouncer.offer(arrival()) == []
+    fake_clock.advance(3.9)
+    assert debouncer.release_due() == []
+    fake_clock.advance(0.1)
+    assert debouncer.release_due() == [arrival()] # still plugged in: checked once the hold ends
+
+
+def test_cooling_off_doubles_up_to_the_maximum(fake_clock):
+    debouncer = make_debouncer()
+    debouncer.offer(arrival())
+    backoffs = []
+    for _ in range(5):
+        backoffs.append(flap(debouncer, fake_clock)[2])
+        fake_clock.advance(backoffs[-1])
+        debouncer.release_due()
+    assert backoffs == [5, 10, 20, 40, 40]
+
+
+def test_quiet_device_starts_over_at_the_initial_backoff(fake_clock):
+    debouncer = make_debouncer()
+    debouncer.offer(arrival())
+    assert flap(debouncer, fake_clock)[2] == 5
+    fake_clock.advance(5)
+    debouncer.release_due()
+    assert flap(debouncer, fake_clock)[2] == 10
+    fake_clock.advance(10 + 41)
+    debouncer.release_due()
+    assert flap(debouncer, fake_clock)[2] == 5
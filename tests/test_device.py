@@ -0,0 +1,50 @@
+from utils.device import CachedDeviceInfoProvider, FakeDeviceInfoProvider
+
+DETAILS = {"VolumeName": "STICK", "FileSystem": "FAT32", "Size": "1000", "FreeSpace": "10"}
+GUID_E = "\\\\?\\Volume{e}\\"
+GUID_F = "\\\\?\\Volume{f}\\"
+
+
+def make_provider():
+    inner = FakeDeviceInfoProvider({"E:": DETAILS, "F:": DETAILS}, {"E:": "\\\\.\\PhysicalDrive1"})
+    return inner, CachedDeviceInfoProvider(inner)
+
+
+def test_repeat_lookups_are_served_from_the_cache():
+    inner, cached = make_provider()
+    for _ in range(3):
+        assert cached.get_volume_details("E:", GUID_E) == DETAILS
+        assert cached.get_physical_drive_path("E:", GUID_E) == "\\\\.\\PhysicalDrive1"
+    assert inner.calls == 2
+    assert cached.stats()['hits'] == 4
+
+
+def test_cached_details_are_returned_as_copies():
+    _, cached = make_provider()
+    cached.get_volume_details("E:", GUID_E)["FreeSpace"] = "0"
+    assert cached.get_volume_details("E:", GUID_E) == DETAILS
+
+
+def test_empty_answers_are_not_cached():
+    inner, cached = make_provider()
+    assert cached.get_volume_details("G:", "\\\\?\\Volume{g}\\") == {}
+    inner.volumes["G:"] = DETAILS
+    assert cached.get_volume_details("G:", "\\\\?\\Volume{g}\\") == DETAILS
+    assert inner.calls == 2
+
+
+def test_removal_invalidates_only_that_volume():
+    inner, cached = make_provider()
+    cached.get_volume_details("E:", GUID_E)
+    cached.get_volume_details("F:", GUID_F)
+    cached.invalidate(volume_guid=GUID_E)
+    cached.get_volume_details("E:", GUID_E)
+    cached.get_volume_details("F:", GUID_F)
+    assert inner.calls == 3
+
+
+def test_another_volume_on_a_reused_letter_misses():
+    inner, cached = make_provider()
+    cached.get_volume_details("E:", GUID_E)
+    cached.get_volume_details("E:", GUID_F)
+    assert inner.calls == 2
@@ -0,0 +1,199 @@
+import queue
+import threading
+import concurrent.futures
+
+import pytest
+
+from utils.dispatch import BoundedEventQueue, KeyedWorkerPool, ParkedJobs, call_into
+
+
+def arrival(device):
+    return ('arrival', 'E:', device)
+
+
+def removal(device):
+    return ('removal', device)
+
+
+def fill(q, *events):
+    for event in events:
+        q.put(event)
+
+
+def drain(q):
+    return [q.get(block=False) for _ in range(q.qsize())]
+
+
+def test_duplicate_of_newest_event_is_merged():
+    q = BoundedEventQueue(2)
+    fill(q, arrival('A'), arrival('B'))
+    q.put(arrival('B'), block=False)
+    assert drain(q) == [arrival('A'), arrival('B')]
+    assert q.stats()['merged'] == {'arrival': 1}
+
+
+def test_arrival_after_removal_is_not_merged_into_earlier_arrival():
+    q = BoundedEventQueue(2)
+    fill(q, arrival('X'), removal('X'))
+    # Merging would leave the removal as X's last event and the re-inserted stick unchecked
+    with pytest.raises(queue.Full):
+        q.put(arrival('X'), block=False)
+    assert drain(q) == [arrival('X'), removal('X')]
+    assert q.stats()['merged'] == {}
+
+
+def test_only_removal_for_a_device_is_never_dropped():
+    q = BoundedEventQueue(2)
+    fill(q, removal('A'), arrival('B'))
+    with pytest.raises(queue.Full):
+        q.put(arrival('C'), block=False)
+    assert drain(q) == [removal('A'), arrival('B')]
+    assert q.stats()['dropped'] == 0
+
+
+def test_superseded_removal_is_dropped():
+    q = BoundedEventQueue(2)
+    fill(q, removal('A'), arrival('A'))
+    q.put(arrival('C'), block=False)
+    assert drain(q) == [arrival('A'), arrival('C')]
+    assert q.stats()['dropped'] == 1
+
+
+def test_arrivals_are_never_dropped():
+    q = BoundedEventQueue(3)
+    fill(q, arrival('A'), arrival('B'), arrival('C'))
+    with pytest.raises(queue.Full):
+        q.put(arrival('D'), timeout=0.05)
+    assert drain(q) == [arrival('A'), arrival('B'), arrival('C')]
+    assert q.stats()['blocked'] == 1
+
+
+def test_blocked_producer_resumes_once_room_is_made():
+    q = BoundedEventQueue(1)
+    q.put(arrival('A'))
+    producer = threading.Thread(target=q.put, args=(arrival('B'),))
+    producer.start()
+    assert q.get(timeout=1) == arrival('A')
+    producer.join(timeout=1)
+    assert not producer.is_alive()
+    assert q.get(timeout=1) == arrival('B')
+
+
+def test_pool_submit_blocks_at_max_pending():
+    pool = KeyedWorkerPool(1, max_pending=2)
+    release = threading.Event()
+    try:
+        pool.submit('A', release.wait)
+        pool.submit('B', lambda: None)
+        submitted = threading.Event()
+        producer = threading.Thread(target=lambda: (pool.submit('C', lambda: None), submitted.set()))
+        producer.start()
+        assert not submitted.wait(0.1)
+        assert pool.pending_count() == 2
+        release.set()
+        assert submitted.wait(1)
+        producer.join(timeout=1)
+    finally:
+        release.set()
+        pool.shutdown(wait=True, timeout=1)
+    assert pool.pending_count() == 0
+
+
+def test_pool_keeps_per_key_order():
+    pool = KeyedWorkerPool(4, max_pending=3)
+    seen = []
+    for i in range(20):
+        pool.submit(i % 2, seen.append, i)
+    pool.shutdown(wait=True, timeout=1)
+    assert [i for i in seen if i % 2 == 0] == list(range(0, 20, 2))
+    assert [i for i in seen if i % 2] == list(range(1, 20, 2))
+
+
+def test_pool_submit_next_runs_before_later_jobs_for_the_key():
+    pool = KeyedWorkerPool(2)
+    release = threading.Event()
+    seen = []
+
+    def first():
+        release.wait(1)
+        seen.append('arrival')
+        pool.submit_next('A', seen.append, 'reverify')
+
+    pool.submit('A', first)
+    pool.submit('A', seen.append, 'removal')
+    release.set()
+    pool.shutdown(wait=True, timeout=1)
+    assert seen == ['arrival', 'reverify', 'removal']
+    assert pool.pending_count() == 0
+
+
+def test_pool_submit_next_needs_a_running_job():
+    pool = KeyedWorkerPool(1)
+    try:
+        with pytest.raises(RuntimeError):
+            pool.submit_next('A', lambda: None)
+    finally:
+        pool.shutdown(wait=True, timeout=1)
+
+
+def test_pool_bounds_each_key_separately():
+    pool = KeyedWorkerPool(2, max_pending=8, max_pending_per_key=2)
+    release = threading.Event()
+    try:
+        pool.submit('A', release.wait)
+        pool.submit('A', lambda: None)
+        with pytest.raises(queue.Full):
+            pool.submit('A', lambda: None, block=False)
+        with pytest.raises(queue.Full):
+            pool.submit('A', lambda: None, timeout=0.05)
+        pool.submit('B', lambda: None, block=False) # another device is not held up
+    finally:
+        release.set()
+        pool.shutdown(wait=True, timeout=1)
+
+
+def test_parked_jobs_keep_per_key_order_and_do_not_block():
+    pool = KeyedWorkerPool(2, max_pending_per_key=1)
+    release = threading.Event()
+    seen = []
+    parked = ParkedJobs(pool, limit=2)
+    try:
+        parked.submit('A', lambda: (release.wait(1), seen.append('A0')))
+        parked.submit('A', seen.append, 'A1')
+        parked.submit('A', seen.append, 'A2')
+        parked.submit('B', seen.append, 'B0')
+        assert len(parked) == 2 and parked.full()
+        done = threading.Event()
+        pool.submit('B', done.set)
+        assert done.wait(1)
+        assert seen == ['B0']
+        release.set()
+        for _ in range(100):
+            parked.retry()
+            if not parked:
+                break
+            threading.Event().wait(0.01)
+        assert not parked
+    finally:
+        release.set()
+        pool.shutdown(wait=True, timeout=1)
+    assert seen == ['B0', 'A0', 'A1', 'A2']
+
+
+def test_call_into_runs_behind_the_keys_earlier_jobs():
+    pool = KeyedWorkerPool(2)
+    release = threading.Event()
+    seen = []
+    try:
+        pool.submit('A', lambda: (release.wait(1), seen.append('arrival')))
+        ejected, failed = concurrent.futures.Future(), concurrent.futures.Future()
+        pool.submit('A', call_into, ejected, lambda: seen.append('eject') or True)
+        pool.submit('A', call_into, failed, int, 'not a number')
+        release.set()
+        assert ejected.result(timeout=1) is True
+        with pytest.raises(ValueError):
+            failed.result(timeout=1)
+    finally:
+        release.set()
+        pool.shutdown(wait=True, timeout=1)
+    assert seen == ['arrival', 'eject']
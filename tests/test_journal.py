@@ -0,0 +1,55 @@
+import os
+
+from utils import journal as journal_module
+from utils.journal import DeviceJournal
+
+
+def count_fsyncs(monkeypatch):
+    calls = []
+    real_fsync = os.fsync
+    def fsync(fd):
+        calls.append(fd)
+        real_fsync(fd)
+    monkeypatch.setattr(journal_module.os, "fsync", fsync)
+    return calls
+
+
+def test_commit_syncs_appended_records_once(monkeypatch, tmp_path):
+    fsyncs = count_fsyncs(monkeypatch)
+    journal = DeviceJournal(str(tmp_path))
+    try:
+        journal.append("vol-a", "arrival", {"last_state": "checking"})
+        journal.append("vol-a", "checked", {"last_state": "allowed"})
+        journal.commit()
+        journal.commit() # nothing new since the last sync
+        assert len(fsyncs) == 1
+    finally:
+        journal.close()
+
+
+def test_committed_records_replay_after_reopening(tmp_path):
+    journal = DeviceJournal(str(tmp_path))
+    journal.append("vol-a", "checked", {"last_state": "allowed", "version": 2})
+    journal.commit()
+    journal.close()
+
+    summary = {}
+    reopened = DeviceJournal(str(tmp_path))
+    try:
+        assert reopened.replay(summary) == 1
+    finally:
+        reopened.close()
+    assert summary == {"vol-a": {"last_state": "allowed", "version": 2}}
+
+
+def test_seal_syncs_the_segment_it_seals(monkeypatch, tmp_path):
+    fsyncs = count_fsyncs(monkeypatch)
+    journal = DeviceJournal(str(tmp_path))
+    try:
+        journal.append("vol-a", "removal", {"last_state": "removed"})
+        assert journal.seal() == 1
+        assert len(fsyncs) == 1
+        journal.commit() # already covered by the seal
+        assert len(fsyncs) == 1
+    finally:
+        journal.close()
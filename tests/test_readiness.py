@@ -0,0 +1,16 @@
+import time
+
+from utils.readiness import wait_for_mount, learn_estimate
+
+
+def test_readable_volume_is_not_held_back_by_a_slow_estimate(tmp_path):
+    started = time.monotonic()
+    ready_after = wait_for_mount(str(tmp_path), estimate=5.0, timeout=10)
+    assert ready_after is not None
+    assert time.monotonic() - started < 1.0
+    # The fast observation pulls the learned estimate down at once
+    assert learn_estimate(5.0, ready_after) < 2.6
+
+
+def test_missing_volume_times_out(tmp_path):
+    assert wait_for_mount(str(tmp_path / "absent"), estimate=0.05, timeout=0.2) is None
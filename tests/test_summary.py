@@ -0,0 +1,48 @@
+from utils import summary
+from utils.device_store import SqliteDeviceStore
+
+
+def make_persister(monkeypatch, tmp_path):
+    store = SqliteDeviceStore(str(tmp_path / "summary.db"))
+    monkeypatch.setattr(summary, "get_store", lambda: store)
+    devices = {"vol-a": {"last_state": "allowed"}}
+    return store, devices, summary.SummaryPersister(devices, window=60, max_delay=60)
+
+
+def test_flush_writes_dirty_entries_to_the_store(monkeypatch, tmp_path):
+    store, devices, persister = make_persister(monkeypatch, tmp_path)
+    try:
+        persister.mark_dirty("vol-a")
+        persister.flush()
+        assert store.get("vol-a")["last_state"] == "allowed"
+        assert persister.stats()["writes"] == 1
+    finally:
+        persister.stop()
+        store.close()
+
+
+def test_empty_batch_counts_as_saved(monkeypatch, tmp_path):
+    store, devices, persister = make_persister(monkeypatch, tmp_path)
+    try:
+        # The dirty device left the summary before the write: nothing to upsert
+        persister.mark_dirty("vol-gone")
+        persister.flush()
+        assert persister.stats()["writes"] == 1
+        assert persister._first_dirty is None
+    finally:
+        persister.stop()
+        store.close()
+
+
+def test_failed_write_stays_pending(monkeypatch, tmp_path):
+    store, devices, persister = make_persister(monkeypatch, tmp_path)
+    try:
+        store.close()
+        persister.mark_dirty("vol-a")
+        persister.flush()
+        assert persister.stats()["writes"] == 0
+        assert persister._first_dirty is not None
+        assert "vol-a" in persister._dirty_ids
+    finally:
+        persister._first_dirty = None
+        persister.stop()
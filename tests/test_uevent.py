@@ -0,0 +1,65 @@
+import os
+
+from utils.uevent import UeventMonitor, parse_uevent
+
+USB_DEV = "/devices/pci0000:00/0000:00:14.0/usb1/1-1"
+PART_DEVPATH = USB_DEV + "/1-1:1.0/host6/target6:0:0/6:0:0:0/block/sdb/sdb1"
+SATA_DEVPATH = "/devices/pci0000:00/0000:00:17.0/ata1/host0/target0:0:0/0:0:0:0/block/sda/sda1"
+
+
+def payload(action, devpath, subsystem="block", **props):
+    fields = [f"{action}@{devpath}", f"ACTION={action}", f"DEVPATH={devpath}", f"SUBSYSTEM={subsystem}"]
+    fields += [f"{key}={value}" for key, value in props.items()]
+    return "\0".join(fields).encode() + b"\0"
+
+
+def partition(action, devpath=PART_DEVPATH, **props):
+    return payload(action, devpath, DEVTYPE="partition", DEVNAME=os.path.basename(devpath), PARTN="1", **props)
+
+
+def make_sysfs(tmp_path, serial="ABC123"):
+    usb_dir = tmp_path / USB_DEV.lstrip("/")
+    (tmp_path / PART_DEVPATH.lstrip("/")).mkdir(parents=True)
+    (usb_dir / "serial").write_text(serial + "\n")
+    return str(tmp_path)
+
+
+def test_parse_uevent_reads_header_and_properties():
+    props = parse_uevent(partition("add"))
+    assert props["ACTION"] == "add"
+    assert props["DEVPATH"] == PART_DEVPATH
+    assert props["PARTN"] == "1"
+
+
+def test_udev_rebroadcasts_are_ignored():
+    assert parse_uevent(b"libudev\0whatever") is None
+
+
+def test_arrival_and_removal_share_the_serial_id(tmp_path):
+    monitor = UeventMonitor(sys_root=make_sysfs(tmp_path))
+    assert monitor.handle_payload(partition("add")) == ("arrival", "/dev/sdb1", "usb-ABC123-part1")
+    assert monitor.handle_payload(partition("remove")) == ("removal", "usb-ABC123-part1")
+
+
+def test_unseen_removal_uses_the_serial_from_the_event(tmp_path):
+    monitor = UeventMonitor(sys_root=str(tmp_path)) # sysfs entry already gone
+    event = monitor.handle_payload(partition("remove", ID_SERIAL_SHORT="ABC123"))
+    assert event == ("removal", "usb-ABC123-part1")
+
+
+def test_unseen_removal_without_a_serial_is_ignored(tmp_path):
+    monitor = UeventMonitor(sys_root=str(tmp_path))
+    assert monitor.handle_payload(partition("remove")) is None
+
+
+def test_non_removable_and_non_block_devices_are_ignored(tmp_path):
+    monitor = UeventMonitor(sys_root=make_sysfs(tmp_path))
+    assert monitor.handle_payload(partition("add", SATA_DEVPATH)) is None
+    assert monitor.handle_payload(payload("add", USB_DEV, subsystem="usb", DEVTYPE="usb_device")) is None
+
+
+def test_whole_disks_are_skipped_unless_enabled(tmp_path):
+    disk = payload("add", os.path.dirname(PART_DEVPATH), DEVTYPE="disk", DEVNAME="sdb")
+    assert UeventMonitor(sys_root=make_sysfs(tmp_path)).handle_payload(disk) is None
+    event = UeventMonitor(sys_root=str(tmp_path), include_whole_disks=True).handle_payload(disk)
+    assert event == ("arrival", "/dev/sdb", "usb-ABC123-part0")
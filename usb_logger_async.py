@@ -0,0 +1,220 @@
+"""
+asyncio entry point for the USB monitor: the same handlers, summary and
+configuration as usb_logger_win, on an event loop instead of a blocking
+dispatcher and worker pool.
+
+- Event sources still run on their own thread but feed an asyncio.Queue
+  (bounded by [Dispatcher] QueueCapacity; a full queue makes the source wait).
+- Each arrival is a coroutine. Mount waits, volume-detail retries and the
+  fixed MountStabilityDelay are loop timers; blocking filesystem, WMI and
+  eject DLL calls, and every stage that takes the summary lock or journals
+  a change, run in a thread pool of WorkerPoolSize threads. Hundreds of
+  devices can be waiting at once without a thread each.
+- Events for the same volume are still handled strictly in order.
+
+Runs until stop_event is set (or Ctrl+C), like usb_logger_win.main():
+
+    python usb_logger_async.py
+"""
+import asyncio
+import functools
+import logging
+import threading
+import concurrent.futures
+
+import usb_logger_win as monitor
+from utils                import clock
+from utils.summary       import summary_lock
+from utils.dispatch      import KeyedTaskRunner
+from utils.readiness     import wait_for_mount_async, learn_estimate
+from utils.event_sources import create_event_source
+from utils.device        import get_volume_details, VOLUME_QUERY_ATTEMPTS, VOLUME_QUERY_RETRY_DELAY
+from utils.config        import EVENT_QUEUE_CAPACITY
+from utils.metrics       import stage, events_total, queue_depth
+
+# How often the dispatcher checks stop_event while no event arrives
+STOP_POLL_INTERVAL = 0.5
+
+
+class _LoopQueue:
+    """
+    put() for thread-based event sources, delivering into the loop's
+    asyncio.Queue. Blocks the source while the queue is full, giving up
+    once stop_event is set.
+    """
+
+    def __init__(self, loop, queue, stop_event):
+        self._loop = loop
+        self._queue = queue
+        self._stop_event = stop_event
+
+    def put(self, event, block=True, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(event), self._loop)
+        while True:
+            try:
+                return future.result(timeout=STOP_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if self._stop_event.is_set():
+                    future.cancel()
+                    return
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+async def _offload(fn, *args, **kwargs):
+    """Runs a blocking call in the loop's executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+def _store_mount_estimate(summary_entry, learned, ready_after):
+    with summary_lock:
+        summary_entry['mount_ready_seconds'] = learn_estimate(learned, ready_after)
+
+
+async def _volume_details(drive_letter, device_id):
+    """get_volume_details with its retry pauses as loop timers instead of sleeps in a thread."""
+    for attempt in range(1, VOLUME_QUERY_ATTEMPTS + 1):
+        details = await _offload(get_volume_details, drive_letter, device_id, retry=False)
+        if details or attempt == VOLUME_QUERY_ATTEMPTS:
+            return details
+        logging.debug("Retrying volume details query for %s in %ss...", drive_letter, VOLUME_QUERY_RETRY_DELAY)
+        await clock.asleep(VOLUME_QUERY_RETRY_DELAY)
+
+
+async def handle_usb_arrival(drive_letter, device_id):
+    """
+    Coroutine version of usb_logger_win.handle_usb_arrival, built from the
+    same stages; see there for what each stage records.
+    """
+    with stage('arrival'):
+        summary_entry = await _offload(monitor.begin_arrival, drive_letter, device_id)
+        if summary_entry is None:
+            return
+
+        # --- Wait for mount stability (loop timers, no thread held) ---
+        with stage('mount_wait'):
+            if monitor.MOUNT_PROBE_MODE == 'fixed':
+                logging.info("Waiting for %s seconds for mount stability...", monitor.MOUNT_DELAY)
+                await clock.asleep(monitor.MOUNT_DELAY)
+            else:
+                learned = summary_entry.get('mount_ready_seconds')
+                logging.info("Probing %s for mount readiness (learned estimate: %ss)...", drive_letter, learned)
+                ready_after = await wait_for_mount_async(drive_letter, estimate=learned,
+                                                         stop_event=monitor.stop_event)
+                if ready_after is not None:
+                    await _offload(_store_mount_estimate, summary_entry, learned, ready_after)
+
+        drive_root = await _offload(monitor.check_drive_present, drive_letter, device_id)
+        if drive_root is None:
+            return
+
+        with stage('volume_details'):
+            volume_details = await _volume_details(drive_letter, device_id)
+        await _offload(monitor.store_volume_details, drive_letter, device_id, summary_entry, volume_details)
+
+        admitted = False
+        try:
+            is_authorized, admitted, file_to_check, fingerprint = await _offload(
+                monitor.authorize_device, drive_letter, device_id, drive_root, volume_details, summary_entry)
+            auth_outcome = monitor.processed_volumes[device_id]
+
+            if not admitted:
+                await _offload(monitor.enumerate_device, drive_letter, drive_root, device_id, summary_entry,
+                               rejected=not is_authorized)
+
+            if not is_authorized:
+                await _offload(monitor.eject_drive_api, drive_letter, device_id,
+                               monitor.unique_devices_summary, monitor.processed_volumes)
+
+            final_state_this_instance = monitor.processed_volumes[device_id]
+        except OSError as e:
+            final_state_this_instance = auth_outcome = await _offload(
+                monitor.record_access_error, drive_letter, device_id, summary_entry, e)
+
+        await _offload(monitor.finish_arrival, device_id, final_state_this_instance, auth_outcome)
+
+    # Still part of this device's task, so its next event waits for the re-verification
+    if admitted:
+        await _offload(monitor._reverify_admission,
+                       drive_letter, drive_root, device_id, file_to_check, fingerprint)
+
+
+async def _dispatch(stop_event, event_source):
+    loop = asyncio.get_running_loop()
+    pythoncom = monitor.pythoncom
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, monitor.WORKER_POOL_SIZE), thread_name_prefix="usb-io",
+        initializer=pythoncom.CoInitialize if pythoncom else None)
+    loop.set_default_executor(executor)
+
+    event_q = asyncio.Queue(maxsize=EVENT_QUEUE_CAPACITY)
+    source = event_source or create_event_source()
+    logging.info("Using the '%s' event source (asyncio dispatcher, %s I/O thread(s)).",
+                 source.name, max(1, monitor.WORKER_POOL_SIZE))
+    watcher = threading.Thread(target=source.run, args=(_LoopQueue(loop, event_q, stop_event), stop_event),
+                               daemon=True)
+    watcher.start()
+
+    runner = KeyedTaskRunner()
+    # Calls from other threads (see monitor.call_for_device) join the device's task chain
+    monitor.device_dispatch = lambda device_id, fn, *args: loop.call_soon_threadsafe(
+        runner.submit, device_id, _offload, fn, *args)
+    # Removal and flapping handlers take the summary lock and journal the change: off the loop
+    handlers = {'arrival': handle_usb_arrival,
+                'removal': functools.partial(_offload, monitor.handle_usb_removal),
+                'flapping': functools.partial(_offload, monitor.handle_usb_flapping)}
+    debouncer = monitor.debouncer if monitor.DEBOUNCE_ENABLED else None
+    try:
+        while not stop_event.is_set():
+            # Wake up in time to release events the debouncer is holding
+            due = debouncer.next_due() if debouncer else None
+            timeout = STOP_POLL_INTERVAL if due is None else min(STOP_POLL_INTERVAL, max(due, 0.01))
+            try:
+                event = await asyncio.wait_for(event_q.get(), timeout)
+            except asyncio.TimeoutError:
+                event = None
+
+            if event is not None:
+                events_total.labels(event[0]).inc()
+            if debouncer:
+                ready = (debouncer.offer(event) if event is not None else []) + debouncer.release_due()
+            else:
+                ready = [event] if event is not None else []
+
+            for typ, *args in ready:
+                queue_depth.set(event_q.qsize() + runner.pending_count())
+                # Volume GUID is the last element of every event tuple
+                runner.submit(args[-1], handlers[typ], *args)
+    finally:
+        monitor.device_dispatch = None
+        logging.info("Waiting for in-flight device checks to finish…")
+        still_running = await runner.drain(timeout=5)
+        if still_running:
+            logging.warning("%s device check(s) still running at shutdown.", still_running)
+        logging.info("Waiting for watcher threads to exit…")
+        await loop.run_in_executor(None, watcher.join, 5)
+
+
+def main(stop_event=None, event_source=None):
+    """
+    Runs the asyncio monitor until stop_event is set. `event_source`
+    overrides the configured source (e.g. a SimulatedEventSource).
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+    servers = monitor.start_monitoring(stop_event)
+    try:
+        asyncio.run(_dispatch(stop_event, event_source))
+    except KeyboardInterrupt:
+        logging.info("Stopping monitoring.")
+        stop_event.set()
+    except Exception as e:
+        logging.error("Dispatcher error: %s", e, exc_info=True)
+        stop_event.set()
+    monitor.stop_monitoring(servers)
+    logging.info("All tasks finished, exiting.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,258 +1,497 @@
 # Import statements
-import wmi
-import time
 import os
+import time
+import datetime
 import logging
 import atexit # To save summary on exit
-import datetime # For timestamps
 import threading
 import queue
+import concurrent.futures
 # cspell:ignore pythoncom
-import pythoncom
-
-from utils.config import REQUIRED_FILE, WMI_POLL, MOUNT_DELAY, ENUM_LEVEL, MAX_ROOT, EXPECTED_KEY
+try:
+    import pythoncom
+except ImportError: # non-Windows: no COM to initialise on worker threads
+    pythoncom = None
+
+from utils.config import (REQUIRED_FILE, MOUNT_DELAY, MOUNT_PROBE_MODE, ENUM_LEVEL, MAX_ROOT,
+                          ENUM_TIME_BUDGET, ENUM_REJECT_TIME_BUDGET,
+                          WORKER_POOL_SIZE, SCRIPT_DIR, SUMMARY_JOURNAL, JOURNAL_KEEP_SEGMENTS,
+                          METRICS_ENABLED, METRICS_PORT, HASH_ENABLED, ADMISSION_ENABLED, DEBOUNCE_ENABLED,
+                          EVENT_QUEUE_CAPACITY, API_ENABLED, API_PORT)
 from utils.logging_setup import setup_logging
-from utils.summary       import load_summary, save_summary
-from utils.device        import get_physical_drive_path, get_volume_details
+from utils                import clock
+from utils.summary       import load_summary, summary_lock, start_persister, stop_persister, record_change, flush_summary
+from utils.journal       import DeviceJournal
+from utils.dispatch      import KeyedWorkerPool, BoundedEventQueue, ParkedJobs, call_into
+from utils.readiness     import wait_for_mount, learn_estimate, volume_root
+from utils.event_sources import create_event_source
+from utils.device        import get_physical_drive_path, get_volume_details, invalidate_device
 from utils.eject         import eject_drive_api
+from utils.auth          import read_auth_token, key_registry, AuthFileTooLarge
+from utils.admission     import admission_cache, device_fingerprint
+from utils.debounce      import debouncer
+from utils.enumeration   import walk_volume, read_listing, save_root_listing, migrate_root_listings
+from utils.hashing       import hash_device_files
+from utils.metrics       import (stage, stage_seconds, timed, events_total, auth_total, queue_depth,
+                                 start_metrics_server)
+from utils.api           import start_api_server
 
 # placeholders so handlers can see them
 unique_devices_summary = {}
 processed_volumes       = {}
 logger                  = None
+dispatch_pool           = None # the running dispatcher's KeyedWorkerPool, if any
+device_dispatch         = None # set by the running monitor: (device_id, fn, *args) queues fn behind the device's events
 
-def _arrival_watcher(q: queue.Queue, stop_event):
-    # set up COM on *this* thread
-    pythoncom.CoInitialize()
-    try:
-        # Outer recovery loop
-        while not stop_event.is_set():
-            try:
-                # (Re)establish WMI connection each time we retry
-                wmi_con = wmi.WMI()
-                watcher = wmi_con.watch_for(
-                    raw_wql=f"SELECT * FROM __InstanceCreationEvent WITHIN {WMI_POLL} "
-                            "WHERE TargetInstance ISA 'Win32_Volume' AND TargetInstance.DriveType=2"
-                )
-                # Inner event‑pumping loop
-                while not stop_event.is_set():
+def enumerate_device(drive_letter, drive_root, device_id, summary_entry, rejected=False):
+    """
+    Runs the configured enumeration level (and optional content hashing) for a
+    mounted device, storing results and references in its summary entry.
+    A `rejected` device is about to be ejected, so it is not hashed and its
+    recursive walk is held to RejectTimeBudget.
+    The caller records the change.
+    """
+    # ------ OPTIONAL: ROOT FILE ENUMERATION ------
+    if ENUM_LEVEL == 'root':
+        logging.info("Starting root file enumeration for %s...", drive_letter)
+        enum_started = time.perf_counter()
+        # Build the listing locally, then write it to the device's sidecar file;
+        # the summary only keeps a reference, so saves stay small
+        files_enum_dict = {}
+        enum_truncated = False
+        file_count = 0
+        try:
+            with os.scandir(drive_root) as entries:
+                for entry in entries:
+                    if file_count >= MAX_ROOT:
+                         logging.warning("Reached maximum (%s) root files/folders to list for %s.", MAX_ROOT, drive_letter)
+                         enum_truncated = True # Indicate list is cut short
+                         break
                     try:
-                        evt = watcher(timeout_ms=1000)
-                        if evt and evt.DriveLetter and evt.DeviceID:
-                            q.put(('arrival', evt.DriveLetter, evt.DeviceID))
-                    except wmi.x_wmi_timed_out:
-                        continue
-                    
-            except Exception as e:
-                # Log any fatal COM/WMI error, then retry after a pause
-                logger.error("Arrival‑watcher error, retrying in 5s: %s", e, exc_info=True)
-                time.sleep(5)
-
-    finally:
-        pythoncom.CoUninitialize()
-
-def _removal_watcher(q: queue.Queue, stop_event):
-    pythoncom.CoInitialize()
+                        stat_info = entry.stat()
+                        file_data = {
+                            "size": stat_info.st_size,
+                            "created": int(stat_info.st_ctime), # epoch seconds
+                            "modified": int(stat_info.st_mtime),
+                            "accessed": int(stat_info.st_atime),
+                            "is_dir": entry.is_dir(),
+                        }
+                        files_enum_dict[entry.name] = file_data
+                        file_count += 1
+                    except OSError as stat_err:
+                        logging.warning("Could not stat file/dir '%s' during enumeration: %s", entry.path, stat_err)
+                        files_enum_dict[entry.name] = {"error": f"Stat failed: {stat_err}"}
+                    except Exception as entry_err: # Catch other potential errors per entry
+                         logging.error("Unexpected error processing entry '%s': %s", entry.path, entry_err, exc_info=False)
+                         files_enum_dict[entry.name] = {"error": f"Processing error: {entry_err}"}
+
+            logging.info("Completed root file enumeration for %s. Listed %s items.", drive_letter, file_count)
+        except OSError as scan_err:
+            logging.error("Could not enumerate root directory %s: %s", drive_letter, scan_err)
+            with summary_lock:
+                summary_entry.setdefault('extra_data', {})['files_enumeration_error'] = f"Scan failed: {scan_err}"
+        except Exception as enum_err: # Catch other potential errors during scan setup
+             logging.error("Unexpected error during root enumeration setup for %s: %s", drive_letter, enum_err, exc_info=True)
+             with summary_lock:
+                 summary_entry.setdefault('extra_data', {})['files_enumeration_error'] = f"Enum setup error: {enum_err}"
+        # Replaces any previous enumeration for this device
+        try:
+            enum_ref = save_root_listing(device_id, files_enum_dict, enum_truncated,
+                                         previous=summary_entry.get('extra_data', {}).get('files_enumeration_ref'))
+            with summary_lock:
+                extra = summary_entry.setdefault('extra_data', {})
+                extra.pop('files_enumeration', None) # inline listing from older versions
+                extra['files_enumeration_ref'] = enum_ref
+        except OSError as save_err:
+            logging.error("Could not save root listing for %s: %s", drive_letter, save_err)
+        stage_seconds.labels('enumeration').observe(time.perf_counter() - enum_started)
+
+    elif ENUM_LEVEL == 'recursive':
+        # Whole-volume listing goes to a per-device file; the summary only keeps its stats
+        logging.info("Starting recursive enumeration for %s...", drive_letter)
+        walk = None
+        try:
+            budget = min(ENUM_TIME_BUDGET, ENUM_REJECT_TIME_BUDGET) if rejected else ENUM_TIME_BUDGET
+            with stage('enumeration'):
+                walk = walk_volume(drive_root, device_id, stop_event=globals().get("stop_event"),
+                                   time_budget=budget)
+            logging.info("Completed recursive enumeration for %s: %s entries in %ss (%s entries/s)%s",
+                         drive_letter, walk['entries'], walk['elapsed_seconds'], walk['entries_per_sec'],
+                         f", truncated by {walk['truncated']}" if walk['truncated'] else "")
+            with summary_lock:
+                summary_entry.setdefault('extra_data', {})['recursive_enumeration'] = walk
+        except OSError as walk_err:
+            logging.error("Could not enumerate %s recursively: %s", drive_letter, walk_err)
+            with summary_lock:
+                summary_entry.setdefault('extra_data', {})['files_enumeration_error'] = f"Walk failed: {walk_err}"
+
+    # ------ OPTIONAL: CONTENT HASHING OF ENUMERATED FILES ------
+    if HASH_ENABLED and ENUM_LEVEL != 'none' and rejected:
+        logging.info("Not hashing %s: the device failed its check and is being ejected.", drive_letter)
+    elif HASH_ENABLED and ENUM_LEVEL != 'none':
+        try:
+            if ENUM_LEVEL == 'root':
+                to_hash = [name for name, info in files_enum_dict.items()
+                           if isinstance(info, dict) and 'error' not in info and not info.get('is_dir')]
+            else:
+                to_hash = [e['p'] for e in read_listing(walk['file']) if e.get('d') == 0] if walk else []
+            logging.info("Hashing %s file(s) on %s...", len(to_hash), drive_letter)
+            with stage('hashing'):
+                hashing = hash_device_files(drive_root, to_hash, device_id, stop_event=globals().get("stop_event"))
+            logging.info("Hashing done for %s: %s hashed, %s cached, %s skipped, %s MB/s", drive_letter,
+                         hashing['hashed'], hashing['cached'], hashing['skipped_large'] + hashing['skipped_budget'],
+                         hashing['mb_per_sec'])
+            with summary_lock:
+                summary_entry.setdefault('extra_data', {})['hashing'] = hashing
+        except (OSError, ValueError) as hash_err:
+            logging.error("Could not hash files on %s: %s", drive_letter, hash_err)
+            with summary_lock:
+                summary_entry.setdefault('extra_data', {})['hashing_error'] = f"Hashing failed: {hash_err}"
+
+
+def _reverify_admission(drive_letter, drive_root, device_id, file_to_check, fingerprint):
+    """
+    Second half of a cached admission, run as the device's next job (see
+    run_after_current_job): re-reads and re-checks the auth file, then
+    enumerates. A device that no longer passes is ejected and forgotten by
+    the admission cache. Nothing is done if the device is no longer in the
+    'allowed' state this arrival left it in, or has moved to another drive.
+    """
     try:
-        while not stop_event.is_set():
-            try:
-                wmi_con = wmi.WMI()
-                watcher = wmi_con.watch_for(
-                    raw_wql=f"SELECT * FROM __InstanceDeletionEvent WITHIN {WMI_POLL} "
-                            "WHERE TargetInstance ISA 'Win32_Volume' AND TargetInstance.DriveType=2"
-                )
-                while not stop_event.is_set():
-                    try:
-                        evt = watcher(timeout_ms=1000)
-                        if evt and evt.DeviceID:
-                            q.put(('removal', evt.DeviceID))
-                    except wmi.x_wmi_timed_out:
-                        continue
-                    
-            except Exception as e:
-                    logger.error("Removal‑watcher COM error: %s", e, exc_info=True)
-                    time.sleep(5)
-    finally:
-        pythoncom.CoUninitialize()
+        is_authorized, auth_reason = key_registry.check(read_auth_token(file_to_check))
+    except AuthFileTooLarge:
+        is_authorized, auth_reason = False, "Auth File Too Large"
+    except OSError as e:
+        if not os.path.exists(drive_root):
+            logging.info("Drive %s removed before background re-verification.", drive_letter)
+            return
+        is_authorized, auth_reason = False, f"File Read Error ({type(e).__name__})"
+    except Exception as e:
+        is_authorized, auth_reason = False, f"File Read Error ({type(e).__name__})"
+
+    with summary_lock:
+        summary_entry = unique_devices_summary.get(device_id)
+        current = summary_entry is not None and summary_entry.get('last_drive_letter') == drive_letter
+    if not current or processed_volumes.get(device_id) != 'allowed':
+        logging.info("Skipping re-verification of %s: the device was removed or re-inserted meanwhile.", device_id)
+        return
+    if is_authorized:
+        admission_cache.remember(fingerprint, device_id)
+        logging.info("Background re-verification passed for %s (%s).", drive_letter, device_id)
+        enumerate_device(drive_letter, drive_root, device_id, summary_entry)
+        with summary_lock:
+            summary_entry['auth_reason'] = auth_reason
+        record_change(unique_devices_summary, device_id, 'reverified', 'auth_reason', 'extra_data')
+        return
 
+    # The cached admission was wrong: revoke it and treat the device as a failed check
+    admission_cache.forget(device_id)
+    logging.warning("Background re-verification failed for %s (%s): %s", drive_letter, device_id, auth_reason)
+    processed_volumes[device_id] = 'failed_auth'
+    auth_total.labels('failed_auth').inc()
+    with summary_lock:
+        summary_entry['auth_reason'] = auth_reason
+        summary_entry['last_state'] = 'failed_auth'
+        summary_entry['total_auth_failure'] = summary_entry.get('total_auth_failure', 0) + 1
+    record_change(unique_devices_summary, device_id, 'reverify_failed',
+                  'auth_reason', 'last_state', 'total_auth_failure')
+    eject_drive_api(drive_letter, device_id, unique_devices_summary, processed_volumes)
 
 
-def handle_usb_arrival(drive_letter, device_id):
+def run_after_current_job(device_id, fn, *args):
     """
-    Handles the logic when a new USB drive is detected. Checks for a required file,
-    updates the in-memory summary of the device, and attempts ejection if the file
-    is not found or valid.
+    Runs fn(*args) as the next job for `device_id`, ahead of any event
+    already queued for it, so follow-up work stays ordered with the device's
+    removal or re-insertion. Without a worker pool the handler is running
+    inline, so fn runs at once.
+    """
+    if dispatch_pool is not None:
+        dispatch_pool.submit_next(device_id, fn, *args)
+    else:
+        fn(*args)
+
+
+def call_for_device(device_id, fn, *args, timeout=None):
+    """
+    Calls fn(*args) from any thread (e.g. a service request) in order with
+    the running monitor's events for `device_id`, or directly if no monitor
+    is running, and returns its result.
+
+    Raises:
+        concurrent.futures.TimeoutError: No result within `timeout` seconds.
+    """
+    dispatch = device_dispatch
+    if dispatch is None:
+        return fn(*args)
+    future = concurrent.futures.Future()
+    dispatch(device_id, call_into, future, fn, *args)
+    return future.result(timeout=timeout)
+
+
+def begin_arrival(drive_letter, device_id):
+    """
+    First stage of an arrival: skips devices already being checked, marks the
+    device as 'checking' and records the arrival in the summary.
+
+    Returns:
+        dict: The device's summary entry, or None when the event is ignored.
     """
-    
     global stop_event
     if globals().get("stop_event") and stop_event.is_set():
-        logging.info(f"Ignoring arrival for {device_id} because monitoring is stopped.")
-        return
+        logging.info("Ignoring arrival for %s because monitoring is stopped.", device_id)
+        return None
     
-    logging.debug(f"handle_usb_arrival entered for {drive_letter} ({device_id})") #DEBUG
+    logging.debug("handle_usb_arrival entered for %s (%s)", drive_letter, device_id) #DEBUG
 
     # --- Prevent rapid re-processing ---
     current_transient_state = processed_volumes.get(device_id) # Check the *transient* state dict
     if current_transient_state not in ['removed', 'ejected', None, 'failed_eject_dll', 'allowed', 'failed_auth', 'access_error']:
-         logging.debug(f"Ignoring event for {device_id}. Current transient state is '{current_transient_state}', indicating active processing.")
-         return
+         logging.debug("Ignoring event for %s. Current transient state is '%s', indicating active processing.", device_id, current_transient_state)
+         return None
 
     # --- Log Arrival Info ---
-    logging.info(f"--- USB Drive Arrival Detected ---")
-    logging.info(f"  Drive Letter: {drive_letter}")
-    logging.info(f"  Volume GUID:  {device_id}")
-    logging.info(f"---------------------------------")
+    logging.info("--- USB Drive Arrival Detected ---")
+    logging.info("  Drive Letter: %s", drive_letter)
+    logging.info("  Volume GUID:  %s", device_id)
+    logging.info("---------------------------------")
 
     # Set the state to checking
     processed_volumes[device_id] = 'checking'
-    logging.info(f"State for {device_id} set to 'checking'")
+    logging.info("State for %s set to 'checking'", device_id)
     
 
     # --- Update In-Memory Summary: Record Arrival ---
-    now_iso = datetime.datetime.now().isoformat()
-    logging.debug(f"[Summary] Updating summary for arrived device {device_id}") # DEBUG
+    now_iso = clock.now_iso()
+    logging.debug("[Summary] Updating summary for arrived device %s", device_id) # DEBUG
     
-    # Use .setdefault() which gets the value if key exists, or inserts a new dict and returns it if key doesn't exist
-    summary_entry = unique_devices_summary.setdefault(device_id, {})
-    
-    is_first_record = not summary_entry.get('first_seen')
-    if is_first_record:
-        summary_entry['first_seen'] = now_iso
-        summary_entry['arrival_count'] = 1
-        logging.info(f"[Summary] First time recording device {device_id}.") # INFO
-    else:
-        summary_entry['arrival_count'] = summary_entry.get('arrival_count', 0) + 1
-
-    summary_entry['last_seen'] = now_iso
-    summary_entry['last_drive_letter'] = drive_letter
-    summary_entry['last_state'] = 'checking' # Initial state for this arrival
-
-    # Initialize/Update counters and new fields
-    summary_entry.setdefault('total_auth_success', 0)
-    summary_entry.setdefault('total_auth_failure', 0)
-    summary_entry.setdefault('total_eject_success', 0)
-    summary_entry.setdefault('total_eject_failure', 0)
-    summary_entry.setdefault('auth_reason', 'Pending Check')
-    summary_entry.setdefault('volume_details', {})
-    
-    # initialize extra_data if enumeration might happen
-    if ENUM_LEVEL != 'none':
-         summary_entry.setdefault('extra_data', {}).setdefault('files_enumeration', {})
+    with summary_lock:
+        # Use .setdefault() which gets the value if key exists, or inserts a new dict and returns it if key doesn't exist
+        summary_entry = unique_devices_summary.setdefault(device_id, {})
+
+        is_first_record = not summary_entry.get('first_seen')
+        if is_first_record:
+            summary_entry['first_seen'] = now_iso
+            summary_entry['arrival_count'] = 1
+            logging.info("[Summary] First time recording device %s.", device_id) # INFO
+        else:
+            summary_entry['arrival_count'] = summary_entry.get('arrival_count', 0) + 1
 
-    logging.debug(f"[Summary] Updated entry for {device_id} after arrival: {summary_entry}") # DEBUG
+        summary_entry['last_seen'] = now_iso
+        summary_entry['last_drive_letter'] = drive_letter
+        summary_entry['last_state'] = 'checking' # Initial state for this arrival
+
+        # Initialize/Update counters and new fields
+        summary_entry.setdefault('total_auth_success', 0)
+        summary_entry.setdefault('total_auth_failure', 0)
+        summary_entry.setdefault('total_eject_success', 0)
+        summary_entry.setdefault('total_eject_failure', 0)
+        summary_entry.setdefault('auth_reason', 'Pending Check')
+        summary_entry.setdefault('volume_details', {})
 
-    # --- Wait for mount stability ---
-    logging.info(f"Waiting for {MOUNT_DELAY} seconds for mount stability...")
-    time.sleep(MOUNT_DELAY)
+        # initialize extra_data if enumeration might happen
+        if ENUM_LEVEL == 'root':
+             summary_entry.setdefault('extra_data', {})
+    record_change(unique_devices_summary, device_id, 'arrival',
+                  'first_seen', 'arrival_count', 'last_seen', 'last_drive_letter', 'last_state',
+                  'total_auth_success', 'total_auth_failure', 'total_eject_success', 'total_eject_failure',
+                  'auth_reason', 'volume_details')
 
-    # --- Check if drive still exists ---
-    if not os.path.exists(drive_letter + '\\'):
-        logging.warning(f"Drive {drive_letter} disappeared before file check.")
-        processed_volumes[device_id] = 'removed'
-        # Update summary state
-        now_iso = datetime.datetime.now().isoformat()
+    logging.debug("[Summary] Updated entry for %s after arrival: %s", device_id, summary_entry) # DEBUG
+    return summary_entry
+
+
+def check_drive_present(drive_letter, device_id):
+    """
+    Returns the volume root once the mount wait is over, or None (after
+    recording the device as removed) if the drive disappeared meanwhile.
+    """
+    drive_root = volume_root(drive_letter) # "E:\\" on Windows, the mount point for a Linux device node
+    if drive_root is not None and os.path.exists(drive_root):
+        return drive_root
+    logging.warning("Drive %s disappeared before file check.", drive_letter)
+    processed_volumes[device_id] = 'removed'
+    # Update summary state
+    now_iso = clock.now_iso()
+    with summary_lock:
         summary_entry = unique_devices_summary.get(device_id)
         if summary_entry:
             summary_entry['last_state'] = 'removed'
             summary_entry['last_seen'] = now_iso
-            logging.debug(f"[Summary] Updated entry for {device_id} after disappearing: {summary_entry}") # DEBUG
-        logging.info(f"Transient state for {device_id} set to 'removed'")
-        return # Stop processing this arrival
+            logging.debug("[Summary] Updated entry for %s after disappearing: %s", device_id, summary_entry) # DEBUG
+    record_change(unique_devices_summary, device_id, 'disappeared', 'last_state', 'last_seen')
+    logging.info("Transient state for %s set to 'removed'", device_id)
+    return None
 
-    # ------ GET VOLUME DETAILS ------
-    volume_details = get_volume_details(drive_letter, device_id)
+
+def store_volume_details(drive_letter, device_id, summary_entry, volume_details):
     if volume_details:
-        summary_entry['volume_details'] = volume_details
-        logging.debug(f"[Summary] Stored volume details for {device_id}")
+        with summary_lock:
+            summary_entry['volume_details'] = volume_details
+        logging.debug("[Summary] Stored volume details for %s", device_id)
     else:
-        logging.warning(f"Could not retrieve volume details for {drive_letter}. Summary may be incomplete.")
+        logging.warning("Could not retrieve volume details for %s. Summary may be incomplete.", drive_letter)
         # Ensure the key exists even if empty
-        summary_entry.setdefault('volume_details', {})
+        with summary_lock:
+            summary_entry.setdefault('volume_details', {})
+
 
+def authorize_device(drive_letter, device_id, drive_root, volume_details, summary_entry):
+    """
+    Decides whether the device is allowed: a cached admission for an
+    unchanged fingerprint, else a bounded read of its auth file checked
+    against the key registry. Stores the reason and the transient state.
+
+    Returns:
+        tuple: (is_authorized, admitted, file_to_check, fingerprint)
+    """
     # --- File Check & Content Validation --
     # --- Construct file path to required file ---
-    file_to_check = os.path.join(drive_letter, REQUIRED_FILE)
+    file_to_check = os.path.join(drive_root, REQUIRED_FILE)
     is_authorized = False
     auth_reason = "Check Not Performed"
-    final_state_this_instance = 'checking' # Default before check
-    
+
+    # --- Fast path: recently verified device presenting the same fingerprint ---
     try:
-        if os.path.exists(file_to_check):
-            # ----- STORE REASON IMMEDIATELY ------
-            auth_reason = "File Found, Validating Content..."
+        auth_stat = os.stat(file_to_check)
+    except OSError:
+        auth_stat = None
+    fingerprint = device_fingerprint(device_id, volume_details, auth_stat) if ADMISSION_ENABLED else None
+    admitted = fingerprint is not None and admission_cache.admit(fingerprint)
+
+    if admitted:
+        is_authorized = True
+        auth_reason = "OK (Cached Admission)" # re-verified in the background
+    elif auth_stat is not None:
+        # ----- STORE REASON IMMEDIATELY ------
+        auth_reason = "File Found, Validating Content..."
+        with summary_lock:
             summary_entry['auth_reason'] = auth_reason # Update summary early
-            
-            try:
-                with open(file_to_check, 'r', encoding='utf-8') as f:
-                    file_content = f.read().strip()
-                    
-                # Validate file content against the expected key
-                if file_content == EXPECTED_KEY:
-                    is_authorized = True
-                    auth_reason = "OK" # Final success reason
-                else:
-                    auth_reason = "Content Mismatch" # Final fail reason
-                    logging.debug(f"Auth content mismatch on {drive_letter}.")
-            except Exception as e:
-                auth_reason = f"File Read Error ({type(e).__name__})" # Final fail reason
-                logging.error(f"File Read Error: Drive={drive_letter}, File={REQUIRED_FILE}, Error={e}", exc_info=False)
-        else:
-            auth_reason = "File Not Found"
+        
+        try:
+            # Bounded read: an oversized auth file is rejected, never read in full
+            with stage('auth_read'):
+                file_content = read_auth_token(file_to_check)
+
+            # Validate file content against the key registry / expected key
+            is_authorized, auth_reason = key_registry.check(file_content)
+            if not is_authorized:
+                logging.debug("Auth key rejected on %s: %s.", drive_letter, auth_reason)
+        except AuthFileTooLarge:
+            auth_reason = "Auth File Too Large" # Final fail reason
+        except Exception as e:
+            auth_reason = f"File Read Error ({type(e).__name__})" # Final fail reason
+            logging.error("File Read Error: Drive=%s, File=%s, Error=%s", drive_letter, REQUIRED_FILE, e, exc_info=False)
+    else:
+        auth_reason = "File Not Found"
 
 
-        # ----- UPDATE SUMMARY WITH FINAL AUTH REASON ------
-        summary_entry['auth_reason'] = auth_reason
-        now_iso = datetime.datetime.now().isoformat() # Get time after check
-        
-        
-        # --- Log Result, Update Transient State ---
+    if ADMISSION_ENABLED and not admitted:
         if is_authorized:
-            logging.info(f"Auth Success: Drive={drive_letter}, Reason={auth_reason}")
-            processed_volumes[device_id] = 'allowed'
+            admission_cache.remember(fingerprint, device_id)
         else:
-            logging.warning(f"Auth Failed: Drive={drive_letter}, Reason={auth_reason}")
-            processed_volumes[device_id] = 'failed_auth'
+            admission_cache.forget(device_id)
 
+    # ----- UPDATE SUMMARY WITH FINAL AUTH REASON ------
+    with summary_lock:
+        summary_entry['auth_reason'] = auth_reason
+    
+    # --- Log Result, Update Transient State ---
+    if is_authorized:
+        logging.info("Auth Success: Drive=%s, Reason=%s", drive_letter, auth_reason)
+        processed_volumes[device_id] = 'allowed'
+    else:
+        logging.warning("Auth Failed: Drive=%s, Reason=%s", drive_letter, auth_reason)
+        processed_volumes[device_id] = 'failed_auth'
+    return is_authorized, admitted, file_to_check, fingerprint
 
-        # ------ OPTIONAL: ROOT FILE ENUMERATION ------
-        if ENUM_LEVEL == 'root':
-            logging.info(f"Starting root file enumeration for {drive_letter}...")
-            # Ensure structure exists
-            files_enum_dict = summary_entry.setdefault('extra_data', {}).setdefault('files_enumeration', {})
-            files_enum_dict.clear() # Clear previous enumeration for this device if any
-            file_count = 0
-            try:
-                with os.scandir(drive_letter + '\\') as entries:
-                    for entry in entries:
-                        if file_count >= MAX_ROOT:
-                             logging.warning(f"Reached maximum ({MAX_ROOT}) root files/folders to list for {drive_letter}.")
-                             files_enum_dict['_truncated_'] = True # Indicate list is cut short
-                             break
-                        try:
-                            stat_info = entry.stat()
-                            file_data = {
-                                "size": stat_info.st_size,
-                                "created": datetime.datetime.fromtimestamp(stat_info.st_ctime).isoformat(),
-                                "modified": datetime.datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
-                                "accessed": datetime.datetime.fromtimestamp(stat_info.st_atime).isoformat(),
-                                "is_dir": entry.is_dir(),
-                            }
-                            files_enum_dict[entry.name] = file_data
-                            file_count += 1
-                        except OSError as stat_err:
-                            logging.warning(f"Could not stat file/dir '{entry.path}' during enumeration: {stat_err}")
-                            files_enum_dict[entry.name] = {"error": f"Stat failed: {stat_err}"}
-                        except Exception as entry_err: # Catch other potential errors per entry
-                             logging.error(f"Unexpected error processing entry '{entry.path}': {entry_err}", exc_info=False)
-                             files_enum_dict[entry.name] = {"error": f"Processing error: {entry_err}"}
-
-                logging.info(f"Completed root file enumeration for {drive_letter}. Listed {file_count} items.")
-            except OSError as scan_err:
-                logging.error(f"Could not enumerate root directory {drive_letter}: {scan_err}")
-                summary_entry.setdefault('extra_data', {})['files_enumeration_error'] = f"Scan failed: {scan_err}"
-            except Exception as enum_err: # Catch other potential errors during scan setup
-                 logging.error(f"Unexpected error during root enumeration setup for {drive_letter}: {enum_err}", exc_info=True)
-                 summary_entry.setdefault('extra_data', {})['files_enumeration_error'] = f"Enum setup error: {enum_err}"
+
+def record_access_error(drive_letter, device_id, summary_entry, error):
+    logging.error("Drive Access Error: Drive=%s, Action=Check File/Content/Enumerate, Error=%s", drive_letter, error, exc_info=False)
+    processed_volumes[device_id] = 'access_error'
+    with summary_lock:
+        summary_entry['auth_reason'] = f"Drive Access Error ({type(error).__name__})" # Update reason on access error
+    return 'access_error'
+
+
+def finish_arrival(device_id, final_state_this_instance, auth_outcome):
+    """
+    Last stage of an arrival: final state, last_seen and auth counters.
+    `auth_outcome` is the state the auth check left ('allowed', 'failed_auth'
+    or 'access_error'), before any eject replaced it.
+    """
+    auth_total.labels(auth_outcome).inc()
+
+    # --- Update Summary with Final State & Auth Counters (if not handled by eject) ---
+    now_iso = clock.now_iso() # Get current time for final update
+    with summary_lock:
+        summary_entry = unique_devices_summary.get(device_id) # Re-get in case eject changed it
+        if summary_entry:
+            # Update final state if not already set by a successful/failed eject attempt
+            if final_state_this_instance not in ['ejecting', 'ejected', 'failed_eject_dll']:
+                 summary_entry['last_state'] = final_state_this_instance
+            # Always update last_seen
+            summary_entry['last_seen'] = now_iso
+
+            # Update counters based on authorization outcome (use final_state_this_instance)
+            if final_state_this_instance == 'allowed':
+                 summary_entry['total_auth_success'] = summary_entry.get('total_auth_success', 0) + 1
+            elif final_state_this_instance in ['failed_auth', 'access_error']: # Count access error as auth failure too
+                 summary_entry['total_auth_failure'] = summary_entry.get('total_auth_failure', 0) + 1
+            # Note: Eject counters are handled within eject_drive_api
+    if summary_entry:
+        record_change(unique_devices_summary, device_id, 'checked',
+                      'last_state', 'last_seen', 'auth_reason', 'total_auth_success', 'total_auth_failure',
+                      'volume_details', 'mount_ready_seconds', 'extra_data')
+        logging.debug("[Summary] Final updated entry for %s post-check/auth/enum: %s", device_id, summary_entry)
+    else:
+        logging.warning("[Summary] Cannot update summary post-check: No entry for %s", device_id) # Should be rare
+
+
+@timed('arrival')
+def handle_usb_arrival(drive_letter, device_id):
+    """
+    Handles the logic when a new USB drive is detected. Checks for a required file,
+    updates the in-memory summary of the device, and attempts ejection if the file
+    is not found or valid.
+    """
+    summary_entry = begin_arrival(drive_letter, device_id)
+    if summary_entry is None:
+        return
+
+    # --- Wait for mount stability ---
+    with stage('mount_wait'):
+        if MOUNT_PROBE_MODE == 'fixed':
+            logging.info("Waiting for %s seconds for mount stability...", MOUNT_DELAY)
+            clock.sleep(MOUNT_DELAY)
+        else:
+            learned = summary_entry.get('mount_ready_seconds')
+            logging.info("Probing %s for mount readiness (learned estimate: %ss)...", drive_letter, learned)
+            ready_after = wait_for_mount(drive_letter, estimate=learned,
+                                         stop_event=globals().get("stop_event"))
+            if ready_after is not None:
+                with summary_lock:
+                    summary_entry['mount_ready_seconds'] = learn_estimate(learned, ready_after)
+
+    # --- Check if drive still exists ---
+    drive_root = check_drive_present(drive_letter, device_id)
+    if drive_root is None:
+        return # Stop processing this arrival
+
+    # ------ GET VOLUME DETAILS ------
+    with stage('volume_details'):
+        volume_details = get_volume_details(drive_letter, device_id)
+    store_volume_details(drive_letter, device_id, summary_entry, volume_details)
+
+    admitted = False
+    try:
+        is_authorized, admitted, file_to_check, fingerprint = authorize_device(
+            drive_letter, device_id, drive_root, volume_details, summary_entry)
+        auth_outcome = processed_volumes[device_id] # eject_drive_api overwrites it below
+
+        # ------ OPTIONAL: FILE ENUMERATION & HASHING ------
+        # A cached admission is re-verified and enumerated once the decision is recorded (below)
+        if not admitted:
+            enumerate_device(drive_letter, drive_root, device_id, summary_entry, rejected=not is_authorized)
 
 
         # --- Attempt Ejection if Auth Failed ---
@@ -265,32 +504,13 @@ def handle_usb_arrival(drive_letter, device_id):
         final_state_this_instance = processed_volumes[device_id] # Get state after check/eject attempt
 
     except OSError as e:
-        logging.error(f"Drive Access Error: Drive={drive_letter}, Action=Check File/Content/Enumerate, Error={e}", exc_info=False)
-        processed_volumes[device_id] = 'access_error'
-        final_state_this_instance = 'access_error'
-        summary_entry['auth_reason'] = f"Drive Access Error ({type(e).__name__})" # Update reason on access error
-        
-    # --- Update Summary with Final State & Auth Counters (if not handled by eject) ---
-    now_iso = datetime.datetime.now().isoformat() # Get current time for final update
-    summary_entry = unique_devices_summary.get(device_id) # Re-get in case eject changed it
-    if summary_entry:
-        # Update final state if not already set by a successful/failed eject attempt
-        if final_state_this_instance not in ['ejecting', 'ejected', 'failed_eject_dll']:
-             summary_entry['last_state'] = final_state_this_instance
-        # Always update last_seen
-        summary_entry['last_seen'] = now_iso
+        final_state_this_instance = auth_outcome = record_access_error(drive_letter, device_id, summary_entry, e)
 
-        # Update counters based on authorization outcome (use final_state_this_instance)
-        if final_state_this_instance == 'allowed':
-             summary_entry['total_auth_success'] = summary_entry.get('total_auth_success', 0) + 1
-        elif final_state_this_instance in ['failed_auth', 'access_error']: # Count access error as auth failure too
-             summary_entry['total_auth_failure'] = summary_entry.get('total_auth_failure', 0) + 1
-        # Note: Eject counters are handled within eject_drive_api
-        
-        save_summary(unique_devices_summary)
-        logging.debug(f"[Summary] Final updated entry for {device_id} post-check/auth/enum: {summary_entry}")
-    else:
-        logging.warning(f"[Summary] Cannot update summary post-check: No entry for {device_id}") # Should be rare
+    finish_arrival(device_id, final_state_this_instance, auth_outcome)
+
+    if admitted:
+        run_after_current_job(device_id, _reverify_admission,
+                              drive_letter, drive_root, device_id, file_to_check, fingerprint)
         
         
 
@@ -298,65 +518,108 @@ def handle_usb_arrival(drive_letter, device_id):
 
 
 # --- Function for handling removal ---
+@timed('removal')
 def handle_usb_removal(device_id):
     
     global stop_event
     if globals().get("stop_event") and stop_event.is_set():
-        logging.info(f"Ignoring arrival for {device_id} because monitoring is stopped.")
+        logging.info("Ignoring arrival for %s because monitoring is stopped.", device_id)
         return
     
     global unique_devices_summary # Needed to modify global dict
     global processed_volumes      # Needed to modify global dict
-    logging.info(f"--- USB Drive Removal Detected ---")
-    logging.info(f"   Volume GUID: {device_id}")
-    logging.info(f"---------------------------------")
-    logging.debug(f"[Summary] Processing removal for {device_id}") # DEBUG
+    logging.info("--- USB Drive Removal Detected ---")
+    logging.info("   Volume GUID: %s", device_id)
+    logging.info("---------------------------------")
+    logging.debug("[Summary] Processing removal for %s", device_id) # DEBUG
+    # Cached volume details are kept for the volume's whole mount and dropped here
+    invalidate_device(volume_guid=device_id)
 
     # Update transient state
     if device_id in processed_volumes:
         if processed_volumes[device_id] != 'ejected': # Don't overwrite if we ejected it
             processed_volumes[device_id] = 'removed'
-            logging.info(f"Transient state for {device_id} set to 'removed'")
+            logging.info("Transient state for %s set to 'removed'", device_id)
         else:
-            logging.info(f"Volume {device_id} removed, consistent with prior 'ejected' transient state.")
+            logging.info("Volume %s removed, consistent with prior 'ejected' transient state.", device_id)
             processed_volumes[device_id] = 'removed'
     else:
-        logging.info(f"Untracked volume {device_id} removed.")
+        logging.info("Untracked volume %s removed.", device_id)
         processed_volumes[device_id] = 'removed' # Track it as removed now
 
     # --- Update Summary ---
-    now_iso = datetime.datetime.now().isoformat()
-    summary_entry = unique_devices_summary.get(device_id)
+    now_iso = clock.now_iso()
+    with summary_lock:
+        summary_entry = unique_devices_summary.get(device_id)
+        if summary_entry is not None:
+            summary_entry['last_state'] = 'removed'
+            summary_entry['last_seen'] = now_iso
+            # summary_entry['last_drive_letter'] = None     # Optional: Clear drive letter
     if summary_entry is not None:
-        summary_entry['last_state'] = 'removed'
-        summary_entry['last_seen'] = now_iso
-        # summary_entry['last_drive_letter'] = None     # Optional: Clear drive letter
-        save_summary(unique_devices_summary)
-        logging.debug(f"[Summary] Updated entry for {device_id} after removal: {summary_entry}") # DEBUG
+        record_change(unique_devices_summary, device_id, 'removal', 'last_state', 'last_seen')
+        logging.debug("[Summary] Updated entry for %s after removal: %s", device_id, summary_entry) # DEBUG
     else:
         # This might happen if a device is removed very quickly before arrival processing finished
-        logging.debug(f"[Summary] No summary entry found for removed device {device_id}.") # DEBUG
-
+        logging.debug("[Summary] No summary entry found for removed device %s.", device_id) # DEBUG
 
 
 
 
+def handle_usb_flapping(cycles, backoff, device_id):
+    """
+    Records a flapping episode reported by the debouncer: the device went
+    through `cycles` arrival/removal cycles and its events are held for
+    `backoff` seconds.
+    """
+    logging.warning("Device %s is flapping (%s cycles); cooling off for %gs.", device_id, cycles, backoff)
+    now = clock.get_clock().now()
+    with summary_lock:
+        summary_entry = unique_devices_summary.get(device_id)
+        if summary_entry is not None:
+            summary_entry['flap_count'] = summary_entry.get('flap_count', 0) + 1
+            summary_entry['last_flap'] = now.isoformat()
+            summary_entry['cooling_off_until'] = (now + datetime.timedelta(seconds=backoff)).isoformat()
+    if summary_entry is not None:
+        record_change(unique_devices_summary, device_id, 'flapping', 'flap_count', 'last_flap', 'cooling_off_until')
+    else:
+        logging.debug("[Summary] No summary entry found for flapping device %s.", device_id) # DEBUG
 
 
 # --- Main execution block ---
-def main(stop_event=None):
+def start_monitoring(stop_event):
+    """
+    Start-up shared by main() and the asyncio entry point (usb_logger_async):
+    logging, summary load/replay/migration, background persistence and the
+    optional metrics and query API endpoints.
+
+    Returns:
+        list: The HTTP servers started; hand it to stop_monitoring().
+    """
     global logger, unique_devices_summary, processed_volumes
-    
-    # ─── ensure we have a real Event ────────────────────────────────────────────
-    if stop_event is None:
-        stop_event = threading.Event()
     globals()['stop_event'] = stop_event
     
     # --- initialize logging, state & summary persistence ---
     logger = setup_logging()
     unique_devices_summary = load_summary()
     processed_volumes = {}
-    atexit.register(lambda: save_summary(unique_devices_summary))
+    # The summary file is a snapshot; replay any journaled changes made after it
+    journal = None
+    if SUMMARY_JOURNAL:
+        journal = DeviceJournal(SCRIPT_DIR, keep_segments=JOURNAL_KEEP_SEGMENTS)
+        replayed = journal.replay(unique_devices_summary)
+    # Writes are coalesced in the background; flush whatever is pending on exit
+    persister = start_persister(unique_devices_summary, journal)
+    if journal is not None and replayed:
+        persister.mark_dirty(urgent=True) # compact the replayed tail into a fresh snapshot
+    # Older summaries carry root listings inline; move them to sidecar files once
+    migrated = migrate_root_listings(unique_devices_summary, summary_lock)
+    if migrated:
+        logger.info("Moved %s inline root listing(s) to sidecar files.", len(migrated))
+        for device_id in migrated:
+            record_change(unique_devices_summary, device_id, 'migrate', 'extra_data')
+    atexit.register(flush_summary)
+    servers = [start_metrics_server(METRICS_PORT) if METRICS_ENABLED else None,
+               start_api_server(API_PORT) if API_ENABLED else None]
     
     
     # ——————————————————————————— Script Initialization ———————————————————————————
@@ -365,36 +628,105 @@ def main(stop_event=None):
     logger.warning("IMPORTANT: This script requires Administrator privileges for WMI queries and drive ejection.")
     logger.info("Press Ctrl+C to stop.")
     # —————————————————————————————————————————————————————————————————————————————
+    return [server for server in servers if server is not None]
+
 
-    # ─── set up the event queue & watcher threads ───────────────────────────────
-    event_q = queue.Queue()
-    t_arr = threading.Thread(
-        target=_arrival_watcher,
-        args=(event_q, stop_event),
-        daemon=True
-    )
-    t_rem = threading.Thread(
-        target=_removal_watcher,
-        args=(event_q, stop_event),
-        daemon=True
-    )
-    t_arr.start()
-    t_rem.start()
+def stop_monitoring(servers):
+    """Flushes the summary and stops the persister and the HTTP endpoints."""
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    stop_persister()
+
+
+# How often the dispatcher retries events parked for a busy device
+PARKED_RETRY_INTERVAL = 0.05
+
+def main(stop_event=None, event_source=None):
+    """
+    Runs the monitor until stop_event is set. `event_source` overrides the
+    configured source (e.g. a SimulatedEventSource for throughput runs).
+    """
+    # ─── ensure we have a real Event ────────────────────────────────────────────
+    if stop_event is None:
+        stop_event = threading.Event()
+    servers = start_monitoring(stop_event)
+
+    # ─── set up the event queue & event source thread ──────────────────────────
+    # Bounded so a burst cannot pile up without limit while handlers are slow
+    event_q = BoundedEventQueue(EVENT_QUEUE_CAPACITY) if EVENT_QUEUE_CAPACITY else queue.Queue()
+    source = event_source or create_event_source()
+    logger.info("Using the '%s' event source.", source.name)
+    watchers = [threading.Thread(target=source.run, args=(event_q, stop_event), daemon=True)]
+    for t in watchers:
+        t.start()
+
+    # ─── optional worker pool: concurrent across devices, ordered per device ─
+    pool = parked = None
+    if WORKER_POOL_SIZE > 1:
+        # With a bounded queue, keep the pool's own backlog short: a device holds at most a
+        # running and a queued event. The dispatcher parks what does not fit instead of
+        # waiting, and stops taking events once it has parked as many as the pool holds,
+        # so the backlog stays in event_q and its overflow policy applies
+        bounded = bool(EVENT_QUEUE_CAPACITY)
+        pool = KeyedWorkerPool(WORKER_POOL_SIZE,
+                               initializer=pythoncom.CoInitialize if pythoncom else None,
+                               finalizer=pythoncom.CoUninitialize if pythoncom else None,
+                               max_pending=2 * WORKER_POOL_SIZE if bounded else None,
+                               max_pending_per_key=2 if bounded else None)
+        parked = ParkedJobs(pool, limit=2 * WORKER_POOL_SIZE)
+        logger.info("Dispatching events to a pool of %s workers.", WORKER_POOL_SIZE)
+    global dispatch_pool, device_dispatch
+    dispatch_pool = pool
+    # Calls from other threads (see call_for_device): through the pool, or run between events
+    inline_calls = queue.Queue()
+    device_dispatch = pool.submit if pool else lambda device_id, fn, *args: inline_calls.put((fn, args))
+
+    handlers = {'arrival': handle_usb_arrival, 'removal': handle_usb_removal, 'flapping': handle_usb_flapping}
+    if DEBOUNCE_ENABLED:
+        logger.info("Debouncing repeated events and suppressing flapping devices.")
 
     # dispatch loop: block on queue, then call your handlers
     try:
         while not (stop_event and stop_event.is_set()):
-            try:
-                typ, *args = event_q.get(timeout=1)
-            except queue.Empty:
-                # no event yet, just loop
-                continue
-            
-            # got a real event—dispatch
-            if typ == 'arrival':
-                handle_usb_arrival(*args)
+            if parked:
+                parked.retry()
+            # Wake up in time to release events the debouncer is holding
+            due = debouncer.next_due() if DEBOUNCE_ENABLED else None
+            timeout = 1 if due is None else min(1, max(due, 0.01))
+            if parked:
+                timeout = min(timeout, PARKED_RETRY_INTERVAL)
+            if parked is not None and parked.full():
+                # Leave new events in event_q until the pool catches up
+                stop_event.wait(timeout)
+                event = None
+            else:
+                try:
+                    event = event_q.get(timeout=timeout)
+                except queue.Empty:
+                    # no event yet, just loop
+                    event = None
+
+            if event is not None:
+                events_total.labels(event[0]).inc()
+            if DEBOUNCE_ENABLED:
+                ready = (debouncer.offer(event) if event is not None else []) + debouncer.release_due()
             else:
-                handle_usb_removal(*args)
+                ready = [event] if event is not None else []
+
+            # got real events—dispatch
+            for typ, *args in ready:
+                queue_depth.set(event_q.qsize() + (pool.pending_count() + len(parked) if pool else 0))
+                handler = handlers[typ]
+                if pool:
+                    # Volume GUID is the last element of every event tuple
+                    parked.submit(args[-1], handler, *args)
+                else:
+                    handler(*args)
+
+            while not inline_calls.empty():
+                fn, args = inline_calls.get()
+                fn(*args)
                 
     except KeyboardInterrupt:
         logger.info("Stopping monitoring.")
@@ -406,9 +738,16 @@ def main(stop_event=None):
         stop_event.set()
             
     # ─── now join before exiting ───────────────────────────────────────────
+    if parked:
+        logger.warning("%s event(s) for busy devices were not dispatched before shutdown.", len(parked))
+    if pool:
+        logger.info("Waiting for in-flight device checks to finish…")
+        pool.shutdown(wait=True, timeout=5)
+    dispatch_pool = device_dispatch = None
     logger.info("Waiting for watcher threads to exit…")
-    t_arr.join(timeout=5)
-    t_rem.join(timeout=5)
+    for t in watchers:
+        t.join(timeout=5)
+    stop_monitoring(servers)
     logger.info("All threads terminated, exiting.")
 
 
@@ -0,0 +1,168 @@
+"""
+Runs the USB monitor as a standalone service that dashboards attach to over
+a local socket (see utils/ipc.py): device changes, log lines and status are
+pushed to every subscribed client as they happen, and clients can ask for
+device details, eject a device, stop/start monitoring or shut the service
+down. The monitor keeps running when dashboards detach; any number can
+attach at once.
+
+    python usb_monitor_service.py [--entry threads|asyncio]
+
+[Service] Entry picks the monitor by default: usb_logger_win.main (threads)
+or usb_logger_async.main (asyncio).
+"""
+import sys
+import logging
+import argparse
+import threading
+import concurrent.futures
+
+import usb_logger_win
+from utils.config         import SERVICE_ENTRY, SERVICE_ADDRESS
+from utils.summary        import summary_cache, summary_version, add_change_listener, remove_change_listener
+from utils.logging_setup  import setup_logging, add_log_handler, remove_log_handler
+from utils.enumeration    import load_root_listing
+from utils.eject          import eject_drive_api
+from utils.ipc            import EventPublisher, PublishingLogHandler, ServiceAlreadyRunning
+
+try:
+    import pythoncom
+except ImportError:
+    pythoncom = None
+
+
+# How long an eject request waits for the device's earlier events and the eject itself
+EJECT_TIMEOUT = 50
+
+
+class MonitorService:
+    """
+    Owns one monitor thread and the publisher its clients talk to. The
+    monitor can be stopped and started again without dropping clients.
+    """
+
+    def __init__(self, entry=SERVICE_ENTRY, event_source=None, address=SERVICE_ADDRESS, authkey=None):
+        self.entry = entry
+        self.event_source = event_source
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.shutdown_requested = threading.Event()
+        self._control_lock = threading.Lock()
+        self.publisher = EventPublisher(self.snapshot, {
+            'device': self.device,
+            'eject': self.eject,
+            'monitoring': self.set_monitoring,
+            'shutdown': self.request_shutdown,
+        }, address=address, authkey=authkey)
+        self.log_handler = PublishingLogHandler(self.publisher)
+
+    @property
+    def monitoring(self):
+        return self.thread is not None and self.thread.is_alive() and not self.stop_event.is_set()
+
+    def start(self):
+        """Starts listening for clients, then the monitor. Raises ServiceAlreadyRunning."""
+        self.publisher.start()
+        add_change_listener(self.publisher.publish_change)
+        add_log_handler(self.log_handler)
+        self.set_monitoring(True)
+
+    def stop(self):
+        self.set_monitoring(False)
+        remove_log_handler(self.log_handler)
+        remove_change_listener(self.publisher.publish_change)
+        self.publisher.stop()
+
+    def _run_monitor(self, stop_event):
+        if self.entry == 'asyncio':
+            import usb_logger_async
+            target = usb_logger_async.main
+        else:
+            target = usb_logger_win.main
+        if pythoncom:
+            pythoncom.CoInitialize()
+        try:
+            target(stop_event=stop_event, event_source=self.event_source)
+        except Exception as e:
+            logging.error("Error in monitor thread: %s", e)
+        finally:
+            if pythoncom:
+                pythoncom.CoUninitialize()
+            self.publisher.publish({'type': 'status', 'monitoring': self.monitoring})
+
+    def set_monitoring(self, enabled):
+        """Starts or stops the monitor thread; returns whether it is running."""
+        with self._control_lock:
+            if enabled and not self.monitoring:
+                self.stop_event = threading.Event()
+                self.thread = threading.Thread(target=self._run_monitor, args=(self.stop_event,),
+                                               name="usb-monitor", daemon=True)
+                self.thread.start()
+                logging.info("Monitoring started.")
+            elif not enabled and self.thread is not None:
+                self.stop_event.set()
+                self.thread.join(timeout=10)
+                logging.info("Monitoring stopped.")
+            self.publisher.publish({'type': 'status', 'monitoring': self.monitoring})
+            return self.monitoring
+
+    def request_shutdown(self):
+        """Lets main() stop the service once the reply has been sent."""
+        logging.info("Shutdown requested by a client.")
+        self.shutdown_requested.set()
+        return True
+
+    def snapshot(self):
+        return {
+            'devices': dict(summary_cache.get()),
+            'summary_version': summary_version(),
+            'monitoring': self.monitoring,
+            'log': list(self.log_handler.recent),
+        }
+
+    def device(self, device_id):
+        entry = summary_cache.get_device(device_id)
+        if entry is None:
+            raise KeyError(f"Unknown device {device_id}")
+        ref = entry.get('extra_data', {}).get('files_enumeration_ref')
+        return {'entry': entry, 'root_listing': load_root_listing(ref) if ref else None}
+
+    def eject(self, device_id):
+        drive = (summary_cache.get_device(device_id) or {}).get('last_drive_letter')
+        if not drive:
+            raise ValueError(f"No drive letter recorded for {device_id}")
+        # Runs in order with the monitor's events for this device, not alongside them
+        try:
+            ejected = usb_logger_win.call_for_device(device_id, eject_drive_api, drive, device_id,
+                                                     usb_logger_win.unique_devices_summary,
+                                                     usb_logger_win.processed_volumes,
+                                                     timeout=EJECT_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"Eject of {drive} did not finish within {EJECT_TIMEOUT}s") from None
+        return {'drive': drive, 'ejected': ejected}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--entry", choices=("threads", "asyncio"), default=SERVICE_ENTRY,
+                    help="monitor implementation to run")
+    args = ap.parse_args(argv)
+
+    setup_logging()
+    service = MonitorService(entry=args.entry)
+    try:
+        service.start()
+    except ServiceAlreadyRunning as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        while not service.shutdown_requested.wait(1):
+            pass
+    except KeyboardInterrupt:
+        logging.info("Stopping the monitor service.")
+    service.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
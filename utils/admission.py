@@ -0,0 +1,90 @@
+import hashlib, logging, threading
+from collections import OrderedDict
+
+from .config import ADMISSION_TTL, ADMISSION_MAX_ENTRIES
+from .metrics import admission_total
+from . import clock
+
+# Volume properties that identify a stick; free space changes with use and is left out
+FINGERPRINT_FIELDS = ('VolumeName', 'FileSystem', 'Size', 'SerialNumber')
+
+
+def device_fingerprint(device_id, volume_details, auth_stat):
+    """
+    Fingerprint of a stick as presented right now: its volume GUID, stable
+    volume details and the size/mtime of its auth file. Any change (a
+    rewritten key file, a reformatted volume) yields a different fingerprint.
+
+    Returns:
+        str: Hex digest, or None when the auth file is missing.
+    """
+    if auth_stat is None:
+        return None
+    details = volume_details or {}
+    parts = [device_id] + [str(details.get(f)) for f in FINGERPRINT_FIELDS]
+    parts += [str(auth_stat.st_size), str(auth_stat.st_mtime_ns)]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+class AdmissionCache:
+    """
+    Remembers fingerprints of recently authorized devices so a re-inserted
+    stick can be admitted without re-reading its auth file. Entries expire
+    after `ttl` seconds and the least recently used are evicted beyond
+    `max_entries`. A failed check forgets every fingerprint of that device.
+    """
+
+    def __init__(self, ttl=ADMISSION_TTL, max_entries=ADMISSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # fingerprint -> (device_id, verified_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def admit(self, fingerprint):
+        """Returns True if `fingerprint` was verified less than ttl seconds ago."""
+        now = clock.get_clock().monotonic()
+        with self._lock:
+            entry = self._entries.get(fingerprint) if fingerprint else None
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(fingerprint)
+                self.hits += 1
+                admission_total.labels('hit').inc()
+                return True
+            if entry is not None:
+                del self._entries[fingerprint] # expired
+            self.misses += 1
+        admission_total.labels('miss').inc()
+        return False
+
+    def remember(self, fingerprint, device_id):
+        """Records a successful full verification of `fingerprint`."""
+        if not fingerprint:
+            return
+        with self._lock:
+            self._entries[fingerprint] = (device_id, clock.get_clock().monotonic())
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def forget(self, device_id):
+        """Drops every fingerprint recorded for `device_id`."""
+        with self._lock:
+            stale = [fp for fp, (dev, _) in self._entries.items() if dev == device_id]
+            for fp in stale:
+                del self._entries[fp]
+        if stale:
+            logging.info("Admission cache: forgot %s fingerprint(s) of %s", len(stale), device_id)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'hit_rate': self.hits / total if total else 0.0}
+
+
+# ─── Module-level cache used by the monitor ────────────────────────────────
+admission_cache = AdmissionCache()
@@ -0,0 +1,285 @@
+"""
+Read-only JSON query API over the device summary, for tools that used to
+copy unique_devices_summary.json off the machine. Served on localhost only:
+
+  GET /api/devices              devices sorted by id, without extra_data
+      ?state=allowed,failed_auth  only these last_state values
+      ?since=<version>            only devices changed after that version
+      ?limit=<n>&cursor=<c>       page size and the next_cursor of the previous page
+  GET /api/devices/<device id>  one device's full entry (id URL-encoded)
+  GET /api/events               recent recorded changes, newest first
+      ?since=<version>            only changes after that version
+      ?limit=<n>&cursor=<c>
+
+Every response carries an ETag derived from the summary change version
+(collections) or the entry version (single device); a request whose
+If-None-Match still matches gets 304 Not Modified without a body being
+built, so polling clients are cheap. Requests are answered from the API's
+own copy of the summary, kept current by a change listener, so they never
+wait on summary_lock and never hold up the handlers.
+"""
+import json
+import base64
+import bisect
+import logging
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from .        import clock
+from .config  import API_PAGE_SIZE, API_EVENT_HISTORY
+from .summary import summary_cache, add_change_listener, remove_change_listener
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 1000
+
+
+class BadRequest(ValueError):
+    """A query parameter could not be parsed."""
+
+
+def _encode_cursor(device_id):
+    return base64.urlsafe_b64encode(device_id.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        return base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True).decode('utf-8')
+    except ValueError as e:
+        raise BadRequest(f"Invalid cursor: {cursor!r}") from e
+
+
+def _int_param(query, name, default=None, minimum=0, maximum=None):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+    if value < minimum:
+        raise BadRequest(f"{name} must be at least {minimum}")
+    return min(value, maximum) if maximum is not None else value
+
+
+class RecentEvents:
+    """
+    Ring of the last `maxlen` recorded changes, fed by a summary change
+    listener. Each change's version is unique and increasing, so it doubles
+    as the event's sequence number and cursor.
+    """
+
+    def __init__(self, maxlen=API_EVENT_HISTORY):
+        self._events = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, device_id, event, entry):
+        with self._lock:
+            self._events.append({
+                'version': entry.get('version'),
+                'time': clock.now_iso(),
+                'device_id': device_id,
+                'event': event,
+                'last_state': entry.get('last_state'),
+                'last_drive_letter': entry.get('last_drive_letter'),
+            })
+
+    def page(self, limit, before=None, since=None):
+        """Newest first: up to `limit` events older than `before` and newer than `since`."""
+        with self._lock:
+            events = list(self._events)
+        # Workers can record changes slightly out of version order
+        events.sort(key=lambda event: event['version'], reverse=True)
+        page = []
+        for event in events:
+            if before is not None and event['version'] >= before:
+                continue
+            if since is not None and event['version'] <= since:
+                break
+            page.append(event)
+            if len(page) == limit:
+                break
+        return page
+
+
+class DeviceView:
+    """
+    The API's copy of the summary: seeded from summary_cache, then updated
+    with the private entry copies a change listener receives. Each entry's
+    /api/devices row is serialised once when it changes, so a list request
+    only joins ready-made JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}  # device_id -> (entry, JSON row without extra_data)
+        self._ids = []      # sorted, for cursor pagination
+        self.version = 0
+
+    def seed(self, snapshot):
+        """Adds entries from a summary snapshot unless a newer change already arrived."""
+        with self._lock:
+            for device_id, entry in snapshot.items():
+                self._store(device_id, entry)
+
+    def record(self, device_id, event, entry):
+        with self._lock:
+            self._store(device_id, entry)
+
+    def _store(self, device_id, entry):
+        known = self._entries.get(device_id)
+        if known is None:
+            bisect.insort(self._ids, device_id)
+        elif (known[0].get('version') or 0) > (entry.get('version') or 0):
+            return
+        row = json.dumps({'id': device_id, **{k: v for k, v in entry.items() if k != 'extra_data'}},
+                         separators=(',', ':')).encode('utf-8')
+        self._entries[device_id] = (entry, row)
+        self.version = max(self.version, entry.get('version') or 0)
+
+    def get(self, device_id):
+        with self._lock:
+            known = self._entries.get(device_id)
+        return known[0] if known is not None else None
+
+    def page(self, limit, after=None, states=None, since=None):
+        """
+        Up to `limit` (device_id, JSON row) pairs in id order after the id
+        `after`, filtered by last_state and changed-since version, plus
+        whether more follow.
+        """
+        with self._lock:
+            start = bisect.bisect_right(self._ids, after) if after is not None else 0
+            page = []
+            for device_id in self._ids[start:]:
+                entry, row = self._entries[device_id]
+                if states and entry.get('last_state') not in states:
+                    continue
+                if since is not None and (entry.get('version') or 0) <= since:
+                    continue
+                if len(page) == limit:
+                    return page, True
+                page.append((device_id, row))
+            return page, False
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a polling client reuses one connection; headers and body
+    # go out as separate writes, which Nagle would delay by an ACK round
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        try:
+            if parts == ['api', 'devices']:
+                self._conditional(f'"v{self.server.devices.version}"', lambda: self._device_list(query))
+            elif len(parts) == 3 and parts[:2] == ['api', 'devices']:
+                self._device_detail(parts[2])
+            elif parts == ['api', 'events']:
+                self._conditional(f'"v{self.server.devices.version}"', lambda: self._event_list(query))
+            else:
+                self._send_json(404, {'error': f"No such resource: {url.path}"})
+        except BadRequest as e:
+            self._send_json(400, {'error': str(e)})
+
+    def _conditional(self, etag, build):
+        """Answers 304 when the client's copy is current, else 200 with build()'s body."""
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._send_json(200, build(), etag)
+
+    def _device_list(self, query):
+        # Read the version first: the page can only be newer than the ETag sent with it
+        version = self.server.devices.version
+        limit = _int_param(query, 'limit', API_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+        since = _int_param(query, 'since')
+        states = {state for value in query.get('state', []) for state in value.split(',') if state}
+        cursor = query.get('cursor')
+
+        page, more = self.server.devices.page(limit, after=_decode_cursor(cursor[-1]) if cursor else None,
+                                              states=states, since=since)
+        next_cursor = json.dumps(_encode_cursor(page[-1][0]) if more else None)
+        return b''.join((f'{{"version":{version},"devices":['.encode('utf-8'),
+                         b','.join(row for _, row in page),
+                         f'],"next_cursor":{next_cursor}}}'.encode('utf-8')))
+
+    def _device_detail(self, device_id):
+        entry = self.server.devices.get(device_id)
+        if entry is None:
+            self._send_json(404, {'error': f"Unknown device {device_id}"})
+            return
+        self._conditional(f'"d{entry.get("version") or 0}"',
+                          lambda: {'id': device_id, 'device': entry})
+
+    def _event_list(self, query):
+        version = self.server.devices.version
+        limit = _int_param(query, 'limit', API_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+        since = _int_param(query, 'since')
+        before = _int_param(query, 'cursor')
+        # One extra tells whether another page follows
+        events = self.server.events.page(limit + 1, before=before, since=since)
+        next_cursor = str(events[limit - 1]['version']) if len(events) > limit else None
+        return {'version': version, 'events': events[:limit], 'next_cursor': next_cursor}
+
+    def _send_json(self, status, payload, etag=None):
+        """Sends `payload` (a dict, or JSON already encoded as bytes)."""
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("api: " + format, *args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    """The API's HTTP server; records recent events from the moment it starts."""
+
+    daemon_threads = True
+
+    def __init__(self, address, event_history=API_EVENT_HISTORY):
+        self.devices = DeviceView()
+        self.events = RecentEvents(event_history)
+        super().__init__(address, _ApiHandler)
+        # Listen before seeding so no change falls between the two
+        add_change_listener(self._record)
+        self.devices.seed(summary_cache.get())
+
+    def _record(self, device_id, event, entry):
+        self.devices.record(device_id, event, entry)
+        self.events.record(device_id, event, entry)
+
+    def server_close(self):
+        remove_change_listener(self._record)
+        super().server_close()
+
+
+def start_api_server(port, host='127.0.0.1'):
+    """
+    Serves the query API on a daemon thread, bound to localhost only.
+
+    Returns:
+        ApiServer: Call shutdown() and server_close() to stop it, or None if
+                   the port could not be bound.
+    """
+    try:
+        server = ApiServer((host, port))
+    except OSError as e:
+        logging.error("Cannot start query API on %s:%s: %s", host, port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="api-http", daemon=True).start()
+    logging.info("Query API available at http://%s:%s/api/devices", host, server.server_address[1])
+    return server
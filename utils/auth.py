@@ -0,0 +1,128 @@
+import os, hmac, hashlib, logging, threading
+
+from .config import EXPECTED_KEY, KEY_REGISTRY_FILE, AUTH_MAX_BYTES
+
+HASH_PREFIX = 'sha256:'
+REVOKED_PREFIX = '!'
+
+
+class AuthFileTooLarge(ValueError):
+    """The auth file on the stick is bigger than AuthMaxBytes; it is never read in full."""
+
+
+def read_auth_token(path, limit=AUTH_MAX_BYTES):
+    """
+    Reads the key from a stick's auth file, never more than `limit` bytes, so
+    a huge or endless file cannot stall the handler.
+
+    Raises:
+        AuthFileTooLarge: The file holds more than `limit` bytes.
+        UnicodeDecodeError: The content is not UTF-8.
+        OSError: The file cannot be read.
+    """
+    with open(path, 'rb') as f:
+        data = f.read(limit + 1)
+    if len(data) > limit:
+        raise AuthFileTooLarge(f"more than {limit} bytes")
+    return data.decode('utf-8').strip()
+
+
+def key_digest(key):
+    return hashlib.sha256(key.encode('utf-8')).digest()
+
+
+def _parse_key_line(line):
+    """Returns the digest for one registry line: a raw key or 'sha256:<hex>'."""
+    if line.lower().startswith(HASH_PREFIX):
+        return bytes.fromhex(line[len(HASH_PREFIX):].strip())
+    return key_digest(line)
+
+
+class KeyRegistry:
+    """
+    Set of allowed keys, held only as SHA-256 digests so a check is one hash
+    plus an O(1) set lookup however many keys are issued. Registry file
+    format, one entry per line:
+
+        # comment
+        <raw key>                  allowed
+        sha256:<hex digest>        allowed, without storing the key itself
+        !<raw key or sha256:...>   revoked (wins over any allow line)
+
+    The file is re-read when its size or mtime changes. The single
+    ExpectedAuthKey from config.ini keeps working alongside the registry and
+    is compared in constant time.
+    """
+
+    def __init__(self, path=KEY_REGISTRY_FILE, expected_key=EXPECTED_KEY):
+        self.path = path
+        self.expected_key = expected_key
+        self._lock = threading.Lock()
+        self._allowed = frozenset()
+        self._revoked = frozenset()
+        self._signature = None
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            allowed, revoked = set(), set()
+            if signature is not None:
+                with open(self.path, encoding='utf-8') as f:
+                    for number, raw in enumerate(f, 1):
+                        line = raw.strip()
+                        if not line or line.startswith('#'):
+                            continue
+                        target = revoked if line.startswith(REVOKED_PREFIX) else allowed
+                        try:
+                            target.add(_parse_key_line(line.lstrip(REVOKED_PREFIX).strip()))
+                        except ValueError:
+                            logging.warning("Ignoring malformed key registry line %s in %s", number, self.path)
+                logging.info("Loaded key registry: %s allowed, %s revoked key(s).", len(allowed), len(revoked))
+            self._allowed, self._revoked = frozenset(allowed), frozenset(revoked)
+            self._signature = signature
+
+    def check(self, token):
+        """
+        Returns:
+            tuple: (is_authorized, reason) with reason "OK", "Key Revoked" or
+                   "Content Mismatch", matching the summary's auth_reason values.
+        """
+        self._refresh()
+        digest = key_digest(token)
+        if digest in self._revoked:
+            return False, "Key Revoked"
+        if digest in self._allowed:
+            return True, "OK"
+        if self.expected_key and hmac.compare_digest(digest, key_digest(self.expected_key)):
+            return True, "OK"
+        return False, "Content Mismatch"
+
+    def __len__(self):
+        self._refresh()
+        return len(self._allowed)
+
+
+def _append(path, line):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line + '\n')
+
+def add_key(key, path=KEY_REGISTRY_FILE):
+    """Allows `key`, recording only its digest in the registry file."""
+    _append(path, HASH_PREFIX + key_digest(key).hex())
+
+def revoke_key(key, path=KEY_REGISTRY_FILE):
+    """Revokes `key` (raw key or 'sha256:<hex>') in the registry file."""
+    digest = _parse_key_line(key)
+    _append(path, REVOKED_PREFIX + HASH_PREFIX + digest.hex())
+
+
+# ─── Module-level registry used by the monitor ─────────────────────────────
+key_registry = KeyRegistry()
@@ -0,0 +1,78 @@
+import time, asyncio, datetime, threading
+
+
+class SystemClock:
+    """Wall-clock time and real sleeps; what the monitor uses outside tests and benchmarks."""
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    async def asleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+
+class FakeClock(SystemClock):
+    """
+    Virtual clock for tests and benchmarks: sleep() returns immediately and
+    advances the clock instead, so fixed mount delays and retry waits cost
+    nothing while the timestamps they produce still move forward.
+
+    Args:
+        start (datetime.datetime): Initial wall-clock time (default: now).
+    """
+
+    def __init__(self, start=None):
+        self._lock = threading.Lock()
+        self._start = start or datetime.datetime.now()
+        self._elapsed = 0.0
+        self.slept = 0.0 # total virtual seconds slept
+
+    def now(self):
+        with self._lock:
+            return self._start + datetime.timedelta(seconds=self._elapsed)
+
+    def monotonic(self):
+        with self._lock:
+            return self._elapsed
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    async def asleep(self, seconds):
+        self.advance(seconds)
+        await asyncio.sleep(0) # still yield to the loop, as a real timer would
+
+    def advance(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self._elapsed += seconds
+                self.slept += seconds
+
+
+# ─── Module-level clock used by the handlers ───────────────────────────────
+_clock = SystemClock()
+
+def get_clock():
+    return _clock
+
+def set_clock(clock):
+    """Replaces the clock behind now_iso/sleep (e.g. with a FakeClock)."""
+    global _clock
+    _clock = clock
+
+def now_iso():
+    """Current time from the configured clock as an ISO 8601 string."""
+    return _clock.now().isoformat()
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+async def asleep(seconds):
+    """Loop-timer wait on the configured clock, for the asyncio monitor."""
+    await _clock.asleep(seconds)
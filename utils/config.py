@@ -12,11 +12,61 @@ CONFIG_PATH = os.path.join(SCRIPT_DIR, 'config.ini')
 DEFAULTS = {
     'RequiredFile':         'auth_key.txt',
     'LogFile':              'usb_monitor.log',
+    'LogMode':              'direct',
+    'LogArchive':           'true',
+    'LogArchiveKeep':       '50',
+    'LogIndexEvery':        '1000',
     'WmiPollInterval':      '2',
     'MountStabilityDelay':  '3',
+    'MountProbeMode':       'adaptive',
+    'MountReadyTimeout':    '15',
+    'MountProbeInitial':    '0.1',
+    'MountProbeMaxInterval':'1.0',
     'ExpectedAuthKey':      None,
+    'KeyRegistry':          'authorized_keys.txt',
+    'AuthMaxBytes':         '256',
     'EnumLevel':            'none',
     'MaxRootFiles':         '100',
+    'MaxDepth':             '16',
+    'MaxEntries':           '500000',
+    'TimeBudget':           '60',
+    'RejectTimeBudget':     '5',
+    'ScanWorkers':          '4',
+    'OutputDir':            'enumerations',
+    'HashEnabled':          'false',
+    'HashMaxFileSizeMB':    '256',
+    'HashWorkers':          '4',
+    'HashTimeBudget':       '60',
+    'HashCacheDir':         'hashes',
+    'WorkerPoolSize':       '4',
+    'QueueCapacity':        '1024',
+    'WriteCoalesceWindow':  '1.0',
+    'WriteMaxDelay':        '5.0',
+    'Journal':              'false',
+    'Backend':              'json',
+    'EventSource':          'auto',
+    'JournalCompactEvery':  '500',
+    'JournalCompactInterval':'300',
+    'JournalKeepSegments':  '20',
+    'DebounceEnabled':      'true',
+    'DebounceWindow':       '2.0',
+    'FlapCycles':           '3',
+    'FlapWindow':           '30',
+    'FlapBackoffInitial':   '30',
+    'FlapBackoffMax':       '600',
+    'AdmissionEnabled':     'false',
+    'AdmissionTTL':         '300',
+    'AdmissionMaxEntries':  '1024',
+    'MetricsEnabled':       'false',
+    'MetricsPort':          '9464',
+    'ApiEnabled':           'false',
+    'ApiPort':              '9465',
+    'ApiPageSize':          '100',
+    'ApiEventHistory':      '1000',
+    'ServiceAddress':       '',
+    'ServiceKeyFile':       'service.key',
+    'ServiceClientBacklog': '1000',
+    'ServiceEntry':         'threads',
 }
 
 cfg = configparser.ConfigParser()
@@ -29,6 +79,34 @@ if not files_read:
 REQUIRED_FILE = cfg.get('Paths', 'RequiredFile',         fallback=DEFAULTS['RequiredFile'])
 LOG_FILE      = cfg.get('Paths', 'LogFile',              fallback=DEFAULTS['LogFile'])
 
+# 'direct' writes log records on the calling thread; 'queue' hands them to a listener thread
+LOG_MODE = cfg.get('Logging', 'Mode', fallback=DEFAULTS['LogMode']).lower()
+if LOG_MODE not in ('direct', 'queue'):
+    logging.warning("Invalid Logging Mode '%s'; defaulting to '%s'", LOG_MODE, DEFAULTS['LogMode'])
+    LOG_MODE = DEFAULTS['LogMode']
+
+# Rotated logs are kept as gzip segments with a search index instead of being dropped
+try:
+    LOG_ARCHIVE = cfg.getboolean('Logging', 'Archive', fallback=DEFAULTS['LogArchive'] == 'true')
+except ValueError:
+    logging.warning("Invalid Logging Archive in config.ini; defaulting to %s", DEFAULTS['LogArchive'])
+    LOG_ARCHIVE = DEFAULTS['LogArchive'] == 'true'
+
+try:
+    LOG_ARCHIVE_KEEP = cfg.getint('Logging', 'ArchiveKeep', fallback=int(DEFAULTS['LogArchiveKeep']))
+except ValueError:
+    logging.warning("Invalid Logging ArchiveKeep in config.ini; defaulting to %s", DEFAULTS['LogArchiveKeep'])
+    LOG_ARCHIVE_KEEP = int(DEFAULTS['LogArchiveKeep'])
+
+try:
+    LOG_INDEX_EVERY = cfg.getint('Logging', 'IndexEvery', fallback=int(DEFAULTS['LogIndexEvery']))
+except ValueError:
+    logging.warning("Invalid Logging IndexEvery in config.ini; defaulting to %s", DEFAULTS['LogIndexEvery'])
+    LOG_INDEX_EVERY = int(DEFAULTS['LogIndexEvery'])
+if LOG_INDEX_EVERY < 1:
+    logging.warning("Logging IndexEvery must be at least 1; defaulting to %s", DEFAULTS['LogIndexEvery'])
+    LOG_INDEX_EVERY = int(DEFAULTS['LogIndexEvery'])
+
 # Timings
 try:
     WMI_POLL   = cfg.getint('Timings', 'WmiPollInterval',    fallback=int(DEFAULTS['WmiPollInterval']))
@@ -42,15 +120,46 @@ except ValueError:
     logging.warning("Invalid MountStabilityDelay in config.ini; defaulting to %s", DEFAULTS['MountStabilityDelay'])
     MOUNT_DELAY = int(DEFAULTS['MountStabilityDelay'])
 
-# Authorization key
+# 'fixed' sleeps MountStabilityDelay; 'adaptive' probes the volume until it is readable
+MOUNT_PROBE_MODE = cfg.get('Timings', 'MountProbeMode', fallback=DEFAULTS['MountProbeMode']).lower()
+if MOUNT_PROBE_MODE not in ('fixed', 'adaptive'):
+    logging.warning("Invalid MountProbeMode '%s'; defaulting to '%s'", MOUNT_PROBE_MODE, DEFAULTS['MountProbeMode'])
+    MOUNT_PROBE_MODE = DEFAULTS['MountProbeMode']
+
+try:
+    MOUNT_READY_TIMEOUT = cfg.getfloat('Timings', 'MountReadyTimeout', fallback=float(DEFAULTS['MountReadyTimeout']))
+except ValueError:
+    logging.warning("Invalid MountReadyTimeout in config.ini; defaulting to %s", DEFAULTS['MountReadyTimeout'])
+    MOUNT_READY_TIMEOUT = float(DEFAULTS['MountReadyTimeout'])
+
+try:
+    MOUNT_PROBE_INITIAL = cfg.getfloat('Timings', 'MountProbeInitial', fallback=float(DEFAULTS['MountProbeInitial']))
+except ValueError:
+    logging.warning("Invalid MountProbeInitial in config.ini; defaulting to %s", DEFAULTS['MountProbeInitial'])
+    MOUNT_PROBE_INITIAL = float(DEFAULTS['MountProbeInitial'])
+
+try:
+    MOUNT_PROBE_MAX_INTERVAL = cfg.getfloat('Timings', 'MountProbeMaxInterval', fallback=float(DEFAULTS['MountProbeMaxInterval']))
+except ValueError:
+    logging.warning("Invalid MountProbeMaxInterval in config.ini; defaulting to %s", DEFAULTS['MountProbeMaxInterval'])
+    MOUNT_PROBE_MAX_INTERVAL = float(DEFAULTS['MountProbeMaxInterval'])
+
+# Authorization keys: a single ExpectedAuthKey and/or a registry file of many keys
+KEY_REGISTRY_FILE = os.path.join(SCRIPT_DIR, cfg.get('Settings', 'KeyRegistry', fallback=DEFAULTS['KeyRegistry']))
 EXPECTED_KEY = cfg.get('Settings', 'ExpectedAuthKey', fallback=DEFAULTS['ExpectedAuthKey'])
-if EXPECTED_KEY is None:
-    logging.critical("ExpectedAuthKey missing in config.ini under [Settings]")
-    sys.exit("Configuration error: ExpectedAuthKey is required")
+if EXPECTED_KEY is None and not os.path.exists(KEY_REGISTRY_FILE):
+    logging.critical("ExpectedAuthKey missing in config.ini under [Settings] and no key registry found")
+    sys.exit("Configuration error: ExpectedAuthKey or a key registry file is required")
+
+try:
+    AUTH_MAX_BYTES = cfg.getint('Settings', 'AuthMaxBytes', fallback=int(DEFAULTS['AuthMaxBytes']))
+except ValueError:
+    logging.warning("Invalid AuthMaxBytes in config.ini; defaulting to %s", DEFAULTS['AuthMaxBytes'])
+    AUTH_MAX_BYTES = int(DEFAULTS['AuthMaxBytes'])
 
 # Enumeration
 ENUM_LEVEL = cfg.get('Enumeration', 'level', fallback=DEFAULTS['EnumLevel']).lower()
-if ENUM_LEVEL not in ('none', 'root'):
+if ENUM_LEVEL not in ('none', 'root', 'recursive'):
     logging.warning("Invalid Enumeration level '%s'; defaulting to 'none'", ENUM_LEVEL)
     ENUM_LEVEL = 'none'
 
@@ -59,3 +168,251 @@ try:
 except ValueError:
     logging.warning("Invalid MaxRootFiles in config.ini; defaulting to %s", DEFAULTS['MaxRootFiles'])
     MAX_ROOT = int(DEFAULTS['MaxRootFiles'])
+
+# Recursive enumeration limits
+try:
+    ENUM_MAX_DEPTH = cfg.getint('Enumeration', 'MaxDepth', fallback=int(DEFAULTS['MaxDepth']))
+except ValueError:
+    logging.warning("Invalid MaxDepth in config.ini; defaulting to %s", DEFAULTS['MaxDepth'])
+    ENUM_MAX_DEPTH = int(DEFAULTS['MaxDepth'])
+
+try:
+    ENUM_MAX_ENTRIES = cfg.getint('Enumeration', 'MaxEntries', fallback=int(DEFAULTS['MaxEntries']))
+except ValueError:
+    logging.warning("Invalid MaxEntries in config.ini; defaulting to %s", DEFAULTS['MaxEntries'])
+    ENUM_MAX_ENTRIES = int(DEFAULTS['MaxEntries'])
+
+try:
+    ENUM_TIME_BUDGET = cfg.getfloat('Enumeration', 'TimeBudget', fallback=float(DEFAULTS['TimeBudget']))
+except ValueError:
+    logging.warning("Invalid TimeBudget in config.ini; defaulting to %s", DEFAULTS['TimeBudget'])
+    ENUM_TIME_BUDGET = float(DEFAULTS['TimeBudget'])
+
+# A device that failed its check stays mounted while it is walked, so its walk gets a shorter budget
+try:
+    ENUM_REJECT_TIME_BUDGET = cfg.getfloat('Enumeration', 'RejectTimeBudget', fallback=float(DEFAULTS['RejectTimeBudget']))
+except ValueError:
+    logging.warning("Invalid RejectTimeBudget in config.ini; defaulting to %s", DEFAULTS['RejectTimeBudget'])
+    ENUM_REJECT_TIME_BUDGET = float(DEFAULTS['RejectTimeBudget'])
+
+try:
+    ENUM_SCAN_WORKERS = max(1, cfg.getint('Enumeration', 'ScanWorkers', fallback=int(DEFAULTS['ScanWorkers'])))
+except ValueError:
+    logging.warning("Invalid ScanWorkers in config.ini; defaulting to %s", DEFAULTS['ScanWorkers'])
+    ENUM_SCAN_WORKERS = int(DEFAULTS['ScanWorkers'])
+
+# Directory (relative to the script) holding one listing file per device
+ENUM_OUTPUT_DIR = os.path.join(SCRIPT_DIR, cfg.get('Enumeration', 'OutputDir', fallback=DEFAULTS['OutputDir']))
+
+# Content hashing of enumerated files
+try:
+    HASH_ENABLED = cfg.getboolean('Hashing', 'Enabled', fallback=DEFAULTS['HashEnabled'] == 'true')
+except ValueError:
+    logging.warning("Invalid Hashing Enabled in config.ini; defaulting to %s", DEFAULTS['HashEnabled'])
+    HASH_ENABLED = DEFAULTS['HashEnabled'] == 'true'
+
+try:
+    HASH_MAX_FILE_SIZE = int(cfg.getfloat('Hashing', 'MaxFileSizeMB', fallback=float(DEFAULTS['HashMaxFileSizeMB'])) * 1024 * 1024)
+except ValueError:
+    logging.warning("Invalid MaxFileSizeMB in config.ini; defaulting to %s", DEFAULTS['HashMaxFileSizeMB'])
+    HASH_MAX_FILE_SIZE = int(DEFAULTS['HashMaxFileSizeMB']) * 1024 * 1024
+
+try:
+    HASH_WORKERS = max(1, cfg.getint('Hashing', 'Workers', fallback=int(DEFAULTS['HashWorkers'])))
+except ValueError:
+    logging.warning("Invalid Hashing Workers in config.ini; defaulting to %s", DEFAULTS['HashWorkers'])
+    HASH_WORKERS = int(DEFAULTS['HashWorkers'])
+
+try:
+    HASH_TIME_BUDGET = cfg.getfloat('Hashing', 'TimeBudget', fallback=float(DEFAULTS['HashTimeBudget']))
+except ValueError:
+    logging.warning("Invalid Hashing TimeBudget in config.ini; defaulting to %s", DEFAULTS['HashTimeBudget'])
+    HASH_TIME_BUDGET = float(DEFAULTS['HashTimeBudget'])
+
+HASH_CACHE_DIR = os.path.join(SCRIPT_DIR, cfg.get('Hashing', 'CacheDir', fallback=DEFAULTS['HashCacheDir']))
+
+# Dispatcher
+try:
+    WORKER_POOL_SIZE = cfg.getint('Dispatcher', 'WorkerPoolSize', fallback=int(DEFAULTS['WorkerPoolSize']))
+except ValueError:
+    logging.warning("Invalid WorkerPoolSize in config.ini; defaulting to %s", DEFAULTS['WorkerPoolSize'])
+    WORKER_POOL_SIZE = int(DEFAULTS['WorkerPoolSize'])
+if WORKER_POOL_SIZE < 0:
+    logging.warning("WorkerPoolSize cannot be negative; defaulting to %s", DEFAULTS['WorkerPoolSize'])
+    WORKER_POOL_SIZE = int(DEFAULTS['WorkerPoolSize'])
+
+try:
+    EVENT_QUEUE_CAPACITY = cfg.getint('Dispatcher', 'QueueCapacity', fallback=int(DEFAULTS['QueueCapacity']))
+except ValueError:
+    logging.warning("Invalid QueueCapacity in config.ini; defaulting to %s", DEFAULTS['QueueCapacity'])
+    EVENT_QUEUE_CAPACITY = int(DEFAULTS['QueueCapacity'])
+if EVENT_QUEUE_CAPACITY < 0:
+    logging.warning("QueueCapacity cannot be negative; defaulting to %s", DEFAULTS['QueueCapacity'])
+    EVENT_QUEUE_CAPACITY = int(DEFAULTS['QueueCapacity'])
+
+# Summary persistence
+try:
+    SUMMARY_WRITE_WINDOW = cfg.getfloat('Summary', 'WriteCoalesceWindow', fallback=float(DEFAULTS['WriteCoalesceWindow']))
+except ValueError:
+    logging.warning("Invalid WriteCoalesceWindow in config.ini; defaulting to %s", DEFAULTS['WriteCoalesceWindow'])
+    SUMMARY_WRITE_WINDOW = float(DEFAULTS['WriteCoalesceWindow'])
+
+try:
+    SUMMARY_WRITE_MAX_DELAY = cfg.getfloat('Summary', 'WriteMaxDelay', fallback=float(DEFAULTS['WriteMaxDelay']))
+except ValueError:
+    logging.warning("Invalid WriteMaxDelay in config.ini; defaulting to %s", DEFAULTS['WriteMaxDelay'])
+    SUMMARY_WRITE_MAX_DELAY = float(DEFAULTS['WriteMaxDelay'])
+
+# Event journal: append-only change records with periodic snapshot compaction
+try:
+    SUMMARY_JOURNAL = cfg.getboolean('Summary', 'Journal', fallback=DEFAULTS['Journal'] == 'true')
+except ValueError:
+    logging.warning("Invalid Journal flag in config.ini; defaulting to %s", DEFAULTS['Journal'])
+    SUMMARY_JOURNAL = DEFAULTS['Journal'] == 'true'
+
+try:
+    JOURNAL_COMPACT_EVERY = cfg.getint('Summary', 'JournalCompactEvery', fallback=int(DEFAULTS['JournalCompactEvery']))
+except ValueError:
+    logging.warning("Invalid JournalCompactEvery in config.ini; defaulting to %s", DEFAULTS['JournalCompactEvery'])
+    JOURNAL_COMPACT_EVERY = int(DEFAULTS['JournalCompactEvery'])
+
+try:
+    JOURNAL_COMPACT_INTERVAL = cfg.getfloat('Summary', 'JournalCompactInterval', fallback=float(DEFAULTS['JournalCompactInterval']))
+except ValueError:
+    logging.warning("Invalid JournalCompactInterval in config.ini; defaulting to %s", DEFAULTS['JournalCompactInterval'])
+    JOURNAL_COMPACT_INTERVAL = float(DEFAULTS['JournalCompactInterval'])
+
+try:
+    JOURNAL_KEEP_SEGMENTS = cfg.getint('Summary', 'JournalKeepSegments', fallback=int(DEFAULTS['JournalKeepSegments']))
+except ValueError:
+    logging.warning("Invalid JournalKeepSegments in config.ini; defaulting to %s", DEFAULTS['JournalKeepSegments'])
+    JOURNAL_KEEP_SEGMENTS = int(DEFAULTS['JournalKeepSegments'])
+
+# Summary storage backend: 'json' file or 'sqlite' database (WAL mode)
+SUMMARY_BACKEND = cfg.get('Summary', 'Backend', fallback=DEFAULTS['Backend']).lower()
+if SUMMARY_BACKEND not in ('json', 'sqlite'):
+    logging.warning("Invalid Summary Backend '%s'; defaulting to '%s'", SUMMARY_BACKEND, DEFAULTS['Backend'])
+    SUMMARY_BACKEND = DEFAULTS['Backend']
+
+# Event source: 'wmi' (Windows), 'uevent' (Linux kernel netlink) or 'auto'
+EVENT_SOURCE = cfg.get('Monitor', 'EventSource', fallback=DEFAULTS['EventSource']).lower()
+if EVENT_SOURCE not in ('auto', 'wmi', 'uevent'):
+    logging.warning("Invalid EventSource '%s'; defaulting to '%s'", EVENT_SOURCE, DEFAULTS['EventSource'])
+    EVENT_SOURCE = DEFAULTS['EventSource']
+
+# Debouncing of repeated events and flap suppression for unstable devices
+try:
+    DEBOUNCE_ENABLED = cfg.getboolean('Debounce', 'Enabled', fallback=DEFAULTS['DebounceEnabled'] == 'true')
+except ValueError:
+    logging.warning("Invalid Debounce Enabled in config.ini; defaulting to %s", DEFAULTS['DebounceEnabled'])
+    DEBOUNCE_ENABLED = DEFAULTS['DebounceEnabled'] == 'true'
+
+try:
+    DEBOUNCE_WINDOW = cfg.getfloat('Debounce', 'Window', fallback=float(DEFAULTS['DebounceWindow']))
+except ValueError:
+    logging.warning("Invalid Debounce Window in config.ini; defaulting to %s", DEFAULTS['DebounceWindow'])
+    DEBOUNCE_WINDOW = float(DEFAULTS['DebounceWindow'])
+
+try:
+    FLAP_CYCLES = cfg.getint('Debounce', 'FlapCycles', fallback=int(DEFAULTS['FlapCycles']))
+except ValueError:
+    logging.warning("Invalid FlapCycles in config.ini; defaulting to %s", DEFAULTS['FlapCycles'])
+    FLAP_CYCLES = int(DEFAULTS['FlapCycles'])
+
+try:
+    FLAP_WINDOW = cfg.getfloat('Debounce', 'FlapWindow', fallback=float(DEFAULTS['FlapWindow']))
+except ValueError:
+    logging.warning("Invalid FlapWindow in config.ini; defaulting to %s", DEFAULTS['FlapWindow'])
+    FLAP_WINDOW = float(DEFAULTS['FlapWindow'])
+
+try:
+    FLAP_BACKOFF_INITIAL = cfg.getfloat('Debounce', 'BackoffInitial', fallback=float(DEFAULTS['FlapBackoffInitial']))
+except ValueError:
+    logging.warning("Invalid BackoffInitial in config.ini; defaulting to %s", DEFAULTS['FlapBackoffInitial'])
+    FLAP_BACKOFF_INITIAL = float(DEFAULTS['FlapBackoffInitial'])
+
+try:
+    FLAP_BACKOFF_MAX = cfg.getfloat('Debounce', 'BackoffMax', fallback=float(DEFAULTS['FlapBackoffMax']))
+except ValueError:
+    logging.warning("Invalid BackoffMax in config.ini; defaulting to %s", DEFAULTS['FlapBackoffMax'])
+    FLAP_BACKOFF_MAX = float(DEFAULTS['FlapBackoffMax'])
+
+# Fast-path re-admission of recently verified devices
+try:
+    ADMISSION_ENABLED = cfg.getboolean('Admission', 'Enabled', fallback=DEFAULTS['AdmissionEnabled'] == 'true')
+except ValueError:
+    logging.warning("Invalid Admission Enabled in config.ini; defaulting to %s", DEFAULTS['AdmissionEnabled'])
+    ADMISSION_ENABLED = DEFAULTS['AdmissionEnabled'] == 'true'
+
+try:
+    ADMISSION_TTL = cfg.getfloat('Admission', 'TTL', fallback=float(DEFAULTS['AdmissionTTL']))
+except ValueError:
+    logging.warning("Invalid Admission TTL in config.ini; defaulting to %s", DEFAULTS['AdmissionTTL'])
+    ADMISSION_TTL = float(DEFAULTS['AdmissionTTL'])
+
+try:
+    ADMISSION_MAX_ENTRIES = cfg.getint('Admission', 'MaxEntries', fallback=int(DEFAULTS['AdmissionMaxEntries']))
+except ValueError:
+    logging.warning("Invalid Admission MaxEntries in config.ini; defaulting to %s", DEFAULTS['AdmissionMaxEntries'])
+    ADMISSION_MAX_ENTRIES = int(DEFAULTS['AdmissionMaxEntries'])
+
+# Metrics endpoint: Prometheus text on http://127.0.0.1:<MetricsPort>/metrics
+try:
+    METRICS_ENABLED = cfg.getboolean('Metrics', 'Enabled', fallback=DEFAULTS['MetricsEnabled'] == 'true')
+except ValueError:
+    logging.warning("Invalid Metrics Enabled in config.ini; defaulting to %s", DEFAULTS['MetricsEnabled'])
+    METRICS_ENABLED = DEFAULTS['MetricsEnabled'] == 'true'
+
+try:
+    METRICS_PORT = cfg.getint('Metrics', 'Port', fallback=int(DEFAULTS['MetricsPort']))
+except ValueError:
+    logging.warning("Invalid Metrics Port in config.ini; defaulting to %s", DEFAULTS['MetricsPort'])
+    METRICS_PORT = int(DEFAULTS['MetricsPort'])
+
+# Read-only query API: JSON on http://127.0.0.1:<ApiPort>/api/...
+try:
+    API_ENABLED = cfg.getboolean('API', 'Enabled', fallback=DEFAULTS['ApiEnabled'] == 'true')
+except ValueError:
+    logging.warning("Invalid API Enabled in config.ini; defaulting to %s", DEFAULTS['ApiEnabled'])
+    API_ENABLED = DEFAULTS['ApiEnabled'] == 'true'
+
+try:
+    API_PORT = cfg.getint('API', 'Port', fallback=int(DEFAULTS['ApiPort']))
+except ValueError:
+    logging.warning("Invalid API Port in config.ini; defaulting to %s", DEFAULTS['ApiPort'])
+    API_PORT = int(DEFAULTS['ApiPort'])
+
+try:
+    API_PAGE_SIZE = cfg.getint('API', 'PageSize', fallback=int(DEFAULTS['ApiPageSize']))
+except ValueError:
+    logging.warning("Invalid API PageSize in config.ini; defaulting to %s", DEFAULTS['ApiPageSize'])
+    API_PAGE_SIZE = int(DEFAULTS['ApiPageSize'])
+if API_PAGE_SIZE < 1:
+    logging.warning("API PageSize must be at least 1; defaulting to %s", DEFAULTS['ApiPageSize'])
+    API_PAGE_SIZE = int(DEFAULTS['ApiPageSize'])
+
+try:
+    API_EVENT_HISTORY = cfg.getint('API', 'EventHistory', fallback=int(DEFAULTS['ApiEventHistory']))
+except ValueError:
+    logging.warning("Invalid API EventHistory in config.ini; defaulting to %s", DEFAULTS['ApiEventHistory'])
+    API_EVENT_HISTORY = int(DEFAULTS['ApiEventHistory'])
+
+# Monitor service (usb_monitor_service.py): local socket that dashboards subscribe to.
+# An empty Address means a named pipe on Windows, a Unix socket beside the script elsewhere.
+SERVICE_ADDRESS = cfg.get('Service', 'Address', fallback=DEFAULTS['ServiceAddress']) or (
+    r'\\.\pipe\usb_logger' if os.name == 'nt' else os.path.join(SCRIPT_DIR, 'usb_logger.sock'))
+SERVICE_KEY_FILE = os.path.join(SCRIPT_DIR, cfg.get('Service', 'KeyFile', fallback=DEFAULTS['ServiceKeyFile']))
+
+try:
+    SERVICE_CLIENT_BACKLOG = cfg.getint('Service', 'ClientBacklog', fallback=int(DEFAULTS['ServiceClientBacklog']))
+except ValueError:
+    logging.warning("Invalid ClientBacklog in config.ini; defaulting to %s", DEFAULTS['ServiceClientBacklog'])
+    SERVICE_CLIENT_BACKLOG = int(DEFAULTS['ServiceClientBacklog'])
+if SERVICE_CLIENT_BACKLOG < 1:
+    logging.warning("ClientBacklog must be at least 1; defaulting to %s", DEFAULTS['ServiceClientBacklog'])
+    SERVICE_CLIENT_BACKLOG = int(DEFAULTS['ServiceClientBacklog'])
+
+SERVICE_ENTRY = cfg.get('Service', 'Entry', fallback=DEFAULTS['ServiceEntry']).lower()
+if SERVICE_ENTRY not in ('threads', 'asyncio'):
+    logging.warning("Invalid Service Entry '%s'; defaulting to '%s'", SERVICE_ENTRY, DEFAULTS['ServiceEntry'])
+    SERVICE_ENTRY = DEFAULTS['ServiceEntry']
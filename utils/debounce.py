@@ -0,0 +1,161 @@
+import logging, threading
+from collections import deque
+
+from .config import (DEBOUNCE_WINDOW, FLAP_CYCLES, FLAP_WINDOW, FLAP_BACKOFF_INITIAL, FLAP_BACKOFF_MAX)
+from .metrics import debounce_total
+from . import clock
+
+
+class _DeviceState:
+    __slots__ = ('last_kind', 'dispatched', 'held', 'changed', 'window_until', 'cycles',
+                 'cooling_until', 'level')
+
+    def __init__(self):
+        self.last_kind = None     # kind of the last event seen
+        self.dispatched = None    # kind of the last event passed to the dispatcher
+        self.held = None          # latest event held back, if any
+        self.changed = False      # a held event differed from `dispatched`
+        self.window_until = 0.0   # end of the coalescing window
+        self.cycles = deque()     # times of arrival -> removal cycles
+        self.cooling_until = 0.0  # end of the cooling-off period
+        self.level = 0            # consecutive flapping episodes
+
+
+class EventDebouncer:
+    """
+    Sits between the event source and the dispatcher and filters events per
+    Volume GUID (the last element of every event tuple):
+
+    - The first event for a device is dispatched at once. Further events
+      within `window` seconds are held; when the window ends only the latest
+      one is released, and only if it changes the device's state (a duplicate
+      arrival or removal is dropped).
+    - `flap_cycles` arrival/removal cycles within `flap_window` seconds mark
+      the device as flapping. A ('flapping', cycles, backoff, device_id)
+      event is dispatched so the summary can record it, and the device's
+      events are held for `backoff` seconds, doubling (up to `backoff_max`)
+      for each further episode. A device that stays quiet for `backoff_max`
+      seconds after cooling off starts over at `backoff_initial`.
+
+    A device still present when its hold ends gets its arrival dispatched
+    then, so it is always checked. Times come from the configured clock.
+    """
+
+    def __init__(self, window=DEBOUNCE_WINDOW, flap_cycles=FLAP_CYCLES, flap_window=FLAP_WINDOW,
+                 backoff_initial=FLAP_BACKOFF_INITIAL, backoff_max=FLAP_BACKOFF_MAX):
+        self.window = window
+        self.flap_cycles = max(1, flap_cycles)
+        self.flap_window = flap_window
+        self.backoff_initial = backoff_initial
+        self.backoff_max = max(backoff_initial, backoff_max)
+        self._lock = threading.Lock()
+        self._devices = {}
+        self.received = 0
+        self.dispatched = 0
+        self.absorbed = 0
+        self.flaps = 0
+
+    def _hold(self, st, event):
+        if st.held is not None:
+            self.absorbed += 1
+            debounce_total.labels('coalesced').inc()
+        st.held = event
+        st.changed = st.changed or event[0] != st.dispatched
+
+    def _dispatch(self, st, event, now):
+        st.dispatched = event[0]
+        st.window_until = now + self.window
+        self.dispatched += 1
+        return event
+
+    def offer(self, event):
+        """
+        Takes one event from the source.
+
+        Returns:
+            list: Events to dispatch now (possibly none).
+        """
+        kind, device_id = event[0], event[-1]
+        now = clock.get_clock().monotonic()
+        with self._lock:
+            self.received += 1
+            st = self._devices.get(device_id)
+            if st is None:
+                st = self._devices[device_id] = _DeviceState()
+            if kind == 'removal' and st.last_kind == 'arrival':
+                st.cycles.append(now)
+            st.last_kind = kind
+            while st.cycles and now - st.cycles[0] > self.flap_window:
+                st.cycles.popleft()
+
+            if now < st.cooling_until:
+                self._hold(st, event)
+                debounce_total.labels('suppressed').inc()
+                return []
+            if len(st.cycles) >= self.flap_cycles:
+                return [self._start_cooling(st, event, device_id, now)]
+            if now < st.window_until:
+                self._hold(st, event)
+                return []
+            if st.held is not None: # superseded by this event
+                st.held, st.changed = None, False
+                self.absorbed += 1
+                debounce_total.labels('coalesced').inc()
+            return [self._dispatch(st, event, now)]
+
+    def _start_cooling(self, st, event, device_id, now):
+        # A device that stayed quiet long enough after its last episode starts over
+        st.level = 1 if now - st.cooling_until > self.backoff_max else st.level + 1
+        backoff = min(self.backoff_initial * 2 ** (st.level - 1), self.backoff_max)
+        cycles = len(st.cycles)
+        st.cycles.clear()
+        st.cooling_until = now + backoff
+        self._hold(st, event)
+        self.flaps += 1
+        debounce_total.labels('flapping').inc()
+        logging.warning("Device %s is flapping (%s cycles in %gs); holding its events for %gs.",
+                        device_id, cycles, self.flap_window, backoff)
+        return ('flapping', cycles, backoff, device_id)
+
+    def release_due(self):
+        """
+        Returns:
+            list: Held events whose window or cooling-off period has ended and
+                  that change their device's state, in device order.
+        """
+        now = clock.get_clock().monotonic()
+        ready = []
+        with self._lock:
+            for device_id, st in list(self._devices.items()):
+                if st.held is not None and now >= max(st.window_until, st.cooling_until):
+                    event, changed = st.held, st.changed
+                    st.held, st.changed = None, False
+                    if changed and not (event[0] == 'removal' and st.dispatched == 'removal'):
+                        ready.append(self._dispatch(st, event, now))
+                        debounce_total.labels('released').inc()
+                    else:
+                        self.absorbed += 1
+                        debounce_total.labels('coalesced').inc()
+                elif (st.held is None and not st.cycles and now >= st.window_until
+                      and now - st.cooling_until > self.backoff_max):
+                    del self._devices[device_id] # quiet device: nothing left to remember
+        return ready
+
+    def next_due(self):
+        """Seconds until the earliest held event can be released, or None if nothing is held."""
+        with self._lock:
+            due = [max(st.window_until, st.cooling_until) for st in self._devices.values()
+                   if st.held is not None]
+        if not due:
+            return None
+        return max(0.0, min(due) - clock.get_clock().monotonic())
+
+    def stats(self):
+        with self._lock:
+            return {'received': self.received, 'dispatched': self.dispatched, 'absorbed': self.absorbed,
+                    'flaps': self.flaps, 'tracked': len(self._devices),
+                    'held': sum(1 for st in self._devices.values() if st.held is not None)}
+
+
+# ─── Module-level debouncer used by the monitor ────────────────────────────
+debouncer = EventDebouncer()
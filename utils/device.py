@@ -1,152 +1,376 @@
-import wmi, time, logging
+import os, time, logging, threading
+from .readiness import find_mount
 
+try:
+    import wmi
+except ImportError: # non-Windows hosts: only injected providers (e.g. FakeDeviceInfoProvider) can answer
+    wmi = None
 
-# get the path 
-def get_physical_drive_path(drive_letter, volume_guid):
-    r"""
-    Maps a Volume GUID (e.g., r'\\?\Volume{...}') and its Drive Letter
-    to its physical drive path (e.g., r'\\.\PhysicalDriveX') using WMI.
+# Volume details can lag the arrival event by a moment; queries are retried
+VOLUME_QUERY_ATTEMPTS = 3
+VOLUME_QUERY_RETRY_DELAY = 0.7
 
-    Requires Administrator privileges.
 
-    Args:
-        drive_letter (str): The drive letter assigned (e.g., "E:"). # Added explanation
-        volume_guid (str): The DeviceID of the Win32_Volume (e.g., r'\\?\Volume{...}').
-                           (Used mainly for logging context now). # Added explanation
+class DeviceInfoProvider:
+    """
+    Source of volume/physical-drive information for a mounted USB volume.
+    Implementations must be safe to call from several dispatcher workers.
+    """
+
+    def get_volume_details(self, drive_letter, volume_guid, retry=True):
+        """
+        retry=False asks for a single attempt: the caller schedules any retries
+        itself (the asyncio monitor waits on loop timers instead of sleeping).
+        """
+        raise NotImplementedError
 
-    Returns:
-        str: The physical drive path (e.g., r'\\.\PhysicalDriveX') or None if not found/error.
+    def get_physical_drive_path(self, drive_letter, volume_guid):
+        raise NotImplementedError
+
+    def invalidate(self, drive_letter=None, volume_guid=None):
+        """Drops any cached information for the given drive letter and/or volume."""
+
+
+class WmiDeviceInfoProvider(DeviceInfoProvider):
+    """
+    Queries WMI, reusing one connection per thread instead of constructing a
+    new wmi.WMI() for every call. A connection that raised a WMI error is
+    dropped so the next call on that thread reconnects.
     """
-    # Use volume_guid only for logging now
-    logging.debug(f"Attempting to find physical drive path for Drive: {drive_letter}, Volume GUID: {volume_guid}")
-    try:
-        c = wmi.WMI() # Create a WMI instance
 
-        # Find the Win32_LogicalDisk using the Drive Letter ---
-        # Validate the provided drive_letter
-        if not drive_letter or not drive_letter.endswith(':'):
-             logging.error(f"Invalid drive letter provided to get_physical_drive_path: '{drive_letter}'")
-             return None
-
-        esc_drive_letter = drive_letter.replace("'", "\\'") # Escape single quotes if present
-        query_ld = f"SELECT * FROM Win32_LogicalDisk WHERE DeviceID = '{esc_drive_letter}'"
-        logging.debug(f"WMI Query (LogicalDisk): {query_ld}")
-        logical_disk_results = c.query(query_ld)
-        if not logical_disk_results:
-             logging.error(f"WMI Query failed: Could not find Win32_LogicalDisk for DriveLetter: {drive_letter}")
-             return None
-        logical_disk = logical_disk_results[0]
-
-        # --- Step 3: Find the associated Win32_DiskPartition(s) ---
-        logging.debug(f"Finding partitions associated with LogicalDisk: {drive_letter}")
-        partitions = logical_disk.associators(wmi_result_class='Win32_DiskPartition')
-        if not partitions:
-            logging.error(f"WMI Query failed: Could not find associated Win32_DiskPartition for {drive_letter}")
+    def __init__(self):
+        if wmi is None:
+            raise RuntimeError("The wmi package is not available on this platform")
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = wmi.WMI()
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        self._local.conn = None
+
+    # get the path 
+    def get_physical_drive_path(self, drive_letter, volume_guid):
+        r"""
+        Maps a Volume GUID (e.g., r'\\?\Volume{...}') and its Drive Letter
+        to its physical drive path (e.g., r'\\.\PhysicalDriveX') using WMI.
+
+        Requires Administrator privileges.
+
+        Args:
+            drive_letter (str): The drive letter assigned (e.g., "E:"). # Added explanation
+            volume_guid (str): The DeviceID of the Win32_Volume (e.g., r'\\?\Volume{...}').
+                               (Used mainly for logging context now). # Added explanation
+
+        Returns:
+            str: The physical drive path (e.g., r'\\.\PhysicalDriveX') or None if not found/error.
+        """
+        # Use volume_guid only for logging now
+        logging.debug("Attempting to find physical drive path for Drive: %s, Volume GUID: %s", drive_letter, volume_guid)
+        try:
+            c = self._connection() # Reuse this thread's WMI connection
+
+            # Find the Win32_LogicalDisk using the Drive Letter ---
+            # Validate the provided drive_letter
+            if not drive_letter or not drive_letter.endswith(':'):
+                 logging.error("Invalid drive letter provided to get_physical_drive_path: '%s'", drive_letter)
+                 return None
+
+            esc_drive_letter = drive_letter.replace("'", "\\'") # Escape single quotes if present
+            query_ld = f"SELECT * FROM Win32_LogicalDisk WHERE DeviceID = '{esc_drive_letter}'"
+            logging.debug("WMI Query (LogicalDisk): %s", query_ld)
+            logical_disk_results = c.query(query_ld)
+            if not logical_disk_results:
+                 logging.error("WMI Query failed: Could not find Win32_LogicalDisk for DriveLetter: %s", drive_letter)
+                 return None
+            logical_disk = logical_disk_results[0]
+
+            # --- Step 3: Find the associated Win32_DiskPartition(s) ---
+            logging.debug("Finding partitions associated with LogicalDisk: %s", drive_letter)
+            partitions = logical_disk.associators(wmi_result_class='Win32_DiskPartition')
+            if not partitions:
+                logging.error("WMI Query failed: Could not find associated Win32_DiskPartition for %s", drive_letter)
+                return None
+            partition = partitions[0] # Assume first partition
+            logging.debug("Found Partition: %s", partition.DeviceID)
+
+            # --- Step 4: Find the associated Win32_DiskDrive ---
+            logging.debug("Finding disk drive associated with Partition: %s", partition.DeviceID)
+            disk_drives = partition.associators(wmi_result_class='Win32_DiskDrive')
+            if not disk_drives:
+                logging.error("WMI Query failed: Could not find associated Win32_DiskDrive for partition %s", partition.DeviceID)
+                return None
+            disk_drive = disk_drives[0] # Assume one drive
+            physical_drive_path = disk_drive.DeviceID
+            logging.debug("Found Physical Drive Path: %s for Volume: %s", physical_drive_path, volume_guid) # Keep volume_guid for log context
+
+            # --- Step 5: Validate and Return Path ---
+            if physical_drive_path and physical_drive_path.lower().startswith(r"\\.\physicaldrive"):
+                 return physical_drive_path
+            else:
+                 logging.error("Obtained unexpected DeviceID format for Disk Drive: %s", physical_drive_path)
+                 return None
+
+        except wmi.x_wmi as e:
+            self._drop_connection()
+            logging.error("WMI Error during physical drive path lookup for %s: %s", drive_letter, e, exc_info=True)
+            # Log COM error details if available
+            if hasattr(e, 'com_error'):
+                 logging.error("COM Error details: %s", e.com_error)
             return None
-        partition = partitions[0] # Assume first partition
-        logging.debug(f"Found Partition: {partition.DeviceID}")
-
-        # --- Step 4: Find the associated Win32_DiskDrive ---
-        logging.debug(f"Finding disk drive associated with Partition: {partition.DeviceID}")
-        disk_drives = partition.associators(wmi_result_class='Win32_DiskDrive')
-        if not disk_drives:
-            logging.error(f"WMI Query failed: Could not find associated Win32_DiskDrive for partition {partition.DeviceID}")
+        except Exception as e:
+            logging.error("Unexpected Python error during physical drive path lookup for %s: %s", drive_letter, e, exc_info=True)
             return None
-        disk_drive = disk_drives[0] # Assume one drive
-        physical_drive_path = disk_drive.DeviceID
-        logging.debug(f"Found Physical Drive Path: {physical_drive_path} for Volume: {volume_guid}") # Keep volume_guid for log context
-
-        # --- Step 5: Validate and Return Path ---
-        if physical_drive_path and physical_drive_path.lower().startswith(r"\\.\physicaldrive"):
-             return physical_drive_path
-        else:
-             logging.error(f"Obtained unexpected DeviceID format for Disk Drive: {physical_drive_path}")
-             return None
-
-    except wmi.x_wmi as e:
-        logging.error(f"WMI Error during physical drive path lookup for {drive_letter}: {e}", exc_info=True)
-        # Log COM error details if available
-        if hasattr(e, 'com_error'):
-             logging.error(f"COM Error details: {e.com_error}")
-        return None
-    except Exception as e:
-        logging.error(f"Unexpected Python error during physical drive path lookup for {drive_letter}: {e}", exc_info=True)
-        return None
 
-def get_volume_details(drive_letter, volume_guid): # Keep volume_guid for logging
+    def get_volume_details(self, drive_letter, volume_guid, retry=True): # Keep volume_guid for logging
+        """
+        Retrieves Volume Name, File System, Size, Free Space and Serial Number using WMI,
+        querying by Drive Letter after mount. Includes retries for timing issues.
+        Requires Administrator privileges.
+
+        Args:
+            drive_letter (str): The drive letter (e.g., "E:").
+            volume_guid (str): The Volume GUID (e.g., r'?\\Volume{...}') for logging context.
+            retry (bool): Retry empty answers and WMI errors; False makes a single attempt.
+
+        Returns:
+            dict: A dictionary containing 'VolumeName', 'FileSystem', 'Size', 'FreeSpace', 'SerialNumber',
+                  or an empty dictionary if details cannot be retrieved. Returns sizes in bytes and the
+                  serial number as strings.
+        """
+        details = {}
+        # ---- Use drive_letter for the primary query ----
+        logging.debug("Attempting to get volume details for Drive: %s (GUID: %s) via WMI.", drive_letter, volume_guid)
+
+        if not drive_letter or not drive_letter.endswith(':'):
+             logging.error("Invalid drive letter '%s' passed to get_volume_details.", drive_letter)
+             return {} # Return empty if drive letter is invalid
+
+        # --- Optional Retry Loop ---
+        max_attempts = VOLUME_QUERY_ATTEMPTS if retry else 1
+        retry_delay = VOLUME_QUERY_RETRY_DELAY
+        for attempt in range(1, max_attempts + 1):
+            try:
+                c = self._connection()
+                # Escape single quotes in drive_letter for WQL query
+                escaped_drive_letter = drive_letter.replace("'", "\\'")
+                # ---- Query by DriveLetter ----
+                query = f"SELECT Name, Label, FileSystem, Capacity, FreeSpace, SerialNumber FROM Win32_Volume WHERE DriveLetter = '{escaped_drive_letter}'"
+                logging.debug("WMI Query (Volume Details, Attempt %s): %s", attempt, query)
+                volume_results = c.query(query)
+
+                if volume_results:
+                    volume = volume_results[0]
+                    # Use Label for VolumeName if available, otherwise fallback to Name (like drive letter)
+                    details['VolumeName'] = getattr(volume, 'Label', None) or getattr(volume, 'Name', None)
+                    details['FileSystem'] = getattr(volume, 'FileSystem', None)
+                    capacity = getattr(volume, 'Capacity', None)
+                    free_space = getattr(volume, 'FreeSpace', None)
+                    details['Size'] = str(capacity) if capacity is not None else None
+                    details['FreeSpace'] = str(free_space) if free_space is not None else None
+                    serial = getattr(volume, 'SerialNumber', None) # changes when the volume is reformatted
+                    details['SerialNumber'] = str(serial) if serial is not None else None
+                    logging.info("Successfully retrieved volume details on attempt %s.", attempt) # INFO on success
+                    return details # <<< Success, return immediately
+
+                else:
+                    # Log warning only on last attempt or if retrying
+                    log_level = logging.WARNING if attempt == max_attempts else logging.DEBUG
+                    logging.log(log_level, f"WMI Query (Attempt {attempt}) found no Win32_Volume details for DriveLetter: {drive_letter}")
+                    if attempt < max_attempts:
+                         logging.debug("Retrying volume details query in %ss...", retry_delay)
+                         time.sleep(retry_delay)
+                    else:
+                         logging.error("Failed to get volume details for %s after %s attempts.", drive_letter, max_attempts)
+                         return {} # <<< Failed after all attempts
+
+            except wmi.x_wmi as e:
+                self._drop_connection()
+                logging.error("WMI Error (Attempt %s) getting volume details for %s: %s", attempt, drive_letter, e, exc_info=False) # Don't need full stack trace usually
+                if hasattr(e, 'com_error'):
+                    logging.error("COM Error details: %s", e.com_error)
+                # Decide whether to retry on WMI errors or just fail
+                if attempt < max_attempts:
+                    logging.warning("Retrying after WMI error in %ss...", retry_delay)
+                    time.sleep(retry_delay)
+                else:
+                    logging.error("Failed to get volume details for %s due to WMI error after %s attempts.", drive_letter, max_attempts)
+                    return {} # Failed after WMI error
+
+            except Exception as e:
+                logging.error("Unexpected Python error (Attempt %s) getting volume details for %s: %s", attempt, drive_letter, e, exc_info=True) # Show stack trace here
+                return {} # Stop retrying on unexpected Python errors
+
+        # This part should ideally not be reached if the loop logic is correct
+        logging.error("Volume details retrieval failed for %s after loop completion (unexpected).", drive_letter)
+        return {}
+
+
+class CachedDeviceInfoProvider(DeviceInfoProvider):
+    """
+    Caches another provider's successful answers per (drive letter, volume
+    GUID). Entries stay valid until invalidate() is called for the drive
+    letter or the volume, which the monitor does when the volume is removed;
+    a repeated arrival for a volume that never went away is served from the
+    cache. Empty/None answers are never cached so a volume that was still
+    mounting is queried again.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self._lock = threading.Lock()
+        self._cache = {} # (kind, drive_letter, volume_guid) -> result
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, kind, fetch, drive_letter, volume_guid, **kwargs):
+        key = (kind, drive_letter, volume_guid)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        result = fetch(drive_letter, volume_guid, **kwargs)
+        if result:
+            with self._lock:
+                self._cache[key] = result
+        return result
+
+    def get_volume_details(self, drive_letter, volume_guid, retry=True):
+        details = self._lookup('volume', self.inner.get_volume_details, drive_letter, volume_guid, retry=retry)
+        return dict(details) # callers store and mutate the dict
+
+    def get_physical_drive_path(self, drive_letter, volume_guid):
+        return self._lookup('physical', self.inner.get_physical_drive_path, drive_letter, volume_guid)
+
+    def invalidate(self, drive_letter=None, volume_guid=None):
+        with self._lock:
+            stale = [key for key in self._cache
+                     if (drive_letter is not None and key[1] == drive_letter)
+                     or (volume_guid is not None and key[2] == volume_guid)]
+            for key in stale:
+                del self._cache[key]
+        self.inner.invalidate(drive_letter, volume_guid)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache),
+                    'hit_rate': self.hits / total if total else 0.0}
+
+
+class FakeDeviceInfoProvider(DeviceInfoProvider):
     """
-    Retrieves Volume Name, File System, Size, and Free Space using WMI,
-    querying by Drive Letter after mount. Includes retries for timing issues.
-    Requires Administrator privileges.
+    In-memory provider for tests and benchmarks on hosts without WMI.
 
     Args:
-        drive_letter (str): The drive letter (e.g., "E:").
-        volume_guid (str): The Volume GUID (e.g., r'?\\Volume{...}') for logging context.
+        volumes (dict): drive letter -> volume details dict.
+        physical_paths (dict): drive letter -> physical drive path.
+        latency (float): Seconds each query blocks, to mimic WMI round trips.
+    """
+
+    def __init__(self, volumes=None, physical_paths=None, latency=0.0):
+        self.volumes = dict(volumes or {})
+        self.physical_paths = dict(physical_paths or {})
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _query(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_volume_details(self, drive_letter, volume_guid, retry=True):
+        self._query()
+        return dict(self.volumes.get(drive_letter, {}))
+
+    def get_physical_drive_path(self, drive_letter, volume_guid):
+        self._query()
+        return self.physical_paths.get(drive_letter)
+
 
-    Returns:
-        dict: A dictionary containing 'VolumeName', 'FileSystem', 'Size', 'FreeSpace',
-              or an empty dictionary if details cannot be retrieved. Returns sizes in bytes as strings.
+class MountInfoDeviceInfoProvider(DeviceInfoProvider):
     """
-    details = {}
-    # ---- Use drive_letter for the primary query ----
-    logging.debug(f"Attempting to get volume details for Drive: {drive_letter} (GUID: {volume_guid}) via WMI.")
-
-    if not drive_letter or not drive_letter.endswith(':'):
-         logging.error(f"Invalid drive letter '{drive_letter}' passed to get_volume_details.")
-         return {} # Return empty if drive letter is invalid
-
-    # --- Optional Retry Loop ---
-    max_attempts = 3
-    retry_delay = 0.7
-    for attempt in range(1, max_attempts + 1):
+    Non-Windows provider for device nodes reported by the uevent source:
+    label/filesystem from the mount table, sizes from statvfs, the
+    filesystem UUID from /dev/disk/by-uuid as the serial number, and the
+    parent disk node from sysfs as the "physical drive".
+    """
+
+    BY_UUID = '/dev/disk/by-uuid'
+
+    def _filesystem_uuid(self, devnode):
+        """UUID of the filesystem on `devnode` (new on every mkfs), or None if udev lists none."""
         try:
-            c = wmi.WMI()
-            # Escape single quotes in drive_letter for WQL query
-            escaped_drive_letter = drive_letter.replace("'", "\\'")
-            # ---- Query by DriveLetter ----
-            query = f"SELECT Name, Label, FileSystem, Capacity, FreeSpace FROM Win32_Volume WHERE DriveLetter = '{escaped_drive_letter}'"
-            logging.debug(f"WMI Query (Volume Details, Attempt {attempt}): {query}")
-            volume_results = c.query(query)
-
-            if volume_results:
-                volume = volume_results[0]
-                # Use Label for VolumeName if available, otherwise fallback to Name (like drive letter)
-                details['VolumeName'] = getattr(volume, 'Label', None) or getattr(volume, 'Name', None)
-                details['FileSystem'] = getattr(volume, 'FileSystem', None)
-                capacity = getattr(volume, 'Capacity', None)
-                free_space = getattr(volume, 'FreeSpace', None)
-                details['Size'] = str(capacity) if capacity is not None else None
-                details['FreeSpace'] = str(free_space) if free_space is not None else None
-                logging.info(f"Successfully retrieved volume details on attempt {attempt}.") # INFO on success
-                return details # <<< Success, return immediately
+            links = os.listdir(self.BY_UUID)
+        except OSError:
+            return None
+        target = os.path.realpath(devnode)
+        for link in links:
+            if os.path.realpath(os.path.join(self.BY_UUID, link)) == target:
+                return link
+        return None
 
-            else:
-                # Log warning only on last attempt or if retrying
-                log_level = logging.WARNING if attempt == max_attempts else logging.DEBUG
-                logging.log(log_level, f"WMI Query (Attempt {attempt}) found no Win32_Volume details for DriveLetter: {drive_letter}")
-                if attempt < max_attempts:
-                     logging.debug(f"Retrying volume details query in {retry_delay}s...")
-                     time.sleep(retry_delay)
-                else:
-                     logging.error(f"Failed to get volume details for {drive_letter} after {max_attempts} attempts.")
-                     return {} # <<< Failed after all attempts
+    def get_volume_details(self, drive_letter, volume_guid, retry=True):
+        mount = find_mount(drive_letter)
+        if not mount:
+            logging.warning("No mount found for %s; cannot read volume details.", drive_letter)
+            return {}
+        mount_point, fs_type = mount
+        try:
+            st = os.statvfs(mount_point)
+        except OSError as e:
+            logging.error("statvfs failed for %s: %s", mount_point, e)
+            return {}
+        return {
+            'VolumeName': os.path.basename(mount_point.rstrip('/')) or mount_point,
+            'FileSystem': fs_type,
+            'Size': str(st.f_blocks * st.f_frsize),
+            'FreeSpace': str(st.f_bavail * st.f_frsize),
+            'SerialNumber': self._filesystem_uuid(drive_letter),
+        }
 
-        except wmi.x_wmi as e:
-            logging.error(f"WMI Error (Attempt {attempt}) getting volume details for {drive_letter}: {e}", exc_info=False) # Don't need full stack trace usually
-            if hasattr(e, 'com_error'):
-                logging.error(f"COM Error details: {e.com_error}")
-            # Decide whether to retry on WMI errors or just fail
-            if attempt < max_attempts:
-                logging.warning(f"Retrying after WMI error in {retry_delay}s...")
-                time.sleep(retry_delay)
-            else:
-                logging.error(f"Failed to get volume details for {drive_letter} due to WMI error after {max_attempts} attempts.")
-                return {} # Failed after WMI error
+    def get_physical_drive_path(self, drive_letter, volume_guid):
+        name = os.path.basename(drive_letter)
+        part_dir = os.path.realpath(os.path.join('/sys/class/block', name))
+        if not os.path.exists(os.path.join(part_dir, 'partition')):
+            return drive_letter # already a whole disk
+        return os.path.join('/dev', os.path.basename(os.path.dirname(part_dir)))
 
-        except Exception as e:
-            logging.error(f"Unexpected Python error (Attempt {attempt}) getting volume details for {drive_letter}: {e}", exc_info=True) # Show stack trace here
-            return {} # Stop retrying on unexpected Python errors
 
-    # This part should ideally not be reached if the loop logic is correct
-    logging.error(f"Volume details retrieval failed for {drive_letter} after loop completion (unexpected).")
-    return {}
\ No newline at end of file
+# ─── Module-level provider used by the monitor ─────────────────────────────
+_provider = CachedDeviceInfoProvider(
+    WmiDeviceInfoProvider() if wmi is not None else MountInfoDeviceInfoProvider())
+
+def get_provider():
+    return _provider
+
+def set_provider(provider):
+    """Replaces the provider behind get_volume_details/get_physical_drive_path (e.g. with a fake)."""
+    global _provider
+    _provider = provider
+
+def get_volume_details(drive_letter, volume_guid, retry=True):
+    """See WmiDeviceInfoProvider.get_volume_details; served by the configured provider."""
+    if _provider is None:
+        logging.error("No device information provider available; cannot read volume details.")
+        return {}
+    return _provider.get_volume_details(drive_letter, volume_guid, retry=retry)
+
+def get_physical_drive_path(drive_letter, volume_guid):
+    """See WmiDeviceInfoProvider.get_physical_drive_path; served by the configured provider."""
+    if _provider is None:
+        logging.error("No device information provider available; cannot resolve physical drive.")
+        return None
+    return _provider.get_physical_drive_path(drive_letter, volume_guid)
+
+def invalidate_device(drive_letter=None, volume_guid=None):
+    """Drops cached information for a drive letter and/or volume, e.g. after a removal."""
+    if _provider is not None:
+        _provider.invalidate(drive_letter, volume_guid)
@@ -0,0 +1,149 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    device_id          TEXT PRIMARY KEY,
+    first_seen         TEXT,
+    last_seen          TEXT,
+    last_state         TEXT,
+    last_drive_letter  TEXT,
+    data               TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_devices_last_seen    ON devices(last_seen, device_id);
+CREATE INDEX IF NOT EXISTS idx_devices_last_state   ON devices(last_state, last_seen);
+CREATE INDEX IF NOT EXISTS idx_devices_drive_letter ON devices(last_drive_letter, last_seen);
+"""
+
+_UPSERT = """
+INSERT INTO devices (device_id, first_seen, last_seen, last_state, last_drive_letter, data)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(device_id) DO UPDATE SET
+    first_seen = excluded.first_seen,
+    last_seen = excluded.last_seen,
+    last_state = excluded.last_state,
+    last_drive_letter = excluded.last_drive_letter,
+    data = excluded.data
+"""
+
+
+def entry_row(device_id, entry, data=None):
+    """Builds the column tuple for one summary entry; `data` is its JSON if already serialised."""
+    if data is None:
+        data = json.dumps(entry, separators=(',', ':'), default=str)
+    return (device_id, entry.get('first_seen'), entry.get('last_seen'),
+            entry.get('last_state'), entry.get('last_drive_letter'), data)
+
+
+class SqliteDeviceStore:
+    """
+    Device summary stored one row per Volume GUID in SQLite (WAL mode), so a
+    single device can be read or updated without touching the others. The
+    full entry is kept as JSON in `data`; the fields we filter and sort on are
+    duplicated into indexed columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # One connection shared across dispatcher workers and the GUI, guarded by _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ─── Writes ────────────────────────────────────────────────────────────
+    def upsert(self, device_id, entry):
+        self.upsert_rows([entry_row(device_id, entry)])
+
+    def upsert_rows(self, rows):
+        """Inserts or replaces rows built by entry_row() in a single transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(_UPSERT, rows)
+
+    # ─── Point lookups ─────────────────────────────────────────────────────
+    def get(self, device_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM devices WHERE device_id = ?", (device_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_drive_letter(self, drive_letter):
+        """Returns (device_id, entry) of the device most recently seen on `drive_letter`, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT device_id, data FROM devices WHERE last_drive_letter = ? "
+                "ORDER BY last_seen DESC LIMIT 1", (drive_letter,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def count(self, state=None):
+        with self._lock:
+            if state is None:
+                return self._conn.execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM devices WHERE last_state = ?", (state,)).fetchone()[0]
+
+    # ─── Range queries ─────────────────────────────────────────────────────
+    def page(self, limit=100, after=None, state=None, since=None, until=None):
+        """
+        Returns up to `limit` devices ordered by last_seen (newest first) as
+        [(device_id, entry), ...], plus the cursor for the next page (None at
+        the end). Keyset pagination: `after` is the cursor from the previous
+        page, so deep pages cost the same as the first.
+        """
+        clauses, params = [], []
+        if state is not None:
+            clauses.append("last_state = ?")
+            params.append(state)
+        if since is not None:
+            clauses.append("last_seen >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("last_seen < ?")
+            params.append(until)
+        if after is not None:
+            after_seen, after_id = after
+            clauses.append("(last_seen < ? OR (last_seen = ? AND device_id < ?))")
+            params.extend((after_seen, after_seen, after_id))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (f"SELECT device_id, last_seen, data FROM devices {where} "
+               f"ORDER BY last_seen DESC, device_id DESC LIMIT ?")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        items = [(device_id, json.loads(data)) for device_id, _, data in rows]
+        cursor = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return items, cursor
+
+    def load_all(self):
+        """Loads every device into a dict shaped like the JSON summary."""
+        with self._lock:
+            rows = self._conn.execute("SELECT device_id, data FROM devices").fetchall()
+        return {device_id: json.loads(data) for device_id, data in rows}
+
+    # ─── Migration ─────────────────────────────────────────────────────────
+    def migrate_from_json(self, json_path):
+        """
+        One-shot import of an existing JSON summary. Only runs into an empty
+        store, so it is safe to call on every start.
+
+        Returns:
+            int: Number of devices imported.
+        """
+        if self.count() or not os.path.exists(json_path):
+            return 0
+        try:
+            with open(json_path) as f:
+                summary = json.load(f)
+        except Exception as e:
+            logging.error("Could not read %s for migration: %s", json_path, e)
+            return 0
+        self.upsert_rows([entry_row(device_id, entry) for device_id, entry in summary.items()])
+        logging.info("Migrated %s device(s) from %s into %s", len(summary), json_path, self.path)
+        return len(summary)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
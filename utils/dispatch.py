@@ -0,0 +1,387 @@
+import time
+import asyncio
+import inspect
+import logging
+import queue
+import threading
+from collections import deque, Counter, OrderedDict
+
+from .metrics import queue_high_water, queue_wait_seconds, queue_overflow_total
+
+
+class KeyedWorkerPool:
+    """
+    Bounded pool of worker threads that runs submitted jobs concurrently
+    across keys while keeping jobs that share a key (e.g. a Volume GUID)
+    strictly in submission order.
+
+    Each key owns a FIFO of pending jobs. A key is handed to at most one
+    worker at a time; that worker drains the key's FIFO before picking up
+    the next ready key, so two events for the same device never overlap.
+
+    With `max_pending`, submit() waits while that many jobs are unfinished,
+    and with `max_pending_per_key` while that many are unfinished for the
+    key, so a slow backlog pushes back on the caller instead of growing
+    here. A per-key bound keeps one slow device from taking every slot; a
+    caller that must not stall (the dispatcher) submits with block=False
+    and keeps what does not fit (see ParkedJobs).
+    """
+
+    def __init__(self, max_workers, name="usb-worker", initializer=None, finalizer=None, max_pending=None,
+                 max_pending_per_key=None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_pending is not None and max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        if max_pending_per_key is not None and max_pending_per_key < 1:
+            raise ValueError("max_pending_per_key must be at least 1")
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._max_pending_per_key = max_pending_per_key
+        # Per-thread setup/teardown, e.g. COM initialisation for WMI calls
+        self._initializer = initializer
+        self._finalizer = finalizer
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._pending = {}          # key -> deque of (fn, args)
+        self._count = 0             # jobs in all the deques
+        self._ready = queue.Queue() # keys with work and no active worker
+        self._shutdown = False
+        self._threads = []
+        for i in range(max_workers):
+            t = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def pending_count(self):
+        """Number of jobs submitted but not yet finished."""
+        with self._lock:
+            return self._count
+
+    def _full(self, key):
+        if self._max_pending is not None and self._count >= self._max_pending:
+            return True
+        dq = self._pending.get(key)
+        return self._max_pending_per_key is not None and dq is not None and len(dq) >= self._max_pending_per_key
+
+    def submit(self, key, fn, *args, block=True, timeout=None):
+        """
+        Queue fn(*args) behind any earlier job submitted with the same key,
+        first waiting for room when max_pending jobs are unfinished, or
+        max_pending_per_key for this key.
+
+        Raises:
+            queue.Full: block is False or `timeout` passed before room was made.
+        """
+        with self._not_full:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._full(key) and not self._shutdown:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    raise queue.Full
+                self._not_full.wait(remaining)
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a pool that has been shut down")
+            self._count += 1
+            dq = self._pending.get(key)
+            if dq is None:
+                # No work in flight for this key: make it schedulable
+                self._pending[key] = deque([(fn, args)])
+                self._ready.put(key)
+            else:
+                # A worker owns (or will own) this key; it will drain it in order
+                dq.append((fn, args))
+
+    def submit_next(self, key, fn, *args):
+        """
+        From inside the job running for `key`, queue fn(*args) to run right
+        after it, ahead of anything else already submitted for the key.
+        Never waits for room: the follow-up belongs to work already admitted.
+        """
+        with self._lock:
+            dq = self._pending.get(key)
+            if dq is None:
+                raise RuntimeError(f"no job is running for {key!r}")
+            self._count += 1
+            dq.insert(1, (fn, args))
+
+    def _worker(self):
+        if self._initializer:
+            self._initializer()
+        try:
+            self._run()
+        finally:
+            if self._finalizer:
+                self._finalizer()
+
+    def _run(self):
+        while True:
+            key = self._ready.get()
+            if key is None:
+                return
+            while True:
+                with self._lock:
+                    fn, args = self._pending[key][0]
+                try:
+                    fn(*args)
+                except Exception as e:
+                    logging.error("Worker error while handling %s: %s", key, e, exc_info=True)
+                with self._lock:
+                    dq = self._pending[key]
+                    dq.popleft()
+                    self._count -= 1
+                    self._not_full.notify_all() # waiters may be held by different keys
+                    if not dq:
+                        del self._pending[key]
+                        break
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        Stop accepting work and let the workers exit once the ready keys
+        have been drained. With wait=True, joins each worker for up to
+        `timeout` seconds.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            self._not_full.notify_all()
+        for _ in self._threads:
+            self._ready.put(None)
+        if wait:
+            for t in self._threads:
+                t.join(timeout=timeout)
+
+
+def call_into(future, fn, *args):
+    """Runs fn(*args), storing its result or exception in the concurrent.futures.Future `future`."""
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+
+
+class ParkedJobs:
+    """
+    Jobs a caller could not hand to a KeyedWorkerPool without waiting, kept
+    per key in submission order and retried with retry(). A key that has
+    parked jobs parks every later job too, so per-key order still holds.
+    Meant for a single thread (the dispatcher); once full() the caller
+    should stop taking new work so the backlog stays upstream.
+    """
+
+    def __init__(self, pool, limit):
+        self.pool = pool
+        self.limit = limit
+        self._jobs = OrderedDict() # key -> deque of (fn, args), oldest key first
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def full(self):
+        return self._count >= self.limit
+
+    def _hand_over(self, key, fn, args):
+        try:
+            self.pool.submit(key, fn, *args, block=False)
+        except queue.Full:
+            return False
+        return True
+
+    def submit(self, key, fn, *args):
+        """Submits fn(*args) to the pool, or parks it if the pool has no room for `key`."""
+        if key not in self._jobs and self._hand_over(key, fn, args):
+            return
+        self._jobs.setdefault(key, deque()).append((fn, args))
+        self._count += 1
+
+    def retry(self):
+        """Hands parked jobs to the pool, oldest key first, as far as there is room."""
+        for key in list(self._jobs):
+            dq = self._jobs[key]
+            while dq and self._hand_over(key, *dq[0]):
+                dq.popleft()
+                self._count -= 1
+            if not dq:
+                del self._jobs[key]
+
+
+class KeyedTaskRunner:
+    """
+    asyncio counterpart of KeyedWorkerPool for the asyncio monitor: every
+    submitted job becomes a task, so any number of devices are handled
+    concurrently without a thread each, while jobs that share a key still
+    run strictly in submission order (each task first waits for the
+    previous task of its key). Handlers may be coroutine functions or plain
+    functions; plain ones run on the loop and must not block.
+    """
+
+    def __init__(self):
+        self._tails = {} # key -> last task submitted for that key
+        self.tasks = set()
+
+    def pending_count(self):
+        return len(self.tasks)
+
+    def submit(self, key, fn, *args):
+        task = asyncio.ensure_future(self._run(self._tails.get(key), key, fn, args))
+        self._tails[key] = task
+        self.tasks.add(task)
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    async def _run(self, previous, key, fn, args):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            result = fn(*args)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logging.error("Task error while handling %s: %s", key, e, exc_info=True)
+
+    def _done(self, key, task):
+        self.tasks.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def drain(self, timeout=None):
+        """Waits up to `timeout` seconds for submitted jobs; returns how many are still running."""
+        if self.tasks:
+            await asyncio.wait(set(self.tasks), timeout=timeout)
+        return len(self.tasks)
+
+class BoundedEventQueue:
+    """
+    Event queue between the event sources and the dispatcher, holding at most
+    `capacity` events. put() on a full queue applies the overflow policy:
+
+    1. An event identical to the newest queued event for the same device is
+       merged into it; anything queued in between keeps both.
+    2. Otherwise the oldest removal that a later queued event for the same
+       device supersedes is dropped to make room.
+    3. Arrivals, and removals with nothing queued after them, are never
+       dropped: the producer blocks until the dispatcher makes room
+       (backpressure).
+
+    Drop-in for the queue.Queue methods the monitor uses (put, get, qsize).
+    The deepest the queue has been, time spent queued and overflow actions
+    are exported as metrics.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._items = deque()        # (queued_at, event); the device id is event[-1]
+        self._per_device = Counter() # device -> events queued
+        self._newest = {}            # device -> its newest queued item
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._overflowing = False
+        self.high_water = 0
+        self.merged = Counter()      # event kind -> events merged
+        self.dropped = 0
+        self.blocked = 0
+
+    def qsize(self):
+        with self._lock:
+            return len(self._items)
+
+    def _make_room(self, event):
+        """Applies the overflow policy; returns 'merged', 'dropped_removal' or None."""
+        newest = self._newest.get(event[-1])
+        if newest is not None and newest[1] == event:
+            self.merged[event[0]] += 1
+            return 'merged'
+        for i, item in enumerate(self._items):
+            queued = item[1]
+            if queued[0] == 'removal' and self._newest[queued[-1]] is not item:
+                # A later event for this device is queued and overwrites what the removal records
+                del self._items[i]
+                self._forget(queued)
+                self.dropped += 1
+                logging.debug("Event queue full; dropped a superseded removal for %s.", queued[-1])
+                return 'dropped_removal'
+        return None
+
+    def _forget(self, event):
+        device = event[-1]
+        self._per_device[device] -= 1
+        if not self._per_device[device]:
+            del self._per_device[device]
+            del self._newest[device]
+
+    def put(self, event, block=True, timeout=None):
+        """
+        Queues `event`, applying the overflow policy when the queue is full.
+
+        Raises:
+            queue.Full: block is False or `timeout` passed before room was made.
+        """
+        with self._not_full:
+            if len(self._items) >= self.capacity:
+                if not self._overflowing:
+                    self._overflowing = True # warn once per episode, not once per event
+                    logging.warning("Event queue full (%s events); merging duplicates, "
+                                    "dropping superseded removals and holding back the rest.", self.capacity)
+                action = self._make_room(event)
+                if action is None:
+                    self.blocked += 1
+                    queue_overflow_total.labels('blocked').inc()
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while len(self._items) >= self.capacity:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if not block or (remaining is not None and remaining <= 0):
+                            raise queue.Full
+                        self._not_full.wait(remaining)
+                else:
+                    queue_overflow_total.labels(action).inc()
+                    if action == 'merged':
+                        return
+            item = (time.monotonic(), event)
+            self._items.append(item)
+            self._per_device[event[-1]] += 1
+            self._newest[event[-1]] = item
+            if len(self._items) > self.high_water:
+                self.high_water = len(self._items)
+                queue_high_water.set(self.high_water)
+            self._not_empty.notify()
+
+    def get(self, block=True, timeout=None):
+        """
+        Removes and returns the oldest event.
+
+        Raises:
+            queue.Empty: No event arrived within `timeout` seconds.
+        """
+        with self._not_empty:
+            if not block and not self._items:
+                raise queue.Empty
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._items:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._not_empty.wait(remaining)
+            queued_at, event = self._items.popleft()
+            self._forget(event)
+            if self._overflowing and len(self._items) <= self.capacity // 2:
+                self._overflowing = False
+                logging.info("Event queue drained to %s events.", len(self._items))
+            self._not_full.notify()
+        queue_wait_seconds.observe(time.monotonic() - queued_at)
+        return event
+
+    def stats(self):
+        with self._lock:
+            return {'depth': len(self._items), 'capacity': self.capacity, 'high_water': self.high_water,
+                    'merged': dict(self.merged), 'dropped': self.dropped, 'blocked': self.blocked}
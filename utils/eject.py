@@ -1,7 +1,9 @@
 import ctypes
 import logging
-import datetime
 from .config import SCRIPT_DIR
+from .summary import summary_lock, record_change
+from . import clock
+from .metrics import stage, eject_total
 import os
 
 # --- load the DLL once at import time ---
@@ -11,9 +13,31 @@ try:
     core_dll.EjectVolumeByPath.argtypes = [ctypes.c_wchar_p]
     core_dll.EjectVolumeByPath.restype  = ctypes.c_bool
 except Exception as e:
-    logging.error(f"Failed to load core DLL for eject: {e}")
+    logging.error("Failed to load core DLL for eject: %s", e)
     core_dll = None
 
+def dll_eject(volume_path):
+    """Default eject backend: EjectVolumeByPath from the core DLL. Returns True on success."""
+    if not core_dll:
+        logging.error("Cannot eject: Core C DLL not loaded.")
+        return False
+    try:
+        success = bool(core_dll.EjectVolumeByPath(volume_path))
+    except Exception as dll_e:
+        logging.error("Error calling C DLL EjectVolumeByPath: %s", dll_e, exc_info=True)
+        return False
+    if not success:
+        logging.error("C eject failed for %s. WinAPI LastError=%s", volume_path, ctypes.windll.kernel32.GetLastError())
+    return success
+
+# Callable(volume_path) -> bool that performs the eject; replaceable by tests and benchmarks
+_eject_backend = dll_eject
+
+def set_eject_backend(backend):
+    """Replaces the function eject_drive_api uses to eject a volume (e.g. with a stub)."""
+    global _eject_backend
+    _eject_backend = backend
+
 def eject_drive_api(drive_letter: str,
                     device_id: str,
                     unique_devices_summary: dict,
@@ -22,42 +46,38 @@ def eject_drive_api(drive_letter: str,
     Safely ejects the volume via C DLL and updates the two dicts.
     Returns True if ejected successfully.
     """
-    logging.info(f"Attempting safe eject for {drive_letter} ({device_id}) via C DLL")
+    logging.info("Attempting safe eject for %s (%s) via C DLL", drive_letter, device_id)
     processed_volumes[device_id] = 'ejecting'
     volume_path = f"\\\\.\\{drive_letter}"
-    logging.debug(f"Calling C function EjectVolumeByPath with path: {volume_path}")
-
-    success = False
-    if core_dll:
-        try:
-            success = core_dll.EjectVolumeByPath(volume_path)
-        except Exception as dll_e:
-            logging.error(f"Error calling C DLL EjectVolumeByPath: {dll_e}", exc_info=True)
-    else:
-        logging.error("Cannot eject: Core C DLL not loaded.")
+    logging.debug("Calling C function EjectVolumeByPath with path: %s", volume_path)
+
+    with stage('eject'):
+        success = _eject_backend(volume_path)
 
     outcome = 'ejected' if success else 'failed_eject_dll'
-    now_iso = datetime.datetime.now().isoformat()
+    eject_total.labels(outcome).inc()
+    now_iso = clock.now_iso()
 
     # update summary
-    entry = unique_devices_summary.get(device_id)
+    with summary_lock:
+        entry = unique_devices_summary.get(device_id)
+        if entry is not None:
+            entry.update({
+                'last_state': outcome,
+                'last_seen': now_iso
+            })
+            key = 'total_eject_success' if success else 'total_eject_failure'
+            entry[key] = entry.get(key, 0) + 1
+            logging.debug("[Summary] Updated entry for %s: %s", device_id, entry)
+        else:
+            logging.warning("[Summary] No entry to update for %s", device_id)
     if entry is not None:
-        entry.update({
-            'last_state': outcome,
-            'last_seen': now_iso
-        })
-        key = 'total_eject_success' if success else 'total_eject_failure'
-        entry[key] = entry.get(key, 0) + 1
-        logging.debug(f"[Summary] Updated entry for {device_id}: {entry}")
-    else:
-        logging.warning(f"[Summary] No entry to update for {device_id}")
+        record_change(unique_devices_summary, device_id, 'eject',
+                      'last_state', 'last_seen', 'total_eject_success', 'total_eject_failure')
 
     # update transient state
     processed_volumes[device_id] = outcome
     if success:
-        logging.info(f"Successfully ejected {drive_letter} via C DLL.")
-    else:
-        err = ctypes.windll.kernel32.GetLastError() if core_dll else "N/A"
-        logging.error(f"C eject failed for {volume_path}. WinAPI LastError={err}")
+        logging.info("Successfully ejected %s via C DLL.", drive_letter)
 
     return success
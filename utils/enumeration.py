@@ -0,0 +1,310 @@
+import os, re, gzip, json, time, zlib, queue, logging, datetime, threading
+
+from .config import ENUM_MAX_DEPTH, ENUM_MAX_ENTRIES, ENUM_TIME_BUDGET, ENUM_SCAN_WORKERS, ENUM_OUTPUT_DIR
+
+
+def _safe_name(device_id):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', device_id).strip('_') or 'device'
+
+def listing_path(device_id, directory=None):
+    """Per-device listing file; the volume GUID is reduced to a filesystem-safe name."""
+    return os.path.join(directory or ENUM_OUTPUT_DIR, f"{_safe_name(device_id)}.jsonl")
+
+
+class VolumeWalker:
+    """
+    Walks a volume with a bounded pool of scandir workers and streams one
+    JSON line per entry to `output_path`:
+
+        {"p": "dir/file.txt", "s": 1234, "m": 1717171717, "d": 0}
+
+    (relative path, size, integer mtime, is-directory). Each worker lists one
+    directory at a time and hands subdirectories back to the shared queue, so
+    wide trees are scanned in parallel while memory stays bounded by the
+    directory queue, not the number of files. Symlinks are listed but never
+    followed.
+
+    The walk stops early, and the result is marked truncated, when
+    `max_entries` have been written, `time_budget` seconds have passed or
+    `stop_event` is set. The listing is written to a temporary file and moved
+    into place when the walk ends, so readers never see a partial file.
+
+    Args:
+        root (str): Directory to walk (the volume root).
+        output_path (str): Listing file to (re)write.
+        max_depth (int): Deepest directory level listed; the root is depth 0.
+        max_entries (int): Stop after this many entries.
+        time_budget (float): Wall-clock limit in seconds.
+        workers (int): Number of scandir threads.
+        stop_event (threading.Event): Aborts the walk when set.
+    """
+
+    def __init__(self, root, output_path, max_depth=ENUM_MAX_DEPTH, max_entries=ENUM_MAX_ENTRIES,
+                 time_budget=ENUM_TIME_BUDGET, workers=ENUM_SCAN_WORKERS, stop_event=None):
+        self.root = root
+        self.output_path = output_path
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        self.time_budget = time_budget
+        self.workers = max(1, workers)
+        self.stop_event = stop_event
+
+        self._dirs = queue.Queue()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._outstanding = 0 # directories queued or being listed
+        self._done = threading.Event()
+        self._halt = threading.Event()
+        self._out = None
+
+        self.entries = 0
+        self.dirs = 0
+        self.errors = 0
+        self.deepest = 0
+        self.truncated = None # None, 'max_entries', 'time_budget' or 'stopped'
+
+    # ─── worker side ───────────────────────────────────────────────────────
+    def _push(self, path, depth):
+        with self._lock:
+            self._outstanding += 1
+        self._dirs.put((path, depth))
+
+    def _finish_dir(self):
+        with self._lock:
+            self._outstanding -= 1
+            if self._outstanding == 0:
+                self._done.set()
+
+    def _claim(self, n):
+        """Reserves up to n entries against max_entries; returns how many may be written."""
+        with self._lock:
+            allowed = min(n, self.max_entries - self.entries)
+            self.entries += max(allowed, 0)
+            if allowed < n and self.truncated is None:
+                self.truncated = 'max_entries'
+                self._halt.set()
+            return max(allowed, 0)
+
+    def _list_dir(self, path, depth):
+        lines, subdirs = [], []
+        prefix = os.path.relpath(path, self.root)
+        prefix = '' if prefix == '.' else prefix + os.sep
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        st = entry.stat(follow_symlinks=False)
+                        lines.append('{"p":%s,"s":%d,"m":%d,"d":%d}\n'
+                                     % (json.dumps(prefix + entry.name), st.st_size, st.st_mtime, is_dir))
+                    except OSError as e:
+                        lines.append('{"p":%s,"e":%s}\n' % (json.dumps(prefix + entry.name), json.dumps(str(e))))
+                        with self._lock:
+                            self.errors += 1
+                        continue
+                    if is_dir:
+                        subdirs.append(entry.path)
+        except OSError as e:
+            logging.warning("Cannot list %s during enumeration: %s", path, e)
+            with self._lock:
+                self.errors += 1
+            return
+
+        allowed = self._claim(len(lines))
+        if allowed:
+            with self._write_lock:
+                self._out.write(''.join(lines[:allowed]))
+        with self._lock:
+            self.dirs += 1
+            self.deepest = max(self.deepest, depth)
+        if depth < self.max_depth and not self._halt.is_set():
+            for sub in subdirs:
+                self._push(sub, depth + 1)
+
+    def _worker(self):
+        while True:
+            item = self._dirs.get()
+            if item is None:
+                return
+            try:
+                if not self._halt.is_set():
+                    self._list_dir(*item)
+            except Exception as e:
+                logging.error("Unexpected error enumerating %s: %s", item[0], e, exc_info=True)
+            finally:
+                self._finish_dir()
+
+    # ─── driver ────────────────────────────────────────────────────────────
+    def run(self):
+        """
+        Performs the walk.
+
+        Returns:
+            dict: file, entries, dirs, errors, max_depth_reached, truncated,
+                  elapsed_seconds, entries_per_sec and bytes (listing size).
+        """
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        tmp_path = self.output_path + '.tmp'
+        start = time.monotonic()
+        deadline = start + self.time_budget
+        with open(tmp_path, 'w', encoding='utf-8', buffering=1 << 20) as self._out:
+            threads = [threading.Thread(target=self._worker, name=f"enum-{i}", daemon=True)
+                       for i in range(self.workers)]
+            for t in threads:
+                t.start()
+            self._push(self.root, 0)
+            while not self._done.wait(timeout=0.2):
+                if self.stop_event is not None and self.stop_event.is_set():
+                    self._stop_walk('stopped')
+                elif time.monotonic() >= deadline:
+                    self._stop_walk('time_budget')
+            for _ in threads:
+                self._dirs.put(None)
+            for t in threads:
+                t.join()
+        os.replace(tmp_path, self.output_path)
+
+        elapsed = time.monotonic() - start
+        return {
+            'file': self.output_path,
+            'entries': self.entries,
+            'dirs': self.dirs,
+            'errors': self.errors,
+            'max_depth_reached': self.deepest,
+            'truncated': self.truncated,
+            'elapsed_seconds': round(elapsed, 3),
+            'entries_per_sec': round(self.entries / elapsed, 1) if elapsed else 0.0,
+            'bytes': os.path.getsize(self.output_path),
+        }
+
+    def _stop_walk(self, reason):
+        with self._lock:
+            if self.truncated is None:
+                self.truncated = reason
+        self._halt.set() # queued directories are skipped, in-flight listings finish
+
+
+def walk_volume(root, device_id, stop_event=None, **limits):
+    """Runs a VolumeWalker for `device_id` into its listing file; see VolumeWalker for `limits`."""
+    return VolumeWalker(root, listing_path(device_id), stop_event=stop_event, **limits).run()
+
+
+def read_listing(path):
+    """Yields the entries of a listing file as dicts."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# ─── Root listings (level = root) ──────────────────────────────────────────
+# Stored per device as gzip-compressed JSON with the field names written once
+# and timestamps as integer epoch seconds; the summary keeps only a reference.
+ROOT_FIELDS = ('name', 'size', 'created', 'modified', 'accessed', 'is_dir')
+
+def root_listing_path(device_id, directory=None):
+    return os.path.join(directory or ENUM_OUTPUT_DIR, f"{_safe_name(device_id)}.root.json.gz")
+
+def _epoch(value):
+    # Entries migrated from older summaries carry ISO 8601 strings
+    if isinstance(value, str):
+        try:
+            return int(datetime.datetime.fromisoformat(value).timestamp())
+        except ValueError:
+            return None
+    return None if value is None else int(value)
+
+def save_root_listing(device_id, entries, truncated=False, directory=None, previous=None):
+    """
+    Writes a device's root listing sidecar atomically.
+
+    Args:
+        device_id (str): Volume GUID.
+        entries (dict): name -> {'size', 'created', 'modified', 'accessed', 'is_dir'}
+                        (timestamps as epoch seconds or ISO strings) or {'error': ...}.
+        truncated (bool): Whether the listing stopped at MaxRootFiles.
+        previous (dict): The device's current reference; when the listing is
+                         unchanged (same checksum) the sidecar is not rewritten.
+
+    Returns:
+        dict: Reference to store in the summary: file name, entry count,
+              truncated flag, compressed size in bytes and content checksum.
+    """
+    rows, errors = [], {}
+    for name, info in entries.items():
+        if 'error' in info:
+            errors[name] = info['error']
+            continue
+        rows.append([name, info.get('size'), _epoch(info.get('created')), _epoch(info.get('modified')),
+                     _epoch(info.get('accessed')), 1 if info.get('is_dir') else 0])
+    payload = json.dumps({'fields': ROOT_FIELDS, 'rows': rows, 'errors': errors, 'truncated': truncated},
+                         separators=(',', ':')).encode('utf-8')
+    path = root_listing_path(device_id, directory)
+    crc = zlib.crc32(payload)
+    if previous and previous.get('crc') == crc and os.path.exists(path):
+        return previous # same stick, same root: nothing to rewrite
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    compressed = gzip.compress(payload, compresslevel=6)
+    with open(tmp, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmp, path)
+    return {'file': os.path.basename(path), 'count': len(rows) + len(errors),
+            'truncated': truncated, 'bytes': len(compressed), 'crc': crc}
+
+def load_root_listing(ref, directory=None):
+    """
+    Reads the sidecar a summary reference points to.
+
+    Returns:
+        dict: name -> {'size', 'created', 'modified', 'accessed', 'is_dir'} with
+              epoch-second timestamps (or {'error': ...}), in listing order;
+              empty if the sidecar is missing or unreadable.
+    """
+    path = os.path.join(directory or ENUM_OUTPUT_DIR, os.path.basename(ref['file']))
+    try:
+        with gzip.open(path, 'rb') as f:
+            data = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        logging.warning("Cannot read root listing %s: %s", path, e)
+        return {}
+    fields = data.get('fields', ROOT_FIELDS)
+    listing = {}
+    for row in data.get('rows', []):
+        item = dict(zip(fields, row))
+        name = item.pop('name')
+        item['is_dir'] = bool(item.get('is_dir'))
+        listing[name] = item
+    for name, error in data.get('errors', {}).items():
+        listing[name] = {'error': error}
+    return listing
+
+def migrate_root_listings(summary, lock=None):
+    """
+    Moves inline extra_data.files_enumeration dicts (older summaries) into
+    sidecar files, leaving a files_enumeration_ref behind.
+
+    Returns:
+        list: Device ids whose entries changed.
+    """
+    migrated = []
+    for device_id, entry in list(summary.items()):
+        extra = entry.get('extra_data') or {}
+        inline = extra.get('files_enumeration')
+        if not isinstance(inline, dict):
+            continue
+        if inline:
+            inline = dict(inline)
+            truncated = bool(inline.pop('_truncated_', False))
+            ref = save_root_listing(device_id, inline, truncated)
+        if lock is not None:
+            lock.acquire()
+        try:
+            del extra['files_enumeration']
+            if inline:
+                extra['files_enumeration_ref'] = ref
+        finally:
+            if lock is not None:
+                lock.release()
+        migrated.append(device_id)
+    return migrated
@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import threading
+
+from .config import WMI_POLL, EVENT_SOURCE
+from .uevent import UeventMonitor
+
+try:
+    import wmi
+    import pythoncom
+except ImportError: # non-Windows hosts
+    wmi = None
+    pythoncom = None
+
+
+class EventSource:
+    """
+    Producer of device events for the dispatcher. run() is executed on its
+    own thread and puts ('arrival', drive_letter, device_id) and
+    ('removal', device_id) tuples into the queue until stop_event is set.
+    """
+
+    name = 'base'
+
+    def run(self, q, stop_event):
+        raise NotImplementedError
+
+
+class WmiEventSource(EventSource):
+    """
+    One WMI subscription for both arrivals and removals: a single
+    __InstanceOperationEvent query restricted to creation/deletion of
+    removable Win32_Volume instances, instead of one polling query per kind.
+    """
+
+    name = 'wmi'
+
+    WQL = (f"SELECT * FROM __InstanceOperationEvent WITHIN {WMI_POLL} "
+           "WHERE (__CLASS = '__InstanceCreationEvent' OR __CLASS = '__InstanceDeletionEvent') "
+           "AND TargetInstance ISA 'Win32_Volume' AND TargetInstance.DriveType=2")
+
+    def run(self, q, stop_event):
+        # set up COM on *this* thread
+        pythoncom.CoInitialize()
+        try:
+            # Outer recovery loop
+            while not stop_event.is_set():
+                try:
+                    # (Re)establish WMI connection each time we retry
+                    watcher = wmi.WMI().watch_for(raw_wql=self.WQL)
+                    # Inner event‑pumping loop
+                    while not stop_event.is_set():
+                        try:
+                            evt = watcher(timeout_ms=1000)
+                        except wmi.x_wmi_timed_out:
+                            continue
+                        if not evt or not evt.DeviceID:
+                            continue
+                        if evt.event_type == 'creation':
+                            if evt.DriveLetter:
+                                q.put(('arrival', evt.DriveLetter, evt.DeviceID))
+                        elif evt.event_type == 'deletion':
+                            q.put(('removal', evt.DeviceID))
+                        else:
+                            logging.debug("Ignoring WMI event of type %s for %s", evt.event_type, evt.DeviceID)
+
+                except Exception as e:
+                    # Log any fatal COM/WMI error, then retry after a pause
+                    logging.error("WMI event source error, retrying in 5s: %s", e, exc_info=True)
+                    stop_event.wait(5)
+        finally:
+            pythoncom.CoUninitialize()
+
+
+class UeventEventSource(EventSource):
+    """Linux kernel uevents over netlink; see utils.uevent.UeventMonitor."""
+
+    name = 'uevent'
+
+    def __init__(self, monitor=None):
+        self.monitor = monitor or UeventMonitor()
+
+    def run(self, q, stop_event):
+        self.monitor.run(q, stop_event)
+
+
+class SimulatedEventSource(EventSource):
+    """
+    In-memory source for tests and throughput runs. Emits a scripted list of
+    event tuples (optionally paced to `rate` events/sec) and then anything
+    passed to inject(). Pair it with directories standing in for drives,
+    which volume_root() passes through unchanged, to drive the real
+    handle_usb_arrival/handle_usb_removal code on any platform.
+    """
+
+    name = 'simulated'
+
+    def __init__(self, events=(), rate=None):
+        self._events = list(events)
+        self.rate = rate
+        self._injected = []
+        self._cond = threading.Condition()
+        self.emitted = 0
+        self.drained = threading.Event() # set once the scripted events are queued
+
+    def inject(self, event):
+        with self._cond:
+            self._injected.append(event)
+            self._cond.notify()
+
+    def run(self, q, stop_event):
+        interval = 1.0 / self.rate if self.rate else 0
+        next_at = time.perf_counter()
+        for event in self._events:
+            if stop_event.is_set():
+                return
+            if interval:
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at += interval
+            q.put(event)
+            self.emitted += 1
+        self.drained.set()
+
+        while not stop_event.is_set():
+            with self._cond:
+                if not self._injected:
+                    self._cond.wait(timeout=0.5)
+                pending, self._injected = self._injected, []
+            for event in pending:
+                q.put(event)
+                self.emitted += 1
+
+    @staticmethod
+    def storm(drive_dirs, cycles=1, required_file=None, key=None):
+        """
+        Builds arrival/removal cycles over directories acting as drives. When
+        `required_file`/`key` are given, every other drive gets a valid key file.
+
+        Returns:
+            list: Event tuples in emission order.
+        """
+        if required_file and key is not None:
+            for i, drive in enumerate(drive_dirs):
+                if i % 2 == 0:
+                    with open(os.path.join(drive, required_file), 'w', encoding='utf-8') as f:
+                        f.write(key)
+        events = []
+        for _ in range(cycles):
+            for i, drive in enumerate(drive_dirs):
+                events.append(('arrival', drive, f"sim-volume-{i}"))
+            for i, _drive in enumerate(drive_dirs):
+                events.append(('removal', f"sim-volume-{i}"))
+        return events
+
+
+def create_event_source(kind=EVENT_SOURCE):
+    """Builds the configured event source; 'auto' picks WMI when available, else kernel uevents."""
+    if kind == 'auto':
+        kind = 'wmi' if wmi is not None else 'uevent'
+    if kind == 'wmi':
+        return WmiEventSource()
+    return UeventEventSource()
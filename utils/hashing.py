@@ -0,0 +1,198 @@
+import os, sys, json, mmap, time, hashlib, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import HASH_MAX_FILE_SIZE, HASH_WORKERS, HASH_TIME_BUDGET, HASH_CACHE_DIR
+from .enumeration import listing_path
+
+# Read size for buffered hashing; large enough that hashlib (which releases the GIL) dominates
+READ_CHUNK = 1 << 20
+# Files at least this large are hashed through a read-only memory map
+MMAP_THRESHOLD = 8 << 20
+
+
+def hash_file(path, size=None):
+    """Returns the SHA-256 hex digest of `path`."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if size is None:
+            size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, len(view), READ_CHUNK):
+                        digest.update(view[offset:offset + READ_CHUNK])
+                finally:
+                    view.release()
+        else:
+            buf = bytearray(READ_CHUNK)
+            view = memoryview(buf)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                digest.update(view[:n])
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    Persistent per-device SHA-256 cache: relative path -> [size, mtime_ns, digest].
+    A file whose size and mtime are unchanged since it was last hashed is not
+    read again, so a stick inserted every day only costs the changed files.
+    The cache file doubles as the device's hash report.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            logging.warning("Discarding unreadable hash cache %s: %s", path, e)
+            self.entries = {}
+        self._dirty = False
+
+    def lookup(self, rel_path, size, mtime_ns):
+        cached = self.entries.get(rel_path)
+        if cached and cached[0] == size and cached[1] == mtime_ns:
+            return cached[2]
+        return None
+
+    def store(self, rel_path, size, mtime_ns, digest):
+        with self._lock:
+            self.entries[rel_path] = [size, mtime_ns, digest]
+            self._dirty = True
+
+    def retain(self, rel_paths):
+        """Drops entries for files no longer present on the device."""
+        with self._lock:
+            stale = self.entries.keys() - set(rel_paths)
+            for key in stale:
+                del self.entries[key]
+            self._dirty = self._dirty or bool(stale)
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with self._lock:
+            payload = json.dumps(self.entries, separators=(',', ':'))
+            self._dirty = False
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp, self.path)
+
+
+def cache_path(device_id, directory=None):
+    """Per-device hash cache file, named like the device's enumeration listing."""
+    name = os.path.basename(listing_path(device_id))[:-len('.jsonl')] + '.json'
+    return os.path.join(directory or HASH_CACHE_DIR, name)
+
+
+def hash_device_files(root, rel_paths, device_id, workers=HASH_WORKERS, max_size=HASH_MAX_FILE_SIZE,
+                      time_budget=HASH_TIME_BUDGET, stop_event=None, cache_dir=None):
+    """
+    Hashes the given files of a mounted volume in a thread pool, reusing the
+    device's HashCache for files whose (size, mtime) did not change.
+
+    Args:
+        root (str): Volume root the paths are relative to.
+        rel_paths (iterable): Relative paths of regular files to hash.
+        device_id (str): Volume GUID; selects the cache file.
+        workers (int): Hashing threads.
+        max_size (int): Files larger than this many bytes are skipped.
+        time_budget (float): Seconds after which remaining files are skipped.
+        stop_event (threading.Event): Skips remaining files when set.
+
+    Returns:
+        dict: hashed, cached, skipped_large, skipped_budget, errors, bytes_hashed,
+              elapsed_seconds, mb_per_sec and the cache file path.
+    """
+    cache = HashCache(cache_path(device_id, cache_dir))
+    rel_paths = list(rel_paths)
+    deadline = time.monotonic() + time_budget
+    counts = {'hashed': 0, 'cached': 0, 'skipped_large': 0, 'skipped_budget': 0, 'errors': 0, 'bytes_hashed': 0}
+    lock = threading.Lock()
+
+    def count(key, amount=1):
+        with lock:
+            counts[key] += amount
+
+    def work(rel_path):
+        if time.monotonic() >= deadline or (stop_event is not None and stop_event.is_set()):
+            count('skipped_budget')
+            return
+        full = os.path.join(root, rel_path)
+        try:
+            st = os.stat(full)
+            if cache.lookup(rel_path, st.st_size, st.st_mtime_ns):
+                count('cached')
+                return
+            if st.st_size > max_size:
+                count('skipped_large')
+                return
+            cache.store(rel_path, st.st_size, st.st_mtime_ns, hash_file(full, st.st_size))
+            count('hashed')
+            count('bytes_hashed', st.st_size)
+        except (OSError, ValueError) as e:
+            logging.debug("Cannot hash %s: %s", full, e)
+            count('errors')
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hash") as pool:
+        for _ in pool.map(work, rel_paths):
+            pass
+    elapsed = time.monotonic() - start
+    if not counts['skipped_budget']:
+        cache.retain(rel_paths) # only a complete pass knows which files are gone
+    cache.save()
+
+    counts.update({
+        'elapsed_seconds': round(elapsed, 3),
+        'mb_per_sec': round(counts['bytes_hashed'] / elapsed / 1e6, 2) if elapsed else 0.0,
+        'file': cache.path,
+    })
+    return counts
+
+
+def find_duplicates(cache_dir=None):
+    """
+    Groups files with identical content across all devices' hash caches.
+
+    Returns:
+        dict: digest -> list of (device cache name, relative path), only for
+              digests seen on more than one device.
+    """
+    directory = cache_dir or HASH_CACHE_DIR
+    by_digest = {}
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith('.json'))
+    except FileNotFoundError:
+        return {}
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning("Skipping unreadable hash cache %s: %s", name, e)
+            continue
+        device = name[:-len('.json')]
+        for rel_path, (_size, _mtime, digest) in entries.items():
+            by_digest.setdefault(digest, []).append((device, rel_path))
+    return {digest: places for digest, places in by_digest.items()
+            if len({device for device, _ in places}) > 1}
+
+
+if __name__ == "__main__":
+    # python -m utils.hashing [cache_dir]: print files found on more than one device
+    duplicates = find_duplicates(sys.argv[1] if len(sys.argv) > 1 else None)
+    for digest, places in sorted(duplicates.items(), key=lambda item: -len(item[1])):
+        print(digest)
+        for device, rel_path in places:
+            print(f"    {device}: {rel_path}")
+    print(f"{len(duplicates)} file content(s) present on more than one device")
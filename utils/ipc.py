@@ -0,0 +1,448 @@
+"""
+Local push channel between the monitor service (usb_monitor_service.py) and
+its clients such as the GUI. The service listens on a Unix domain socket (a
+named pipe on Windows) and pushes every recorded device change, log line and
+monitoring status change to subscribed clients; clients can also send
+requests (snapshot, device details, eject, start/stop monitoring).
+Connections are authenticated with the key in [Service] KeyFile, which the
+service creates on first start.
+
+Messages are dicts with a 'type':
+  snapshot  devices, summary_version, monitoring, log (recent lines): first
+            message after subscribing, and again whenever a client fell too
+            far behind
+  change    device_id, event, entry: one record_change()
+  log       line: one formatted log record
+  status    monitoring
+  reply     id, ok, and result or error: answer to a request
+Requests are {'id': n, 'cmd': name, 'args': {...}}.
+"""
+import os
+import logging
+import socket
+import secrets
+import itertools
+import threading
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from .config  import SERVICE_ADDRESS, SERVICE_KEY_FILE, SERVICE_CLIENT_BACKLOG
+from .metrics import service_clients, service_resync_total
+
+# Placeholder queued for a client that needs the full state; replaced by a
+# snapshot when it is sent, so the snapshot is as fresh as possible
+_RESYNC = object()
+
+
+class ServiceError(Exception):
+    """A request to the monitor service failed."""
+
+
+class ServiceUnavailable(ServiceError):
+    """No monitor service is listening at the address, or the connection was lost."""
+
+
+class ServiceAlreadyRunning(ServiceError):
+    """Another monitor service is already listening at the address."""
+
+
+def load_authkey(path=SERVICE_KEY_FILE, create=False):
+    """
+    Reads the shared service key. With create=True a missing key is generated
+    (readable by the owner only), as the service does on first start.
+    """
+    try:
+        with open(path, 'rb') as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    if not create:
+        raise ServiceUnavailable(f"No service key at {path}; is the monitor service running?")
+    key = secrets.token_hex(32).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def _disconnect(conn):
+    """
+    Closes a connection so that a thread blocked in recv() on it returns and
+    the peer sees EOF; on a Unix socket close() alone does neither.
+    """
+    if os.name != 'nt':
+        try:
+            sock = socket.fromfd(conn.fileno(), socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            finally:
+                sock.close()
+        except OSError:
+            pass # already closed
+    conn.close()
+
+
+class _Subscriber:
+    """One connected client and the messages waiting to be sent to it."""
+
+    def __init__(self, conn, backlog):
+        self.conn = conn
+        self.backlog = backlog
+        self.subscribed = False
+        self.closed = False
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def push(self, message, reply=False):
+        """
+        Queues a message. Replies are always queued; pushed messages only once
+        the client subscribed. A client more than `backlog` messages behind
+        gets a fresh snapshot instead of its backlog.
+        """
+        with self._cond:
+            if self.closed or not (reply or self.subscribed):
+                return
+            if not reply and len(self._queue) >= self.backlog:
+                self._queue = deque(m for m in self._queue if m is not _RESYNC and m['type'] == 'reply')
+                self._queue.append(_RESYNC)
+                service_resync_total.inc()
+            self._queue.append(message)
+            self._cond.notify()
+
+    def subscribe(self):
+        with self._cond:
+            self.subscribed = True
+            self._queue.append(_RESYNC)
+            self._cond.notify()
+
+    def take(self):
+        """Waits for queued messages and returns them all, or None once closed."""
+        with self._cond:
+            while not self._queue and not self.closed:
+                self._cond.wait()
+            if self.closed:
+                return None
+            batch = list(self._queue)
+            self._queue.clear()
+            return batch
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class EventPublisher:
+    """
+    Service side of the channel. Each client gets a sender thread draining
+    its own bounded queue and a reader thread answering its requests, so a
+    slow dashboard never holds up the monitor or the other clients.
+
+    Args:
+        snapshot (callable): Returns the current state for a snapshot message.
+        handlers (dict): Request name -> callable(**args) returning the reply result.
+    """
+
+    def __init__(self, snapshot, handlers=None, address=SERVICE_ADDRESS, authkey=None,
+                 backlog=SERVICE_CLIENT_BACKLOG):
+        self.snapshot = snapshot
+        self.handlers = dict(handlers or {})
+        self.handlers.setdefault('snapshot', snapshot)
+        self.address = address
+        self.authkey = authkey
+        self.backlog = backlog
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._thread = None
+        self._stopping = False
+
+    def _probe(self):
+        """True when something already answers at the address."""
+        if os.name != 'nt' and not os.path.exists(self.address):
+            return False
+        try:
+            Client(self.address, authkey=self.authkey).close()
+            return True
+        except AuthenticationError:
+            return True # a service with another key
+        except OSError:
+            return False
+
+    def start(self):
+        """Starts listening; raises ServiceAlreadyRunning if another service holds the address."""
+        if self.authkey is None:
+            self.authkey = load_authkey(create=True)
+        if self._probe():
+            raise ServiceAlreadyRunning(f"A monitor service is already listening at {self.address}")
+        if os.name != 'nt' and os.path.exists(self.address):
+            os.unlink(self.address) # left behind by a service that did not shut down cleanly
+        self._stopping = False
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if os.name != 'nt':
+            os.chmod(self.address, 0o600)
+        self._thread = threading.Thread(target=self._accept_loop, name="ipc-accept", daemon=True)
+        self._thread.start()
+        logging.info("Monitor service listening at %s", self.address)
+
+    def stop(self):
+        """Stops accepting clients and disconnects the attached ones."""
+        if self._listener is None:
+            return
+        self._stopping = True
+        if self._thread.is_alive():
+            try:
+                # accept() does not return on close(); wake it with a connection of our own
+                Client(self.address, authkey=self.authkey).close()
+            except (OSError, AuthenticationError):
+                pass
+            self._thread.join(timeout=5)
+        self._listener.close()
+        self._listener = None
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            self._drop(sub)
+
+    def _accept_loop(self):
+        while not self._stopping:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as e:
+                logging.warning("Rejected a service client: %s", e)
+                continue
+            except OSError as e:
+                if not self._stopping:
+                    logging.error("Service listener error: %s", e)
+                break
+            if self._stopping:
+                conn.close()
+                break
+            sub = _Subscriber(conn, self.backlog)
+            with self._lock:
+                self._subscribers.add(sub)
+                count = len(self._subscribers)
+            service_clients.set(count)
+            threading.Thread(target=self._send_loop, args=(sub,), name="ipc-send", daemon=True).start()
+            threading.Thread(target=self._recv_loop, args=(sub,), name="ipc-recv", daemon=True).start()
+            logging.info("Service client connected (%s attached).", count)
+
+    def _send_loop(self, sub):
+        try:
+            while True:
+                batch = sub.take()
+                if batch is None:
+                    return
+                for message in batch:
+                    if message is _RESYNC:
+                        message = dict(self.snapshot(), type='snapshot')
+                    sub.conn.send(message)
+        except (OSError, EOFError) as e:
+            logging.debug("Service client send failed: %s", e)
+        finally:
+            self._drop(sub)
+
+    def _recv_loop(self, sub):
+        try:
+            while True:
+                request = sub.conn.recv()
+                cmd = request.get('cmd')
+                if cmd == 'close':
+                    return
+                if cmd == 'subscribe':
+                    sub.subscribe()
+                    sub.push({'type': 'reply', 'id': request.get('id'), 'ok': True, 'result': None}, reply=True)
+                    continue
+                sub.push(self._reply(request), reply=True)
+        except (OSError, EOFError):
+            pass
+        finally:
+            self._drop(sub)
+
+    def _reply(self, request):
+        request_id = request.get('id')
+        handler = self.handlers.get(request.get('cmd'))
+        if handler is None:
+            return {'type': 'reply', 'id': request_id, 'ok': False, 'error': f"Unknown command {request.get('cmd')!r}"}
+        try:
+            result = handler(**request.get('args', {}))
+        except Exception as e:
+            logging.error("Service request %r failed: %s", request.get('cmd'), e)
+            return {'type': 'reply', 'id': request_id, 'ok': False, 'error': str(e)}
+        return {'type': 'reply', 'id': request_id, 'ok': True, 'result': result}
+
+    def _drop(self, sub):
+        with self._lock:
+            if sub not in self._subscribers:
+                return
+            self._subscribers.discard(sub)
+            count = len(self._subscribers)
+        service_clients.set(count)
+        sub.close()
+        _disconnect(sub.conn)
+        logging.info("Service client disconnected (%s attached).", count)
+
+    def publish(self, message):
+        """Queues a message for every subscribed client; never blocks on a client."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.push(message)
+        self.published += 1
+
+    def publish_change(self, device_id, event, entry):
+        """Summary change listener (see utils.summary.add_change_listener)."""
+        self.publish({'type': 'change', 'device_id': device_id, 'event': event, 'entry': entry})
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._subscribers), 'published': self.published}
+
+
+class PublishingLogHandler(logging.Handler):
+    """
+    Publishes each log record as a 'log' message, formatted like the log
+    file, and keeps the last `history` lines for snapshots so a dashboard
+    that attaches later starts with recent context.
+    """
+
+    def __init__(self, publisher, level=logging.INFO, history=200):
+        super().__init__(level)
+        self.publisher = publisher
+        self.recent = deque(maxlen=history)
+        self.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+            self.recent.append(line)
+            self.publisher.publish({'type': 'log', 'line': line})
+        except Exception:
+            self.handleError(record)
+
+
+class MonitorClient:
+    """
+    Connection to a running monitor service. subscribe(callback) starts the
+    push stream: callback(message) is called on the client's reader thread
+    for every snapshot, change, log and status message, and once with
+    {'type': 'disconnected'} if the service goes away. Requests can be sent
+    from any thread and wait for their reply.
+
+    Raises:
+        ServiceUnavailable: No service is listening, or its key does not match.
+    """
+
+    def __init__(self, address=SERVICE_ADDRESS, authkey=None, timeout=5.0):
+        if authkey is None:
+            authkey = load_authkey()
+        try:
+            self._conn = Client(address, authkey=authkey)
+        except (OSError, AuthenticationError) as e:
+            raise ServiceUnavailable(f"No monitor service at {address}: {e}") from e
+        self.timeout = timeout
+        self.closed = False
+        self._callback = None
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._pending = {}  # request id -> [threading.Event, reply]
+        self._pending_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, name="ipc-client", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self):
+        try:
+            while True:
+                message = self._conn.recv()
+                if message['type'] == 'reply':
+                    with self._pending_lock:
+                        waiter = self._pending.pop(message['id'], None)
+                    if waiter is not None:
+                        waiter[1] = message
+                        waiter[0].set()
+                elif self._callback is not None:
+                    try:
+                        self._callback(message)
+                    except Exception as e:
+                        logging.error("Service message callback failed: %s", e)
+        except (OSError, EOFError):
+            pass
+        finally:
+            self.closed = True
+            with self._pending_lock:
+                waiters, self._pending = list(self._pending.values()), {}
+            for waiter in waiters:
+                waiter[0].set()
+            if self._callback is not None:
+                self._callback({'type': 'disconnected'})
+
+    def _send(self, message):
+        try:
+            with self._send_lock:
+                self._conn.send(message)
+        except OSError as e:
+            raise ServiceUnavailable(f"Lost connection to the monitor service: {e}") from e
+
+    def request(self, cmd, timeout=None, **args):
+        """Sends a request and returns its result; raises ServiceError if it failed."""
+        if self.closed:
+            raise ServiceUnavailable("The connection to the monitor service is closed")
+        request_id = next(self._ids)
+        waiter = [threading.Event(), None]
+        with self._pending_lock:
+            self._pending[request_id] = waiter
+        self._send({'id': request_id, 'cmd': cmd, 'args': args})
+        if not waiter[0].wait(self.timeout if timeout is None else timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise ServiceError(f"No reply to {cmd!r} from the monitor service")
+        reply = waiter[1]
+        if reply is None:
+            raise ServiceUnavailable("The monitor service disconnected")
+        if not reply['ok']:
+            raise ServiceError(reply['error'])
+        return reply['result']
+
+    def subscribe(self, callback):
+        """Starts the push stream; the first message is a snapshot."""
+        self._callback = callback
+        self.request('subscribe')
+
+    def snapshot(self):
+        return self.request('snapshot')
+
+    def device(self, device_id):
+        """The device's summary entry plus its root listing: {'entry': ..., 'root_listing': ...}."""
+        return self.request('device', device_id=device_id)
+
+    def eject(self, device_id, timeout=60):
+        """Ejects the device's last drive letter. Returns {'drive': ..., 'ejected': bool}."""
+        return self.request('eject', timeout=timeout, device_id=device_id)
+
+    def set_monitoring(self, enabled):
+        return self.request('monitoring', enabled=enabled)
+
+    def shutdown(self):
+        """Asks the service to stop monitoring, save the summary and exit."""
+        return self.request('shutdown')
+
+    def close(self):
+        self._callback = None
+        if not self.closed:
+            try:
+                # The service closes its end, which ends our reader thread
+                self._send({'id': None, 'cmd': 'close'})
+            except ServiceUnavailable:
+                pass
+            self._reader.join(timeout=2)
+        _disconnect(self._conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
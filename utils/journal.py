@@ -0,0 +1,198 @@
+import os
+import json
+import glob
+import logging
+import datetime
+import threading
+
+JOURNAL_FILE = 'unique_devices_journal.jsonl'
+JOURNAL_STATE_FILE = 'unique_devices_journal.state'
+
+
+class DeviceJournal:
+    """
+    Append-only log of device state changes. Every record carries the new
+    absolute values of the fields it touched, so replaying a record twice is
+    harmless and the summary can always be rebuilt as snapshot + tail.
+
+    Layout in `directory`:
+        unique_devices_journal.jsonl        active segment (appended to)
+        unique_devices_journal.<N>.jsonl    sealed segments, kept as history
+        unique_devices_journal.state        {"snapshot_through": N}
+
+    Compaction seals the active segment as segment N, the caller writes a
+    snapshot containing everything up to N, then mark_snapshot(N) records
+    that startup only needs to replay segments after N.
+
+    Records are durable once commit() returns: append() only writes them,
+    so callers can append under their own lock and fsync outside it, and
+    concurrent commits share one fsync (group commit).
+    """
+
+    def __init__(self, directory, keep_segments=20):
+        self.directory = directory
+        self.keep_segments = keep_segments
+        self.path = os.path.join(directory, JOURNAL_FILE)
+        self.state_path = os.path.join(directory, JOURNAL_STATE_FILE)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock() # taken before _lock, never after
+        self._appended = 0 # records appended since opening
+        self._synced = 0   # records known to be on disk
+        self.snapshot_through = self._read_state()
+        sealed = self.sealed_segments()
+        self._next_segment = (sealed[-1][0] if sealed else self.snapshot_through) + 1
+        self.records_since_snapshot = 0
+        self._f = open(self.path, 'a', encoding='utf-8')
+
+    # ─── Segments & state ──────────────────────────────────────────────────
+    def _segment_path(self, number):
+        base, ext = os.path.splitext(self.path)
+        return f"{base}.{number}{ext}"
+
+    def sealed_segments(self):
+        """Returns [(number, path), ...] of sealed segments in order."""
+        base, ext = os.path.splitext(self.path)
+        segments = []
+        for path in glob.glob(f"{glob.escape(base)}.*{ext}"):
+            middle = path[len(base) + 1:-len(ext)]
+            if middle.isdigit():
+                segments.append((int(middle), path))
+        return sorted(segments)
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return int(json.load(f).get('snapshot_through', 0))
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            logging.error("Error reading journal state, replaying all segments: %s", e)
+            return 0
+
+    # ─── Appending ─────────────────────────────────────────────────────────
+    def append(self, device_id, event, changes):
+        """
+        Appends one record; cost is independent of how many devices are tracked.
+        The record is written but not yet durable; see commit().
+
+        Returns:
+            int: Records appended since the last snapshot.
+        """
+        record = {
+            'ts': datetime.datetime.now().isoformat(),
+            'dev': device_id,
+            'event': event,
+            'set': changes,
+        }
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._appended += 1
+            self.records_since_snapshot += 1
+            return self.records_since_snapshot
+
+    def commit(self):
+        """
+        fsyncs the active segment so every record appended so far survives a
+        power loss. A caller whose records another caller's fsync already
+        covered returns without syncing.
+        """
+        with self._lock:
+            target = self._appended
+        with self._sync_lock:
+            if self._synced >= target:
+                return
+            with self._lock:
+                fd = self._f.fileno()
+                target = self._appended
+            os.fsync(fd)
+            self._synced = target
+
+    # ─── Compaction ────────────────────────────────────────────────────────
+    def seal(self):
+        """
+        Closes the active segment and renames it to the next sealed segment.
+        Must be called while the summary being snapshotted is locked, so the
+        snapshot contains exactly the records sealed here.
+
+        Returns:
+            int: The sealed segment number the snapshot will cover.
+        """
+        with self._sync_lock, self._lock:
+            number = self._next_segment
+            os.fsync(self._f.fileno()) # a sealed segment is complete on disk
+            self._synced = self._appended
+            self._f.close()
+            if os.path.getsize(self.path):
+                os.replace(self.path, self._segment_path(number))
+                self._next_segment += 1
+            else:
+                number -= 1 # nothing new since the last seal
+            self._f = open(self.path, 'a', encoding='utf-8')
+            self.records_since_snapshot = 0
+            return number
+
+    def mark_snapshot(self, through):
+        """Records that the snapshot on disk covers all segments up to `through`."""
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'snapshot_through': through}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        self.snapshot_through = through
+
+        # Trim history beyond the retention limit
+        sealed = self.sealed_segments()
+        for number, path in sealed[:max(0, len(sealed) - self.keep_segments)]:
+            if number <= through:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning("Could not remove old journal segment %s: %s", path, e)
+
+    # ─── Reading ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _read_records(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-append; nothing after it is valid
+                        logging.warning("Skipping corrupt journal record %s:%s", path, line_no)
+                        return
+        except FileNotFoundError:
+            return
+
+    def replay(self, summary):
+        """
+        Applies every record newer than the last snapshot to `summary`.
+
+        Returns:
+            int: Number of records applied.
+        """
+        applied = 0
+        paths = [path for number, path in self.sealed_segments() if number > self.snapshot_through]
+        paths.append(self.path)
+        for path in paths:
+            for record in self._read_records(path):
+                summary.setdefault(record['dev'], {}).update(record.get('set', {}))
+                applied += 1
+        if applied:
+            logging.info("Replayed %s journal record(s) since the last snapshot.", applied)
+        return applied
+
+    def history(self, device_id=None):
+        """Yields retained journal records, oldest first, optionally for one device."""
+        paths = [path for _, path in self.sealed_segments()] + [self.path]
+        for path in paths:
+            for record in self._read_records(path):
+                if device_id is None or record.get('dev') == device_id:
+                    yield record
+
+    def close(self):
+        with self._sync_lock, self._lock:
+            self._f.close()
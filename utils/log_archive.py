@@ -0,0 +1,309 @@
+"""
+Rotation of the log into gzip-compressed, indexed segments, and a search
+across them that only decompresses what it needs.
+
+Layout next to usb_monitor.log:
+    usb_monitor.log           live log (appended to)
+    usb_monitor.<N>.log       rotated out, waiting for the archiver thread
+    usb_monitor.<N>.log.gz    archived segment
+    usb_monitor.<N>.log.idx   its index (JSON):
+        first, last   timestamps of the first and last line
+        blocks        [compressed offset, first, last] per IndexEvery lines;
+                      every block is a gzip member of its own, so a reader
+                      can seek to it and decompress just that block
+        devices       volume GUID -> numbers of the blocks that mention it
+
+    python -m utils.log_archive [--since T] [--until T] [--device ID] [--grep TEXT]
+"""
+import os
+import re
+import sys
+import glob
+import gzip
+import json
+import queue
+import logging
+import argparse
+import threading
+from logging.handlers import RotatingFileHandler
+
+from .config import SCRIPT_DIR, LOG_FILE, LOG_ARCHIVE_KEEP, LOG_INDEX_EVERY
+
+LOG_PATH = os.path.join(SCRIPT_DIR, LOG_FILE)
+
+# "%(asctime)s - ..." lines; the format sorts as text, so timestamps are compared as strings
+_TIMESTAMP_RE = re.compile(rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) ')
+_TIMESTAMP_STR_RE = re.compile(_TIMESTAMP_RE.pattern.decode('ascii'))
+_GUID_RE = re.compile(rb'\{([0-9A-Fa-f]{8}-(?:[0-9A-Fa-f]{4}-){3}[0-9A-Fa-f]{12})\}')
+# What --device may be given as: a device ID containing a GUID, or the bare GUID
+_DEVICE_GUID_RE = re.compile(r'([0-9A-Fa-f]{8}-(?:[0-9A-Fa-f]{4}-){3}[0-9A-Fa-f]{12})')
+
+
+def _segment_paths(log_path):
+    """Returns [(number, path), ...] of rotated segments, archived or not, oldest first."""
+    base, ext = os.path.splitext(log_path)
+    segments = {}
+    for path in glob.glob(f"{glob.escape(base)}.*{ext}") + glob.glob(f"{glob.escape(base)}.*{ext}.gz"):
+        middle = path[len(base) + 1:].split('.', 1)[0]
+        if middle.isdigit():
+            number = int(middle)
+            # Until the archiver removes the uncompressed file, it is the one to trust
+            if number not in segments or not path.endswith('.gz'):
+                segments[number] = path
+    return sorted(segments.items())
+
+
+def _parse_time(value):
+    """Accepts 'YYYY-MM-DD[ HH:MM[:SS[,mmm]]]' or its ISO 'T' form; any prefix will do."""
+    return value.strip().replace('T', ' ').replace('.', ',') if value else None
+
+
+def archive_segment(path, index_every=LOG_INDEX_EVERY):
+    """
+    Compresses a rotated log file into path + '.gz', writes its index and
+    removes the uncompressed file.
+
+    Returns:
+        dict: The index.
+    """
+    segment = path + '.gz'
+    blocks, devices = [], {}
+    first = last = None
+    lines = 0
+    with open(path, 'rb') as src, open(segment + '.tmp', 'wb') as out:
+        block, block_first, guids = [], None, set()
+
+        def flush():
+            number = len(blocks)
+            blocks.append([out.tell(), block_first, last])
+            out.write(gzip.compress(b''.join(block), mtime=0))
+            for guid in guids:
+                devices.setdefault(guid, []).append(number)
+
+        for line in src:
+            match = _TIMESTAMP_RE.match(line)
+            if match:
+                last = match.group(1).decode('ascii')
+                first = first or last
+            if not block:
+                block_first = last  # lines without a timestamp belong to the previous one's time
+            block.append(line)
+            guids.update(g.decode('ascii').lower() for g in _GUID_RE.findall(line))
+            lines += 1
+            if len(block) == index_every:
+                flush()
+                block, guids = [], set()
+        if block:
+            flush()
+        out.flush()
+        os.fsync(out.fileno())
+    index = {'first': first, 'last': last, 'lines': lines, 'index_every': index_every,
+             'blocks': blocks, 'devices': devices}
+    os.replace(segment + '.tmp', segment)
+    with open(segment[:-len('.gz')] + '.idx.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(segment[:-len('.gz')] + '.idx.tmp', segment[:-len('.gz')] + '.idx')
+    os.remove(path)
+    return index
+
+
+def prune_segments(log_path, keep=LOG_ARCHIVE_KEEP):
+    """Deletes the oldest archived segments beyond `keep` (0 keeps everything)."""
+    if not keep:
+        return
+    archived = [path for _, path in _segment_paths(log_path) if path.endswith('.gz')]
+    for path in archived[:max(0, len(archived) - keep)]:
+        for victim in (path, path[:-len('.gz')] + '.idx'):
+            try:
+                os.remove(victim)
+            except FileNotFoundError:
+                pass
+        logging.info("Removed archived log segment %s", os.path.basename(path))
+
+
+class LogArchiver:
+    """
+    Background thread that archives rotated log files one at a time, so the
+    thread that rotated only pays for a rename.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, path, log_path, index_every=LOG_INDEX_EVERY, keep=LOG_ARCHIVE_KEEP):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-archiver", daemon=True)
+                self._thread.start()
+        self._queue.put((path, log_path, index_every, keep))
+
+    def wait(self):
+        """Blocks until every submitted file has been archived."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            path, log_path, index_every, keep = self._queue.get()
+            try:
+                archive_segment(path, index_every)
+                prune_segments(log_path, keep)
+            except Exception as e:
+                # The file stays as it is and is picked up again on the next start
+                logging.error("Could not archive log segment %s: %s", path, e)
+            finally:
+                self._queue.task_done()
+
+# Shared by every ArchivingFileHandler
+archiver = LogArchiver()
+
+
+class ArchivingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that keeps what it rotates out: the full log is
+    renamed to the next usb_monitor.<N>.log and handed to the archiver.
+    Rotated files a previous run did not get to archive are queued on start.
+    """
+
+    def __init__(self, filename, maxBytes, keep=LOG_ARCHIVE_KEEP, index_every=LOG_INDEX_EVERY, **kwargs):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=0, **kwargs)
+        self.keep = keep
+        self.index_every = index_every
+        for _, path in _segment_paths(self.baseFilename):
+            if not path.endswith('.gz'):
+                archiver.submit(path, self.baseFilename, index_every, keep)
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        segments = _segment_paths(self.baseFilename)
+        base, ext = os.path.splitext(self.baseFilename)
+        target = f"{base}.{segments[-1][0] + 1 if segments else 1}{ext}"
+        try:
+            os.replace(self.baseFilename, target)
+        except OSError as e:
+            # e.g. another process has the file open on Windows; keep appending
+            target = None
+            sys.stderr.write(f"Cannot rotate {self.baseFilename}: {e}\n")
+        if not self.delay:
+            self.stream = self._open()
+        if target:
+            archiver.submit(target, self.baseFilename, self.index_every, self.keep)
+
+
+class LogArchive:
+    """Searches the archived segments, any not yet archived and the live log, oldest first."""
+
+    def __init__(self, log_path=LOG_PATH):
+        self.log_path = log_path
+        self._stats = {}
+
+    def stats(self):
+        """What the last search read: segments skipped by their index, blocks and bytes decompressed."""
+        return dict(self._stats)
+
+    def search(self, since=None, until=None, device=None, text=None):
+        """
+        Yields matching log lines (str, without the newline).
+
+        Args:
+            since, until (str): Time range, inclusive; a prefix such as
+                                '2024-05-01 14' covers the whole hour.
+            device (str): A device ID or volume GUID; GUIDs are found through
+                          the index, anything else is matched as text.
+            text (str): Only lines containing this text.
+        """
+        since, until = _parse_time(since), _parse_time(until)
+        guid_match = _DEVICE_GUID_RE.search(device) if device else None
+        guid = guid_match.group(1).lower() if guid_match else None
+        needle = guid or device
+        self._stats = {'segments': 0, 'segments_skipped': 0, 'blocks_read': 0, 'bytes_decompressed': 0}
+
+        def in_range(first, last):
+            return ((since is None or last is None or last >= since) and
+                    (until is None or first is None or first[:len(until)] <= until))
+
+        timed = since is not None or until is not None
+
+        def matching(data, stamp):
+            for line in data.decode('utf-8', 'replace').splitlines():
+                if timed:
+                    if line[:1].isdigit() and _TIMESTAMP_STR_RE.match(line):
+                        stamp = line[:23]
+                    if stamp is not None and not in_range(stamp, stamp):
+                        continue
+                if needle and needle not in (line.lower() if guid else line):
+                    continue
+                if text and text not in line:
+                    continue
+                yield line
+
+        for _, path in _segment_paths(self.log_path) + [(None, self.log_path)]:
+            self._stats['segments'] += 1
+            index = self._load_index(path) if path.endswith('.gz') else None
+            if index is None:
+                yield from self._scan(path, matching)
+                continue
+            if not in_range(index['first'], index['last']):
+                self._stats['segments_skipped'] += 1
+                continue
+            wanted = range(len(index['blocks']))
+            if guid:
+                wanted = index['devices'].get(guid, [])
+            wanted = [n for n in wanted if in_range(*index['blocks'][n][1:])]
+            if not wanted:
+                self._stats['segments_skipped'] += 1
+                continue
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                for n in wanted:
+                    offset, first, _ = index['blocks'][n]
+                    end = index['blocks'][n + 1][0] if n + 1 < len(index['blocks']) else size
+                    f.seek(offset)
+                    data = gzip.decompress(f.read(end - offset))
+                    self._stats['blocks_read'] += 1
+                    self._stats['bytes_decompressed'] += len(data)
+                    yield from matching(data, first)
+
+    def _load_index(self, path):
+        try:
+            with open(path[:-len('.gz')] + '.idx', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _scan(self, path, matching):
+        """Reads a file without an index (the live log, or a segment not yet archived) in full."""
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        self._stats['bytes_decompressed'] += len(data) if path.endswith('.gz') else 0
+        yield from matching(data, None)
+
+
+def search_logs(since=None, until=None, device=None, text=None, log_path=LOG_PATH):
+    """Convenience wrapper: LogArchive(log_path).search(...) as a list."""
+    return list(LogArchive(log_path).search(since, until, device, text))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Search the live and archived USB monitor logs.")
+    ap.add_argument("--since", help="start time, e.g. '2024-05-01 14:00'")
+    ap.add_argument("--until", help="end time, inclusive; a prefix covers the whole minute/hour/day")
+    ap.add_argument("--device", help="device ID or volume GUID")
+    ap.add_argument("--grep", help="only lines containing this text")
+    ap.add_argument("--log", default=LOG_PATH, help="live log file whose archive to search")
+    args = ap.parse_args()
+    archive = LogArchive(args.log)
+    count = 0
+    for line in archive.search(args.since, args.until, args.device, args.grep):
+        print(line)
+        count += 1
+    stats = archive.stats()
+    print(f"{count} line(s); {stats['segments_skipped']} of {stats['segments']} file(s) skipped by index, "
+          f"{stats['blocks_read']} block(s) decompressed", file=sys.stderr)
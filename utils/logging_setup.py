@@ -1,11 +1,53 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from .config import LOG_FILE
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from .config import LOG_FILE, LOG_MODE, LOG_ARCHIVE
+from .log_archive import ArchivingFileHandler
 
-def setup_logging():
+# Handlers added by the host process (e.g. the monitor service's log stream);
+# setup_logging() re-attaches them after replacing the root handlers
+_extra_handlers = []
+
+# Thread running the console and file handlers in 'queue' mode
+_listener = None
+
+def add_log_handler(handler):
+    """Attaches `handler` to the root logger now and on every later setup_logging()."""
+    if handler not in _extra_handlers:
+        _extra_handlers.append(handler)
     logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    logger.setLevel(min(logger.getEffectiveLevel(), handler.level or logging.DEBUG))
+
+def remove_log_handler(handler):
+    if handler in _extra_handlers:
+        _extra_handlers.remove(handler)
+    logging.getLogger().removeHandler(handler)
+
+def stop_log_listener():
+    """Writes out queued records, then stops the 'queue' mode listener thread and closes its handlers."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def setup_logging(mode=LOG_MODE, log_path=None):
+    """
+    Logs INFO and above to the console and a rotating file.
+
+    mode 'direct' attaches both handlers to the root logger, so every call
+    writes on the calling thread. 'queue' attaches a QueueHandler instead and
+    runs the handlers on a QueueListener thread: the caller only merges the
+    message with its arguments (so a dict passed as an argument is captured
+    as it was) and enqueues it.
+    """
+    global _listener
+    logger = logging.getLogger()
+    stop_log_listener()
     
     # console
     ch = logging.StreamHandler()
@@ -13,19 +55,38 @@ def setup_logging():
     ch.setFormatter(logging.Formatter("CONSOLE: %(levelname)s - %(message)s"))
     
     # Compute absolute path: go up one level from utils/, into USBLogger_Windows/
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    log_path = os.path.join(base_dir, LOG_FILE)
+    if log_path is None:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        log_path = os.path.join(base_dir, LOG_FILE)
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
     
-    # rotating file
-    fh = RotatingFileHandler(log_path, maxBytes=5*1024*1024, backupCount=0)
+    # rotating file; with archiving on, rotated logs are compressed and indexed (utils/log_archive.py)
+    if LOG_ARCHIVE:
+        fh = ArchivingFileHandler(log_path, maxBytes=5*1024*1024)
+    else:
+        fh = RotatingFileHandler(log_path, maxBytes=5*1024*1024, backupCount=0)
     fh.setLevel(logging.INFO)
     fh.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
     
     logger.handlers.clear()
-    logger.addHandler(ch)
-    logger.addHandler(fh)
+    if mode == 'queue':
+        records = queue.SimpleQueue()
+        _listener = QueueListener(records, ch, fh, respect_handler_level=True)
+        _listener.start()
+        logger.addHandler(QueueHandler(records))
+    else:
+        logger.addHandler(ch)
+        logger.addHandler(fh)
+    for handler in _extra_handlers:
+        logger.addHandler(handler)
+
+    # No more verbose than the most verbose handler: a filtered-out debug call
+    # then returns before a record is built or its arguments are formatted
+    levels = [ch.level, fh.level] + [handler.level or logging.DEBUG for handler in _extra_handlers]
+    logger.setLevel(min(levels))
     
-    return logger
\ No newline at end of file
+    return logger
+
+atexit.register(stop_log_listener)
\ No newline at end of file
@@ -0,0 +1,331 @@
+import time, bisect, logging, threading, functools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stage latencies range from sub-millisecond (auth read) to the mount timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _round(value):
+    return None if value is None else round(value, 6)
+
+
+class _Metric:
+    """Base for a metric family: one child per combination of label values."""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Returns the child for these label values, creating it on first use."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self._children[()]
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (events handled, auth outcomes, ...)."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _format_labels(self.labelnames, values), child.value
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value # a single store; no lock needed
+
+
+class Gauge(_Metric):
+    """Point-in-time value (queue depth, ...)."""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _format_labels(self.labelnames, values), child.value
+
+
+class _Timer:
+    # A plain class rather than @contextmanager: no generator per timed block
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Observes the monotonic duration of the with-block, even if it raises."""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Estimates the q-quantile by linear interpolation inside the matching bucket."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                lower = self._bounds[i - 1] if i else 0.0
+                if i == len(self._bounds):
+                    return lower # +Inf bucket: the best we can say is "at least"
+                return lower + (self._bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self._bounds[-1]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket latency histogram; observe() is a bisect plus one short lock."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total, sum_ = list(child.counts), child.count, child.sum
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield self.name + '_bucket', _format_labels(self.labelnames, values, [('le', le)]), cumulative
+            labels = _format_labels(self.labelnames, values)
+            yield self.name + '_sum', labels, sum_
+            yield self.name + '_count', labels, total
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them as a snapshot dict or Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: metric name -> {label values joined by ',' -> value}. Histogram
+                  values are {'count', 'sum', 'p50', 'p95', 'p99'} in seconds.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snap = {}
+        for metric in metrics:
+            series = {}
+            for values, child in list(metric._children.items()):
+                key = ','.join(values)
+                if isinstance(metric, Histogram):
+                    series[key] = {'count': child.count, 'sum': round(child.sum, 6),
+                                   **{f"p{int(q * 100)}": _round(child.quantile(q)) for q in (0.5, 0.95, 0.99)}}
+                else:
+                    series[key] = child.value
+            snap[metric.name] = series
+        return snap
+
+
+# ─── Monitor metrics ───────────────────────────────────────────────────────
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    'usb_stage_seconds', 'Time spent in each handler stage.', ('stage',))
+events_total = registry.counter(
+    'usb_events_total', 'Device events dispatched, by type.', ('type',))
+auth_total = registry.counter(
+    'usb_auth_total', 'Authorization outcomes.', ('outcome',))
+eject_total = registry.counter(
+    'usb_eject_total', 'Eject attempt outcomes.', ('outcome',))
+admission_total = registry.counter(
+    'usb_admission_total', 'Admission cache lookups for arriving devices.', ('result',))
+debounce_total = registry.counter(
+    'usb_debounce_total', 'Events held back, released or flagged by the debouncer.', ('action',))
+queue_depth = registry.gauge(
+    'usb_queue_depth', 'Events waiting for the dispatcher or a worker.')
+queue_high_water = registry.gauge(
+    'usb_queue_high_water', 'Most events ever waiting in the event queue at once.')
+queue_wait_seconds = registry.histogram(
+    'usb_queue_wait_seconds', 'Time events spend in the event queue before dispatch.')
+queue_overflow_total = registry.counter(
+    'usb_queue_overflow_total', 'Events put into a full event queue, by how room was made.', ('action',))
+service_clients = registry.gauge(
+    'usb_service_clients', 'Clients attached to the monitor service.')
+service_resync_total = registry.counter(
+    'usb_service_resync_total', 'Times a slow service client was sent a fresh snapshot instead of its backlog.')
+
+def stage(name):
+    """Context manager timing one handler stage into usb_stage_seconds{stage=name}."""
+    return stage_seconds.labels(name).time()
+
+def timed(name):
+    """Decorator timing every call of the function as stage `name`."""
+    def decorate(fn):
+        child = stage_seconds.labels(name)
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def snapshot():
+    """Current values of all monitor metrics; see MetricsRegistry.snapshot."""
+    return registry.snapshot()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("metrics: " + format, *args)
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """
+    Serves GET /metrics on a daemon thread, bound to localhost only.
+
+    Returns:
+        ThreadingHTTPServer: Call shutdown() and server_close() to stop it, or
+                             None if the port could not be bound.
+    """
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.error("Cannot start metrics endpoint on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info("Metrics available at http://%s:%s/metrics", host, server.server_address[1])
+    return server
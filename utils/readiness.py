@@ -0,0 +1,215 @@
+import os
+import re
+import sys
+import time
+import select
+import asyncio
+import logging
+
+from .config import MOUNT_READY_TIMEOUT, MOUNT_PROBE_INITIAL, MOUNT_PROBE_MAX_INTERVAL
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+
+# Weight given to the newest observation when updating a device's learned time-to-ready
+LEARN_ALPHA = 0.5
+
+
+def _unescape_mount_field(field):
+    # mountinfo escapes space, tab, newline and backslash as octal (\040 etc.)
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), field)
+
+def find_mount(devnode, mountinfo_path=MOUNTINFO_PATH):
+    """Returns (mount point, filesystem type) for `devnode` (e.g. /dev/sdb1) from mountinfo, or None."""
+    try:
+        with open(mountinfo_path) as f:
+            for line in f:
+                pre, sep, post = line.partition(' - ')
+                if not sep:
+                    continue
+                post_fields = post.split()
+                if len(post_fields) >= 2 and post_fields[1] == devnode:
+                    return _unescape_mount_field(pre.split()[4]), post_fields[0]
+    except OSError as e:
+        logging.debug("Cannot read %s: %s", mountinfo_path, e)
+    return None
+
+def find_mount_point(devnode, mountinfo_path=MOUNTINFO_PATH):
+    """Returns where `devnode` is mounted, or None."""
+    mount = find_mount(devnode, mountinfo_path)
+    return mount[0] if mount else None
+
+def volume_root(drive_letter):
+    """
+    Maps what an event source reports as the drive to the directory holding its files:
+    "E:" -> "E:\\", a Linux device node -> its current mount point (None while
+    unmounted), anything else (e.g. a directory standing in for a drive) -> itself.
+    """
+    if len(drive_letter) == 2 and drive_letter.endswith(':'):
+        return drive_letter + '\\'
+    if drive_letter.startswith('/dev/'):
+        return find_mount_point(drive_letter)
+    return drive_letter
+
+def is_volume_readable(root):
+    """
+    Returns True once the volume root can actually be listed. A drive letter
+    can exist before the filesystem behind it answers, so existence alone
+    is not enough.
+    """
+    try:
+        with os.scandir(root) as it:
+            next(it, None)
+        return True
+    except OSError:
+        return False
+
+
+class _MountTableWatcher:
+    """
+    Wakes up early when the kernel mount table changes. On Linux the kernel
+    flags /proc/self/mountinfo with POLLPRI/POLLERR on every mount/unmount;
+    elsewhere wait() is a plain sleep.
+    """
+
+    def __init__(self):
+        self._fd = None
+        self._poller = None
+        if sys.platform.startswith('linux') and hasattr(select, 'poll'):
+            try:
+                self._fd = os.open(MOUNTINFO_PATH, os.O_RDONLY)
+                self._poller = select.poll()
+                self._poller.register(self._fd, select.POLLPRI | select.POLLERR)
+                os.read(self._fd, 1 << 16) # consume the current state so only changes wake us
+            except OSError as e:
+                logging.debug("Cannot watch %s, falling back to timed probes: %s", MOUNTINFO_PATH, e)
+                self.close()
+
+    def wait(self, timeout):
+        if self._poller is None:
+            time.sleep(timeout)
+            return False
+        changed = bool(self._poller.poll(timeout * 1000))
+        if changed:
+            # Re-arm: the event stays raised until the file is re-read from the start
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            while os.read(self._fd, 1 << 16):
+                pass
+        return changed
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+        self._poller = None
+
+
+def wait_for_mount(root, estimate=None, timeout=MOUNT_READY_TIMEOUT, stop_event=None):
+    """
+    Actively probes `root` until its filesystem is readable, backing off
+    exponentially between probes up to MountProbeMaxInterval. A Linux device
+    node is resolved to its mount point on every probe, so the wait also
+    covers the time until the desktop/automounter mounts it.
+
+    Args:
+        root (str): Volume root or drive to probe (e.g. "E:\\", "/dev/sdb1").
+        estimate (float): Learned time-to-ready for this device in seconds, if any.
+                          If the immediate probe fails, the next one is deferred
+                          to just under the estimate.
+        timeout (float): Ceiling on the total wait in seconds.
+        stop_event (threading.Event): Aborts the wait early when set.
+
+    Returns:
+        float: Seconds until the volume was readable, or None on timeout/stop.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = MOUNT_PROBE_INITIAL
+
+    # Fast path: most volumes are already readable when the arrival is handled.
+    # Always taken, so a device that mounted slowly once can show it is fast again.
+    path = volume_root(root)
+    if path is not None and is_volume_readable(path):
+        logging.info("Volume %s readable immediately.", root)
+        return time.monotonic() - start
+
+    watcher = _MountTableWatcher()
+    try:
+        # A device that has always needed ~2s gains nothing from probing at 0.1s
+        if estimate:
+            watcher.wait(max(0, min(start + estimate * 0.9, deadline) - time.monotonic()))
+
+        attempt = 1
+        while True:
+            attempt += 1
+            path = volume_root(root)
+            if path is not None and is_volume_readable(path):
+                elapsed = time.monotonic() - start
+                logging.info("Volume %s readable after %.2fs (%s probe(s)).", root, elapsed, attempt)
+                return elapsed
+            if stop_event is not None and stop_event.is_set():
+                logging.info("Stopped waiting for %s to mount.", root)
+                return None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning("Volume %s not readable after %ss (%s probe(s)).", root, timeout, attempt)
+                return None
+            logging.debug("Volume %s not ready (probe %s); next probe in %.2fs", root, attempt, min(delay, remaining))
+            watcher.wait(min(delay, remaining))
+            delay = min(delay * 2, MOUNT_PROBE_MAX_INTERVAL)
+    finally:
+        watcher.close()
+
+
+async def wait_for_mount_async(root, estimate=None, timeout=MOUNT_READY_TIMEOUT, stop_event=None, executor=None):
+    """
+    wait_for_mount() for the asyncio monitor: each probe (which may block on
+    a slow volume) runs in `executor`, and the pauses between probes are loop
+    timers, so a device that takes seconds to mount holds no thread while it
+    waits. Mount-table change notifications are not used; probes follow the
+    same exponential backoff.
+
+    Returns:
+        float: Seconds until the volume was readable, or None on timeout/stop.
+    """
+    loop = asyncio.get_running_loop()
+
+    def probe():
+        path = volume_root(root)
+        return path is not None and is_volume_readable(path)
+
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = MOUNT_PROBE_INITIAL
+
+    if await loop.run_in_executor(executor, probe):
+        logging.info("Volume %s readable immediately.", root)
+        return time.monotonic() - start
+    if estimate:
+        await asyncio.sleep(max(0, min(start + estimate * 0.9, deadline) - time.monotonic()))
+
+    attempt = 1
+    while True:
+        attempt += 1
+        if await loop.run_in_executor(executor, probe):
+            elapsed = time.monotonic() - start
+            logging.info("Volume %s readable after %.2fs (%s probe(s)).", root, elapsed, attempt)
+            return elapsed
+        if stop_event is not None and stop_event.is_set():
+            logging.info("Stopped waiting for %s to mount.", root)
+            return None
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.warning("Volume %s not readable after %ss (%s probe(s)).", root, timeout, attempt)
+            return None
+        logging.debug("Volume %s not ready (probe %s); next probe in %.2fs", root, attempt, min(delay, remaining))
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, MOUNT_PROBE_MAX_INTERVAL)
+
+
+def learn_estimate(previous, observed):
+    """Blends a new time-to-ready observation into a device's learned estimate."""
+    if not previous:
+        return round(observed, 3)
+    return round(LEARN_ALPHA * observed + (1 - LEARN_ALPHA) * previous, 3)
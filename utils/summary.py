@@ -1,27 +1,407 @@
-import os, json, logging
-from .config import SCRIPT_DIR
+import os, json, logging, threading, time, copy
+from types import MappingProxyType
+from .config import (SCRIPT_DIR, SUMMARY_WRITE_WINDOW, SUMMARY_WRITE_MAX_DELAY,
+                     JOURNAL_COMPACT_EVERY, JOURNAL_COMPACT_INTERVAL, SUMMARY_BACKEND)
+from .device_store import SqliteDeviceStore, entry_row
+from .metrics import stage
 
 SUMMARY_FILE = 'unique_devices_summary.json'
+SUMMARY_DB_FILE = 'unique_devices_summary.db'
+
+# Guards the in-memory summary dict: handlers running on different dispatcher
+# workers mutate their own entries while save_summary serialises all of them.
+summary_lock = threading.RLock()
+
+# Serialises writers of the summary file so an older snapshot never lands last
+_write_lock = threading.Lock()
+
+# Change version: bumped on every recorded change and stamped onto the changed
+# entry as entry['version'], so readers can tell what moved since they last looked
+_version = 0
+
+_store = None
+_store_lock = threading.Lock()
+
+# Callables notified of every recorded change as listener(device_id, event, entry)
+_change_listeners = []
+
+def get_store():
+    """Returns the shared SQLite store when Backend = sqlite, else None. Opened (and migrated) on first use."""
+    global _store
+    if SUMMARY_BACKEND != 'sqlite':
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SqliteDeviceStore(os.path.join(SCRIPT_DIR, SUMMARY_DB_FILE))
+            _store.migrate_from_json(os.path.join(SCRIPT_DIR, SUMMARY_FILE))
+        return _store
 
 def load_summary():
+    store = get_store()
+    if store is not None:
+        try:
+            data = store.load_all()
+            logging.debug("Loaded summary from database (%s)", len(data))
+            return data
+        except Exception as e:
+            logging.error("Error loading summary from database: %s", e)
+            return {}
     path = os.path.join(SCRIPT_DIR, SUMMARY_FILE)
     try:
         with open(path) as f:
             data = json.load(f)
-            logging.debug(f"Loaded summary ({len(data)})")
+            logging.debug("Loaded summary (%s)", len(data))
             return data
     except FileNotFoundError:
         logging.info("No summary file found; starting fresh.")
         return {}
     except Exception as e:
-        logging.error(f"Error loading summary: {e}")
+        logging.error("Error loading summary: %s", e)
         return {}
 
-def save_summary(summary):
+def get_device(device_id):
+    """
+    Reads one device's summary entry. Served from the in-memory cache while the
+    monitor runs in this process; otherwise a single indexed lookup with the
+    SQLite backend, or the revalidated file cache with the JSON backend.
+    """
+    store = get_store()
+    if store is not None and _persister is None:
+        try:
+            return store.get(device_id)
+        except Exception as e:
+            logging.error("Error reading %s from database: %s", device_id, e)
+            return None
+    return summary_cache.get_device(device_id)
+
+def _atomic_write(path, data):
+    """Writes bytes to a temp file beside `path`, fsyncs it and renames it over `path`."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _save_to_store(store, summary, journal, device_ids):
+    with _write_lock:
+        with summary_lock:
+            ids = list(summary) if device_ids is None else [d for d in device_ids if d in summary]
+            rows = [entry_row(d, summary[d]) for d in ids]
+            sealed = journal.seal() if journal is not None else None
+        store.upsert_rows(rows)
+        if journal is not None:
+            journal.mark_snapshot(sealed)
+    written = sum(len(row[-1]) for row in rows)
+    logging.debug("Saved %s summary entr(ies) to database (%s bytes)", len(rows), written)
+    return written
+
+def save_summary(summary, journal=None, device_ids=None):
+    """
+    Serialises the summary compactly and atomically replaces the summary file,
+    so a crash mid-write leaves the previous version intact. With the SQLite
+    backend only the entries in `device_ids` (all when None) are upserted.
+
+    With a journal, the file is written as a snapshot: the active journal
+    segment is sealed in the same critical section as the dump, and the
+    journal is told the snapshot covers it once the file is on disk.
+
+    Returns:
+        int: Number of bytes written (0 when there was nothing to upsert), or None on error.
+    """
+    with stage('save_summary'):
+        return _save_summary(summary, journal, device_ids)
+
+def _save_summary(summary, journal, device_ids):
     path = os.path.join(SCRIPT_DIR, SUMMARY_FILE)
     try:
-        with open(path, 'w') as f:
-            json.dump(summary, f, indent=2, default=str)
-        logging.debug(f"Saved summary ({len(summary)})")
+        store = get_store()
+        if store is not None:
+            return _save_to_store(store, summary, journal, device_ids)
+        with _write_lock:
+            # Hold the summary lock only while dumping so no worker mutates an entry mid-dump
+            with summary_lock:
+                payload = json.dumps(summary, separators=(',', ':'), default=str).encode('utf-8')
+                sealed = journal.seal() if journal is not None else None
+            _atomic_write(path, payload)
+            if journal is not None:
+                journal.mark_snapshot(sealed)
+        logging.debug("Saved summary (%s, %s bytes)", len(summary), len(payload))
+        return len(payload)
     except Exception as e:
-        logging.critical(f"Error saving summary: {e}")
+        logging.critical("Error saving summary: %s", e)
+        return None
+
+
+class SummaryPersister:
+    """
+    Write-behind persistence for the in-memory summary. Handlers call
+    mark_dirty() after each change; a background thread writes the file once
+    no further change has arrived for `window` seconds, but never later than
+    `max_delay` seconds after the first unsaved change.
+
+    With a journal every change is already durable once record_change has
+    returned (the journal is fsynced), so the file only needs to be
+    rewritten as a periodic compaction snapshot.
+    """
+
+    def __init__(self, summary, window=SUMMARY_WRITE_WINDOW, max_delay=SUMMARY_WRITE_MAX_DELAY, journal=None):
+        self.summary = summary
+        self.journal = journal
+        if journal is not None:
+            window = max_delay = JOURNAL_COMPACT_INTERVAL
+        self.window = window
+        self.max_delay = max(max_delay, window)
+        self._cond = threading.Condition()
+        self._first_dirty = None # monotonic time of the oldest unsaved change
+        self._last_dirty = None  # monotonic time of the newest unsaved change
+        self._dirty_ids = set()  # devices changed since the last write; None means all
+        self._stopping = False
+        # Write-amplification counters
+        self.events = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self._thread = threading.Thread(target=self._run, name="summary-persister", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, device_id=None, urgent=False):
+        """
+        Records an unsaved change to `device_id` (or to the whole summary when
+        None); `urgent` writes on the next cycle without coalescing.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self.events += 1
+            if device_id is None:
+                self._dirty_ids = None
+            elif self._dirty_ids is not None:
+                self._dirty_ids.add(device_id)
+            if self._first_dirty is None:
+                self._first_dirty = now
+            if urgent:
+                self._first_dirty = now - self.max_delay
+            self._last_dirty = now
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._first_dirty is None and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                # Coalesce: wait for a quiet window, bounded by max_delay
+                while not self._stopping and self._first_dirty is not None:
+                    now = time.monotonic()
+                    due = min(self._last_dirty + self.window, self._first_dirty + self.max_delay)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Writes the summary now if it has unsaved changes."""
+        with self._cond:
+            if self._first_dirty is None:
+                return
+            self._first_dirty = self._last_dirty = None
+            dirty_ids, self._dirty_ids = self._dirty_ids, set()
+        written = save_summary(self.summary, self.journal, dirty_ids)
+        with self._cond:
+            if written is None:
+                # Keep the changes pending so the next cycle retries the write
+                now = time.monotonic()
+                self._first_dirty = self._first_dirty or now
+                self._last_dirty = self._last_dirty or now
+                if dirty_ids is None or self._dirty_ids is None:
+                    self._dirty_ids = None
+                else:
+                    self._dirty_ids |= dirty_ids
+                return
+            self.writes += 1
+            self.bytes_written += written
+
+    def stop(self):
+        """Stops the background thread and writes any pending changes."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'events': self.events,
+                'writes': self.writes,
+                'bytes_written': self.bytes_written,
+                'bytes_per_event': self.bytes_written / self.events if self.events else 0.0,
+            }
+
+
+_persister = None
+
+def start_persister(summary, journal=None):
+    """Starts write-behind persistence for `summary`, replacing any previous persister."""
+    global _persister, _version
+    stop_persister()
+    # Resume numbering above every persisted entry version so versions never repeat
+    with summary_lock:
+        _version = max([_version] + [entry.get('version', 0) for entry in summary.values()])
+    _persister = SummaryPersister(summary, journal=journal)
+    return _persister
+
+def stop_persister():
+    """Flushes pending changes and stops the active persister, if any."""
+    global _persister
+    if _persister is not None:
+        _persister.stop()
+        if _persister.journal is not None:
+            _persister.journal.close()
+        logging.info("Summary persister stopped: %s", _persister.stats())
+        _persister = None
+
+def mark_summary_dirty(summary, device_id=None):
+    """Schedules a write of `summary`; writes synchronously if no persister is running for it."""
+    if _persister is not None and _persister.summary is summary:
+        _persister.mark_dirty(device_id)
+    else:
+        save_summary(summary, device_ids=None if device_id is None else [device_id])
+
+def summary_version():
+    """Current change version of the in-memory summary; unchanged means nothing moved."""
+    return _version
+
+def _stamp_version(summary, device_id):
+    global _version
+    with summary_lock:
+        entry = summary.get(device_id)
+        if entry is None:
+            return None
+        _version += 1
+        entry['version'] = _version
+        return entry
+
+def record_change(summary, device_id, event, *keys):
+    """
+    Stamps the device's summary entry with a new change version, journals the
+    current values of `keys` as an `event` record (when journaling is on) and
+    schedules a summary write. Call it after mutating the entry.
+    """
+    persister = _persister if _persister is not None and _persister.summary is summary else None
+    if persister is not None and persister.journal is not None:
+        with summary_lock:
+            entry = _stamp_version(summary, device_id)
+            if entry is None:
+                return
+            changes = {key: entry[key] for key in keys + ('version',) if key in entry}
+            pending = persister.journal.append(device_id, event, changes)
+        # fsync outside the summary lock so workers' commits can share one sync
+        persister.journal.commit()
+        persister.mark_dirty(device_id, urgent=pending >= JOURNAL_COMPACT_EVERY)
+    else:
+        _stamp_version(summary, device_id)
+        mark_summary_dirty(summary, device_id)
+    if _change_listeners:
+        _notify_change(summary, device_id, event)
+
+def add_change_listener(listener):
+    """Calls listener(device_id, event, entry) after every record_change; `entry` is a private copy."""
+    _change_listeners.append(listener)
+
+def remove_change_listener(listener):
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+def _notify_change(summary, device_id, event):
+    with summary_lock:
+        entry = summary.get(device_id)
+        if entry is None:
+            return
+        entry = copy.deepcopy(entry)
+    for listener in list(_change_listeners):
+        try:
+            listener(device_id, event, entry)
+        except Exception as e:
+            logging.error("Summary change listener failed for %s: %s", device_id, e)
+
+def flush_summary():
+    """Writes any pending summary changes immediately."""
+    if _persister is not None:
+        _persister.flush()
+
+def persister_stats():
+    return _persister.stats() if _persister is not None else {}
+
+
+class SummaryCache:
+    """
+    Read-through cache of the summary for readers such as the GUI. get()
+    returns an immutable snapshot that is only rebuilt when the source moves:
+    in process, while the monitor's persister is running, the source is the
+    live summary and validity is the change version; out of process it is
+    the file on disk and validity is its mtime and size. On a rebuild only
+    entries whose version changed are copied again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._entries = {}  # device_id -> (version, private copy of the entry)
+        self._snapshot = MappingProxyType({})
+        self.hits = 0
+        self.misses = 0
+
+    def _source(self):
+        persister = _persister
+        if persister is not None:
+            return ('memory', id(persister.summary), _version), persister.summary
+        path = os.path.join(SCRIPT_DIR, SUMMARY_DB_FILE if SUMMARY_BACKEND == 'sqlite' else SUMMARY_FILE)
+        try:
+            st = os.stat(path)
+            # SQLite commits land in the -wal file first
+            wal = os.stat(f"{path}-wal") if SUMMARY_BACKEND == 'sqlite' and os.path.exists(f"{path}-wal") else None
+            return ('file', path, st.st_mtime_ns, st.st_size,
+                    wal and wal.st_mtime_ns, wal and wal.st_size), None
+        except OSError:
+            return ('file', path, None), None
+
+    def get(self):
+        """Returns a read-only mapping of device_id -> entry. Treat entries as read-only too."""
+        key, live = self._source()
+        with self._lock:
+            if key == self._key:
+                self.hits += 1
+                return self._snapshot
+            self.misses += 1
+
+            if live is not None:
+                with summary_lock:
+                    entries = {}
+                    for device_id, entry in live.items():
+                        version = entry.get('version')
+                        cached = self._entries.get(device_id)
+                        if cached is not None and cached[0] == version:
+                            entries[device_id] = cached
+                        else:
+                            entries[device_id] = (version, copy.deepcopy(entry))
+            else:
+                # A freshly parsed file is already private to us; no copy needed
+                entries = {device_id: (entry.get('version'), entry) for device_id, entry in load_summary().items()}
+
+            self._entries = entries
+            self._snapshot = MappingProxyType({device_id: entry for device_id, (_, entry) in entries.items()})
+            self._key = key
+            return self._snapshot
+
+    def get_device(self, device_id):
+        return self.get().get(device_id)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+summary_cache = SummaryCache()
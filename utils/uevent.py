@@ -0,0 +1,159 @@
+import os
+import socket
+import logging
+
+# From <linux/netlink.h>; not exported by the socket module
+NETLINK_KOBJECT_UEVENT = 15
+# Multicast group the kernel itself sends to (group 2 is udev's re-broadcast)
+KERNEL_UEVENT_GROUP = 1
+
+SYS_ROOT = '/sys'
+
+
+def parse_uevent(payload):
+    """
+    Parses one kernel uevent datagram ("ACTION@DEVPATH\\0KEY=VALUE\\0...").
+
+    Returns:
+        dict: The KEY=VALUE properties, or None for anything that is not a
+              kernel uevent (e.g. udev's "libudev" re-broadcasts).
+    """
+    if not payload or payload.startswith(b'libudev'):
+        return None
+    fields = payload.rstrip(b'\0').split(b'\0')
+    header = fields[0].decode('utf-8', errors='replace')
+    if '@' not in header:
+        return None
+    props = {}
+    for field in fields[1:]:
+        key, sep, value = field.decode('utf-8', errors='replace').partition('=')
+        if sep:
+            props[key] = value
+    props.setdefault('ACTION', header.split('@', 1)[0])
+    props.setdefault('DEVPATH', header.split('@', 1)[1])
+    return props
+
+
+class UeventMonitor:
+    """
+    Turns kernel block-device uevents into the monitor's event tuples:
+    ('arrival', '/dev/sdX1', device_id) and ('removal', device_id).
+
+    Only partitions of removable or USB-attached disks are reported; whole
+    disks are skipped unless include_whole_disks is set (sticks formatted
+    without a partition table). The device_id is derived from the USB serial
+    number and partition number when the event (ID_SERIAL_SHORT) or sysfs
+    exposes them, so the same stick keeps its summary entry across ports;
+    otherwise the kernel DEVPATH is used. A removal for a device not seen
+    arriving is only reported when its serial is known, since a DEVPATH would
+    never match the id its arrival was recorded under.
+    """
+
+    def __init__(self, sys_root=SYS_ROOT, include_whole_disks=False):
+        self.sys_root = sys_root
+        self.include_whole_disks = include_whole_disks
+        self._ids = {} # DEVPATH -> device_id of devices we reported as arrived
+
+    # ─── sysfs helpers ─────────────────────────────────────────────────────
+    def _sys_path(self, devpath):
+        return os.path.join(self.sys_root, devpath.lstrip('/'))
+
+    def _read_attr(self, path):
+        try:
+            with open(path) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _is_removable(self, props):
+        devpath = props.get('DEVPATH', '')
+        if '/usb' in devpath:
+            return True
+        disk_path = devpath if props.get('DEVTYPE') == 'disk' else os.path.dirname(devpath)
+        return self._read_attr(os.path.join(self._sys_path(disk_path), 'removable')) == '1'
+
+    def _serial(self, props):
+        """USB serial number from the event's properties, else from sysfs (gone once removed)."""
+        serial = props.get('ID_SERIAL_SHORT')
+        if serial:
+            return serial
+        path = self._sys_path(props['DEVPATH'])
+        # Walk up towards the USB device node that carries the serial number
+        while path.startswith(self.sys_root) and path != self.sys_root:
+            serial = self._read_attr(os.path.join(path, 'serial'))
+            if serial:
+                return serial
+            path = os.path.dirname(path)
+        return None
+
+    def _stable_id(self, props):
+        serial = self._serial(props)
+        if serial is None:
+            return props['DEVPATH']
+        part = props.get('PARTN') or '0'
+        return f"usb-{serial}-part{part}"
+
+    # ─── event translation ─────────────────────────────────────────────────
+    def handle_payload(self, payload):
+        """Returns the event tuple for one raw uevent datagram, or None to ignore it."""
+        props = parse_uevent(payload)
+        if props is None or props.get('SUBSYSTEM') != 'block':
+            return None
+        devtype = props.get('DEVTYPE')
+        if devtype != 'partition' and not (devtype == 'disk' and self.include_whole_disks):
+            return None
+
+        action = props.get('ACTION')
+        devpath = props.get('DEVPATH')
+        if action == 'add':
+            if not self._is_removable(props):
+                return None
+            devname = props.get('DEVNAME')
+            if not devname:
+                return None
+            device_id = self._stable_id(props)
+            self._ids[devpath] = device_id
+            return ('arrival', os.path.join('/dev', devname), device_id)
+        if action == 'remove':
+            device_id = self._ids.pop(devpath, None)
+            if device_id is None:
+                # Not seen arriving (e.g. plugged in before we started); sysfs is already
+                # gone, so only a serial in the event can name the device
+                if '/usb' not in devpath or self._serial(props) is None:
+                    return None
+                device_id = self._stable_id(props)
+            return ('removal', device_id)
+        return None
+
+    # ─── socket loop ───────────────────────────────────────────────────────
+    def open_socket(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20) # survive hub-sized bursts
+        sock.bind((0, KERNEL_UEVENT_GROUP))
+        sock.settimeout(1.0) # so stop_event is checked at least once a second
+        return sock
+
+    def run(self, q, stop_event):
+        """Pushes arrival/removal tuples into `q` until stop_event is set."""
+        while not stop_event.is_set():
+            try:
+                sock = self.open_socket()
+            except OSError as e:
+                logging.error("Cannot open kernel uevent socket, retrying in 5s: %s", e)
+                stop_event.wait(5)
+                continue
+            try:
+                while not stop_event.is_set():
+                    try:
+                        payload = sock.recv(1 << 16)
+                    except socket.timeout:
+                        continue
+                    event = self.handle_payload(payload)
+                    if event:
+                        logging.debug("uevent: %s", event)
+                        q.put(event)
+            except OSError as e:
+                # ENOBUFS means the kernel dropped events; reopen and carry on
+                logging.error("Uevent socket error, reopening: %s", e)
+            finally:
+                sock.close()